@@ -7,34 +7,71 @@ FastAPI application for SSV Monetization Tool.
 Provides REST API endpoints for integration with ssv-web-dashboard.
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import APIRouter, FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from starlette.requests import ClientDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, AsyncIterator, Iterator, List, Literal, Optional, Tuple
+from itertools import islice
+import asyncio
+import json
+import os
 import sys
+import time
 from pathlib import Path
 
 # Добавление родительской директории в путь для импорта модулей
 sys.path.append(str(Path(__file__).parent.parent))
 
-from utils.config_loader import load_and_validate_config
-from utils.logger import setup_logger
-from modules.strategy_planner import determine_actions_for_strategy
-from modules.content_injector import inject_monetization_elements
+from utils.config_loader import load_and_validate_config, compute_config_version
+from utils.config_snapshot import freeze_config
+from utils.logger import setup_logger, configure_logging
+from utils.result_cache import configure_result_cache, get_result_cache
+from utils.metrics import PROMETHEUS_CONTENT_TYPE, configure_metrics, get_metrics_registry, observe_stage, stage_id, stage_labels
 from modules.compliance_checker import (
+    PLATFORMS as BUILTIN_COMPLIANCE_PLATFORMS,
+    scan_compliance,
     check_youtube_description_compliance,
-    check_amazon_kdp_compliance,
-    check_general_compliance
+    check_amazon_kdp_compliance
 )
+from modules.incremental_compliance import IncrementalComplianceChecker
+from modules.rule_engine import load_rule_engine
 from modules.analytics_tracker import (
     generate_unique_affiliate_link,
-    calculate_monetization_metrics,
-    prepare_monetization_report
+    generate_affiliate_links,
+    prepare_monetization_report,
+    track_monetization_event
 )
+from modules.event_sink import configure_event_sink, get_event_sink, close_event_sink
+from modules.report_rollups import configure_rollups, get_rollups, close_rollups
+from modules.metrics_store import get_metrics_store
+from modules.click_sketches import configure_click_sketches, get_click_sketches, close_click_sketches
+from api.pipeline import PIPELINE_CONTENT_TYPE, monetization_request_key, resolve_strategy, run_monetization_pipeline
+from api.compression import DEFAULT_MAX_BODY_BYTES, gzip_route
+from api.http_cache import STATIC_CACHE_CONTROL, cache_headers, etag_matches, make_etag, not_modified
+from api.batch_pool import (
+    DEFAULT_MAX_ITEMS,
+    DEFAULT_STREAM_IN_FLIGHT,
+    MonetizationPool,
+    get_monetization_pool,
+    close_monetization_pool
+)
+from api.streaming import NDJSON_MEDIA_TYPE, DuplexStreamingResponse, iter_ndjson_lines
+from modules.job_queue import JOB_STATUSES, JobQueue, configure_job_queue, get_job_queue, close_job_queue
+from api.jobs import OUTPUT_FILE, build_job_handlers, validate_job_payload
 
 # Настройка логирования
 logger = setup_logger(__name__)
 
+# Этапы метрик /api/v1/monetize: ответ из кэша результатов, конвейер, 304
+STAGE_MONETIZE_HIT = stage_id('monetize', 'hit')
+STAGE_MONETIZE_MISS = stage_id('monetize', 'miss')
+STAGE_MONETIZE_NOT_MODIFIED = stage_id('monetize', 'not_modified')
+
+# Максимум текстов в одном запросе /api/v1/compliance/bulk
+DEFAULT_BULK_MAX_ITEMS = 10000
+
 # Создание FastAPI приложения
 app = FastAPI(
     title="SSV Monetization Tool API",
@@ -51,15 +88,48 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],  # Панель повторяет запросы с If-None-Match
 )
 
 # Загрузка конфигурации при запуске
 try:
-    config = load_and_validate_config("monetization_config.yaml")
-    logger.info("Configuration loaded successfully")
+    # Общая конфигурация неизменяема: переопределения запросов — слои поверх снимка
+    config = freeze_config(load_and_validate_config("monetization_config.yaml"))
+    configure_logging(config)
+    configure_metrics(config)
+    config_version = compute_config_version(config)
+    configure_result_cache(config, config_version)
+    event_sink = configure_event_sink(config)
+    # Агрегаты отчётов: снимок с диска плюс события новее его метки
+    configure_rollups(config, event_sink)
+    configure_click_sketches(config)
+    # Незавершённые задания прошлого запуска возвращаются в очередь
+    configure_job_queue(config, build_job_handlers(config))
+    logger.info(f"Configuration loaded successfully (version {config_version})")
 except Exception as e:
     logger.error(f"Failed to load configuration: {e}")
     config = None
+    config_version = None
+
+
+# Загрузка декларативных правил проверки соответствия
+try:
+    rules_path = (config or {}).get('compliance', {}).get('rules_path', 'compliance_rules.yaml')
+    rule_engine = load_rule_engine(rules_path)
+except Exception as e:
+    logger.error(f"Failed to load compliance rules: {e}")
+    rule_engine = None
+
+
+# POST-варианты проверок соответствия принимают JSON-тела, в том числе сжатые gzip
+compliance_router = APIRouter(
+    prefix="/api/v1/compliance",
+    route_class=gzip_route((config or {}).get('compliance', {}).get('max_body_bytes', DEFAULT_MAX_BODY_BYTES))
+)
+
+
+# Состояние документов для инкрементальной проверки в редакторе веб-панели
+document_checker = IncrementalComplianceChecker()
 
 
 # Pydantic модели для запросов и ответов
@@ -83,11 +153,82 @@ class MonetizeResponse(BaseModel):
     metrics: Optional[Dict[str, Any]] = None
     compliance_warnings: Optional[Dict[str, List[str]]] = None
 
+class BatchMonetizeItem(BaseModel):
+    """Элемент пакетного запроса: контент и необязательные стратегия и методы."""
+    content: ContentInput
+    strategy: Optional[str] = Field(None, description="Overrides the batch strategy for this item")
+    methods: Optional[List[str]] = Field(None, description="Overrides the batch methods for this item")
+
+class BatchMonetizeRequest(BaseModel):
+    """Модель пакетного запроса на монетизацию."""
+    items: List[BatchMonetizeItem]
+    strategy: Optional[str] = Field(None, description="Default strategy for items without their own")
+    methods: Optional[List[str]] = Field(None, description="Default methods for items without their own")
+
+class BatchItemResult(BaseModel):
+    """Результат одного элемента пакета."""
+    index: int
+    success: bool
+    result: Optional[Dict[str, Any]] = None
+    metrics: Optional[Dict[str, Any]] = None
+    compliance_warnings: Optional[Dict[str, List[str]]] = None
+    error: Optional[str] = None
+
+class BatchMonetizeResponse(BaseModel):
+    """Модель ответа на пакетный запрос: результаты в порядке элементов."""
+    success: bool
+    processed: int
+    failed: int
+    results: List[BatchItemResult]
+
 class ComplianceResponse(BaseModel):
     """Модель ответа проверки соответствия."""
     compliant: bool
     issues: List[str]
 
+class ComplianceTextRequest(BaseModel):
+    """Модель запроса проверки одного текста."""
+    description: str = Field(..., description="Text to check")
+
+class BulkComplianceRequest(BaseModel):
+    """Модель пакетной проверки: тексты и платформы."""
+    texts: List[str] = Field(..., description="Texts to check, verdicts are returned in the same order")
+    platforms: List[str] = Field(
+        default_factory=lambda: list(BUILTIN_COMPLIANCE_PLATFORMS),
+        description="Built-in checks (youtube, amazon_kdp, general) or platforms from compliance_rules.yaml"
+    )
+
+class BulkComplianceVerdict(BaseModel):
+    """Вердикт по одному тексту: проблемы только для платформ, где они найдены."""
+    compliant: bool
+    issues: Optional[Dict[str, List[str]]] = None
+
+class BulkComplianceResponse(BaseModel):
+    """Модель ответа пакетной проверки: вердикты в порядке текстов."""
+    count: int
+    non_compliant: int
+    results: List[BulkComplianceVerdict]
+
+class DocumentOpenRequest(BaseModel):
+    """Модель запроса регистрации документа для инкрементальной проверки."""
+    text: str = Field(..., description="Full document text")
+
+class DocumentEdit(BaseModel):
+    """Правка документа: text[start:end] заменяется на replacement."""
+    start: int = Field(..., ge=0)
+    end: int = Field(..., ge=0)
+    replacement: str = ""
+
+class DocumentEditRequest(BaseModel):
+    """Модель запроса с последовательностью правок документа."""
+    edits: List[DocumentEdit]
+
+class DocumentComplianceResponse(BaseModel):
+    """Модель ответа инкрементальной проверки документа."""
+    document_id: str
+    compliant: bool
+    issues: Dict[str, List[str]]
+
 class StrategiesResponse(BaseModel):
     """Модель ответа со списком стратегий."""
     strategies: List[Dict[str, str]]
@@ -99,6 +240,42 @@ class UniqueLinkRequest(BaseModel):
     source: str
     medium: Optional[str] = "description"
 
+class UniqueLinksRequest(BaseModel):
+    """Модель запроса массовой генерации уникальных ссылок."""
+    base_url: str
+    content_ids: List[str] = Field(..., description="Content ids, one link per id")
+    source: str
+    medium: Optional[str] = "description"
+    campaign: Optional[str] = Field(None, description="utm_campaign; content id then goes to utm_content")
+
+class ClickEvent(BaseModel):
+    """Переход по UTM-ссылке или конверсия."""
+    event_type: Literal['click', 'conversion'] = 'click'
+    utm_content: Optional[str] = Field(None, description="Content id (links generated with a campaign)")
+    utm_campaign: Optional[str] = Field(None, description="Campaign, or content id for links without a campaign")
+    visitor_id: Optional[str] = Field(None, description="Visitor id for unique visitor estimates")
+    timestamp: Optional[str] = Field(None, description="Event time, ISO datetime (default: now)")
+
+class ClickBatchRequest(BaseModel):
+    """Модель запроса с пачкой переходов и конверсий."""
+    events: List[ClickEvent]
+
+class ReportRequest(BaseModel):
+    """Модель запроса агрегированного отчёта."""
+    content_ids: Optional[List[str]] = Field(None, description="Report over these content ids (otherwise over a time range)")
+    strategy: Optional[str] = Field(None, description="Only events of this strategy")
+    start: Optional[str] = Field(None, description="Range start, ISO datetime (inclusive, bucket precision)")
+    end: Optional[str] = Field(None, description="Range end, ISO datetime (inclusive, bucket precision)")
+    granularity: Literal['hour', 'day'] = Field('day', description="Timeline bucket size")
+
+class JobSubmitRequest(BaseModel):
+    """Модель запроса на постановку задания в очередь."""
+    kind: Literal['content', 'catalog', 'book'] = Field(..., description="content: one item, catalog: many items, book: manuscript")
+    content: Optional[ContentInput] = Field(None, description="Content for kind=content")
+    items: Optional[List[ContentInput]] = Field(None, description="Content items for kind=catalog")
+    content_type: Literal['video', 'book'] = Field('video', description="Content type for content and catalog jobs")
+    manuscript: Optional[str] = Field(None, description="Manuscript text (UTF-8) for kind=book")
+
 class UniqueLinkResponse(BaseModel):
     """Модель ответа с уникальной ссылкой."""
     link: str
@@ -121,16 +298,53 @@ async def health_check():
     """Проверка состояния API."""
     return {
         "status": "healthy",
-        "config_loaded": config is not None
+        "config_loaded": config is not None,
+        "result_cache": get_result_cache().stats(),
+        "event_sink": get_event_sink().stats(),
+        "click_sketches": get_click_sketches().stats(),
+        "jobs": get_job_queue().stats() if get_job_queue() is not None else None
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Метрики процесса в текстовом формате Prometheus.
+
+    Гистограммы длительности этапов конвейера (ssv_stage_duration_seconds)
+    с метками stage, strategy, content_type и cache (hit/miss) и счётчик
+    обработанных элементов, включая элементы /monetize/batch и /monetize/stream:
+    процессы пула возвращают наблюдения вместе с результатами.
+    """
+    return PlainTextResponse(get_metrics_registry().render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.on_event("shutdown")
+async def flush_events():
+    """Сбрасывает накопленные события аналитики, агрегаты и скетчи переходов, останавливает пулы при остановке."""
+    close_job_queue()
+    close_event_sink()
+    # После сброса приёмника: в снимок попадают все записанные события
+    close_rollups()
+    close_click_sketches()
+    close_monetization_pool()
+
 @app.post("/api/v1/monetize", response_model=MonetizeResponse)
-async def monetize_content(request: MonetizeRequest):
+async def monetize_content(
+    request: MonetizeRequest,
+    response: Response,
+    if_none_match: Optional[str] = Header(None)
+):
     """
     Применяет монетизацию к контенту.
     
+    Результат определяется контентом, действующими стратегией и методами
+    и версией конфигурации: ключ этих данных служит ETag ответа и ключом
+    общего кэша результатов. Повторный запрос с совпадающим If-None-Match
+    получает 304 без тела (событие аналитики при этом не записывается).
+    
     Args:
         request: Запрос с контентом и параметрами монетизации
+        response: Ответ (для заголовков ETag и Cache-Control)
+        if_none_match: ETag ранее полученного ответа
     
     Returns:
         Монетизированный контент с метриками
@@ -139,51 +353,214 @@ async def monetize_content(request: MonetizeRequest):
         if config is None:
             raise HTTPException(status_code=500, detail="Configuration not loaded")
         
-        # Подготовка конфигурации
-        current_config = config.copy()
-        if request.strategy:
-            current_config['monetization']['strategy'] = request.strategy
-        if request.methods:
-            current_config['monetization']['methods'] = request.methods
-        
+        started = time.perf_counter()
         # Преобразование входного контента в словарь
         content = request.content.model_dump()
+        strategy, methods = resolve_strategy(config, request.strategy, request.methods)
         
-        # Определение действий
-        strategy = current_config['monetization']['strategy']
-        actions = determine_actions_for_strategy(strategy, current_config)
-        
-        # Применение монетизации
-        result = inject_monetization_elements(content, actions, current_config)
+        with stage_labels(strategy, PIPELINE_CONTENT_TYPE):
+            key = monetization_request_key(content, config, config_version, strategy, methods)
+            etag = '"' + key + '"'
+            if etag_matches(if_none_match, etag):
+                observe_stage(STAGE_MONETIZE_NOT_MODIFIED, started)
+                return not_modified(etag)
+            
+            # Стратегия и методы запроса передаются в конвейер отдельно: общая конфигурация не меняется
+            cache = get_result_cache()
+            outcome = cache.get(('monetize', key))
+            if outcome is None:
+                outcome = run_monetization_pipeline(content, config, config_version, strategy, methods)
+                cache.put(('monetize', key), outcome)
+                observe_stage(STAGE_MONETIZE_MISS, started)
+            else:
+                observe_stage(STAGE_MONETIZE_HIT, started)
+        compliance_warnings = outcome['compliance_warnings']
         
-        # Расчёт метрик
-        metrics = calculate_monetization_metrics(result)
+        track_monetization_event('content_monetized', content['id'], {
+            'strategy': strategy,
+            'actions': outcome['actions'],
+            'content_type': PIPELINE_CONTENT_TYPE,
+            'metrics': outcome['metrics'],
+            'compliance_warnings': compliance_warnings
+        })
         
-        # Проверка соответствия
-        compliance_warnings = {}
-        description = result.get('description', '')
-        
-        youtube_issues = check_youtube_description_compliance(description)
-        if youtube_issues:
-            compliance_warnings['youtube'] = youtube_issues
-        
-        general_issues = check_general_compliance(description)
-        if general_issues:
-            compliance_warnings['general'] = general_issues
-        
-        logger.info(f"Content {content['id']} monetized successfully with strategy {strategy}")
+        logger.info("Content %s monetized successfully with strategy %s", content['id'], strategy)
         
+        response.headers.update(cache_headers(etag))
         return MonetizeResponse(
             success=True,
-            result=result,
-            metrics=metrics,
+            result=outcome['result'],
+            metrics=outcome['metrics'],
             compliance_warnings=compliance_warnings if compliance_warnings else None
         )
     
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error monetizing content: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/v1/monetize/batch", response_model=BatchMonetizeResponse)
+async def monetize_batch(request: BatchMonetizeRequest):
+    """
+    Применяет монетизацию к пакету контента в пуле процессов.
+    
+    Элементы делятся на куски и обрабатываются процессами пула с заранее
+    загруженной конфигурацией, поэтому цикл событий не блокируется.
+    Ошибка одного элемента не прерывает пакет.
+    
+    Args:
+        request: Элементы с необязательными стратегией и методами
+    
+    Returns:
+        Результаты в порядке элементов с ошибками по элементам
+    """
+    if config is None:
+        raise HTTPException(status_code=500, detail="Configuration not loaded")
+    
+    max_items = config.get('batch', {}).get('max_items', DEFAULT_MAX_ITEMS)
+    if len(request.items) > max_items:
+        raise HTTPException(status_code=400, detail=f"Batch too large: {len(request.items)} items, limit is {max_items}")
+    
+    try:
+        items = [
+            (item.content.model_dump(), item.strategy or request.strategy,
+             item.methods if item.methods is not None else request.methods)
+            for item in request.items
+        ]
+        outcomes = await get_monetization_pool(config, config_version).run(items)
+        
+        results = [
+            _batch_item_result(index, content, outcome)
+            for index, ((content, _, _), outcome) in enumerate(zip(items, outcomes))
+        ]
+        
+        failed = sum(1 for result in results if not result.success)
+        logger.info(f"Batch of {len(results)} items monetized, {failed} failed")
+        return BatchMonetizeResponse(success=failed == 0, processed=len(results), failed=failed, results=results)
+    
+    except Exception as e:
+        logger.error(f"Error monetizing batch: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/v1/monetize/stream")
+async def monetize_stream(
+    request: Request,
+    strategy: Optional[str] = None,
+    methods: Optional[List[str]] = Query(None)
+):
+    """
+    Потоковая монетизация: NDJSON на входе и на выходе.
+    
+    Тело запроса — строки в формате элемента пакета
+    ({"content": {...}, "strategy": ..., "methods": [...]}), читается по мере
+    поступления. Элементы обрабатываются в пуле процессов, одновременно
+    не больше batch.stream_max_in_flight; результат каждого элемента
+    (формат элемента ответа /monetize/batch, с index) отправляется строкой
+    сразу по готовности, поэтому порядок строк ответа может отличаться
+    от порядка элементов. Память сервера не зависит от длины потока.
+    
+    Args:
+        request: Запрос с телом NDJSON
+        strategy: Стратегия для элементов без своей
+        methods: Методы для элементов без своих
+    
+    Returns:
+        Поток NDJSON с результатами
+    """
+    if config is None:
+        raise HTTPException(status_code=500, detail="Configuration not loaded")
+    
+    pool = get_monetization_pool(config, config_version)
+    max_in_flight = config.get('batch', {}).get('stream_max_in_flight', DEFAULT_STREAM_IN_FLIGHT)
+    return DuplexStreamingResponse(
+        _monetize_ndjson(request, pool, strategy, methods, max_in_flight),
+        media_type=NDJSON_MEDIA_TYPE
+    )
+
+async def _monetize_ndjson(
+    request: Request,
+    pool: MonetizationPool,
+    strategy: Optional[str],
+    methods: Optional[List[str]],
+    max_in_flight: int
+) -> AsyncIterator[str]:
+    """Читает элементы из тела запроса, обрабатывает их в пуле и выдаёт строки результатов."""
+    pending: Dict[asyncio.Future, tuple] = {}
+    processed = failed = 0
+    
+    async def finished(wait_all: bool) -> AsyncIterator[str]:
+        nonlocal processed, failed
+        while pending and (wait_all or len(pending) >= max_in_flight):
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                index, content = pending.pop(future)
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    outcome = {"success": False, "error": f"{type(e).__name__}: {e}"}
+                result = _batch_item_result(index, content, outcome)
+                processed += 1
+                failed += not result.success
+                yield result.model_dump_json() + '\n'
+    
+    try:
+        index = -1
+        async for index, line in _enumerate_async(iter_ndjson_lines(request)):
+            try:
+                item = BatchMonetizeItem.model_validate_json(line)
+            except ValueError as e:
+                processed += 1
+                failed += 1
+                yield BatchItemResult(index=index, success=False, error=f"Invalid item: {e}").model_dump_json() + '\n'
+                continue
+            
+            content = item.content.model_dump()
+            future = pool.submit((content, item.strategy or strategy, item.methods if item.methods is not None else methods))
+            pending[future] = (index, content)
+            async for line in finished(wait_all=False):
+                yield line
+        
+        async for line in finished(wait_all=True):
+            yield line
+        logger.info(f"Stream of {processed} items monetized, {failed} failed")
+    
+    except ClientDisconnect:
+        logger.warning(f"Monetization stream client disconnected after {processed} items")
+    except ValueError as e:
+        # Ошибка формата потока (например, слишком длинная строка): сообщаем последней строкой
+        logger.error(f"Invalid monetization stream: {e}")
+        yield json.dumps({"success": False, "error": str(e)}, ensure_ascii=False) + '\n'
+    finally:
+        for future in pending:
+            future.cancel()
+
+async def _enumerate_async(iterator: AsyncIterator[Any]) -> AsyncIterator[tuple]:
+    index = 0
+    async for item in iterator:
+        yield index, item
+        index += 1
+
+def _batch_item_result(index: int, content: Dict[str, Any], outcome: Dict[str, Any]) -> BatchItemResult:
+    """Формирует результат элемента пакета и отправляет событие аналитики для успешных."""
+    if not outcome["success"]:
+        return BatchItemResult(index=index, success=False, error=outcome['error'])
+    
+    track_monetization_event('content_monetized', content['id'], {
+        'strategy': outcome['strategy'],
+        'actions': outcome['actions'],
+        'content_type': PIPELINE_CONTENT_TYPE,
+        'metrics': outcome['metrics'],
+        'compliance_warnings': outcome['compliance_warnings']
+    })
+    return BatchItemResult(
+        index=index,
+        success=True,
+        result=outcome['result'],
+        metrics=outcome['metrics'],
+        compliance_warnings=outcome['compliance_warnings'] or None
+    )
+
 @app.get("/api/v1/compliance/youtube", response_model=ComplianceResponse)
 async def check_youtube_compliance(description: str):
     """
@@ -206,7 +583,7 @@ async def check_youtube_compliance(description: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/v1/compliance/amazon-kdp", response_model=ComplianceResponse)
-async def check_amazon_kdp_compliance(description: str):
+async def check_kdp_compliance(description: str):
     """
     Проверяет описание на соответствие политикам Amazon KDP.
     
@@ -226,37 +603,271 @@ async def check_amazon_kdp_compliance(description: str):
         logger.error(f"Error checking Amazon KDP compliance: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@compliance_router.post("/youtube", response_model=ComplianceResponse)
+async def check_youtube_compliance_body(request: ComplianceTextRequest):
+    """
+    Проверяет описание на соответствие политикам YouTube (текст в JSON-теле, можно в gzip).
+    
+    Args:
+        request: Текст описания для проверки
+    
+    Returns:
+        Результат проверки с найденными проблемами
+    """
+    return await check_youtube_compliance(request.description)
+
+@compliance_router.post("/amazon-kdp", response_model=ComplianceResponse)
+async def check_kdp_compliance_body(request: ComplianceTextRequest):
+    """
+    Проверяет описание на соответствие политикам Amazon KDP (текст в JSON-теле, можно в gzip).
+    
+    Args:
+        request: Текст описания для проверки
+    
+    Returns:
+        Результат проверки с найденными проблемами
+    """
+    return await check_kdp_compliance(request.description)
+
+def _bulk_verdicts(texts: List[str], builtin: Tuple[str, ...], declarative: List[str]) -> List[BulkComplianceVerdict]:
+    """Проверяет тексты: встроенные проверки — одним проходом по тексту, остальные — по правилам."""
+    results = []
+    for text in texts:
+        issues = scan_compliance(text, builtin) if builtin else {}
+        for platform in declarative:
+            issues[platform] = rule_engine.check(platform, text)
+        found = {platform: platform_issues for platform, platform_issues in issues.items() if platform_issues}
+        results.append(BulkComplianceVerdict(compliant=not found, issues=found or None))
+    return results
+
+@compliance_router.post("/bulk", response_model=BulkComplianceResponse, response_model_exclude_none=True)
+async def check_compliance_bulk(request: BulkComplianceRequest):
+    """
+    Проверяет пакет текстов сразу для нескольких платформ.
+    
+    Встроенные проверки (youtube, amazon_kdp, general) выполняются одним
+    проходом по каждому тексту, остальные платформы — по правилам
+    compliance_rules.yaml. Тело можно передать в gzip (Content-Encoding: gzip).
+    
+    Args:
+        request: Тексты и платформы
+    
+    Returns:
+        Число текстов, число текстов с проблемами и вердикты в порядке текстов
+        (issues только у текстов с проблемами и только по платформам с проблемами)
+    """
+    max_items = (config or {}).get('compliance', {}).get('bulk_max_items', DEFAULT_BULK_MAX_ITEMS)
+    if len(request.texts) > max_items:
+        raise HTTPException(status_code=400, detail=f"Too many texts: {len(request.texts)}, limit is {max_items}")
+    
+    platforms = list(dict.fromkeys(request.platforms))
+    builtin = tuple(platform for platform in platforms if platform in BUILTIN_COMPLIANCE_PLATFORMS)
+    declarative = [platform for platform in platforms if platform not in BUILTIN_COMPLIANCE_PLATFORMS]
+    if declarative and rule_engine is None:
+        raise HTTPException(status_code=500, detail="Compliance rules not loaded")
+    unknown = [platform for platform in declarative if platform not in rule_engine.platforms]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"No compliance rules for platforms: {', '.join(unknown)}")
+    
+    try:
+        # Проверка пакета идёт в потоке, чтобы не задерживать другие запросы
+        results = await asyncio.to_thread(_bulk_verdicts, request.texts, builtin, declarative)
+        non_compliant = sum(1 for result in results if not result.compliant)
+        logger.info(f"Bulk compliance check of {len(results)} texts, {non_compliant} non-compliant")
+        return BulkComplianceResponse(count=len(results), non_compliant=non_compliant, results=results)
+    
+    except Exception as e:
+        logger.error(f"Error checking bulk compliance: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+app.include_router(compliance_router)
+
+@app.get("/api/v1/compliance/rules/stats")
+async def get_compliance_rule_stats():
+    """
+    Возвращает статистику правил: число срабатываний и накопленное время по каждому правилу.
+    
+    Returns:
+        Версия правил, время общих матчеров по платформам и счётчики правил
+    """
+    if rule_engine is None:
+        raise HTTPException(status_code=500, detail="Compliance rules not loaded")
+    return rule_engine.stats()
+
+@app.get("/api/v1/compliance/check/{platform}", response_model=ComplianceResponse)
+async def check_platform_compliance(platform: str, description: str):
+    """
+    Проверяет описание по правилам платформы.
+    
+    Встроенные платформы проверяет общий сканер, остальные — декларативные
+    правила compliance_rules.yaml.
+    
+    Args:
+        platform: Платформа (youtube, amazon_kdp, general, telegram, vk, podcast, ...)
+        description: Текст описания для проверки
+    
+    Returns:
+        Результат проверки с найденными проблемами
+    """
+    builtin = platform in BUILTIN_COMPLIANCE_PLATFORMS
+    if not builtin:
+        if rule_engine is None:
+            raise HTTPException(status_code=500, detail="Compliance rules not loaded")
+        if platform not in rule_engine.platforms:
+            raise HTTPException(status_code=404, detail=f"No compliance rules for platform '{platform}'")
+    
+    try:
+        if builtin:
+            issues = scan_compliance(description, (platform,))[platform]
+        else:
+            issues = rule_engine.check(platform, description)
+        return ComplianceResponse(
+            compliant=len(issues) == 0,
+            issues=issues
+        )
+    except Exception as e:
+        logger.error(f"Error checking {platform} compliance: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.put("/api/v1/compliance/documents/{document_id}", response_model=DocumentComplianceResponse)
+async def open_compliance_document(document_id: str, request: DocumentOpenRequest):
+    """
+    Регистрирует документ для инкрементальной проверки и проверяет его целиком.
+    
+    Args:
+        document_id: Идентификатор документа
+        request: Полный текст документа
+    
+    Returns:
+        Результат проверки Amazon KDP и общей проверки
+    """
+    try:
+        issues = document_checker.open_document(document_id, request.text)
+        return DocumentComplianceResponse(
+            document_id=document_id,
+            compliant=not any(issues.values()),
+            issues=issues
+        )
+    except Exception as e:
+        logger.error(f"Error opening document {document_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.patch("/api/v1/compliance/documents/{document_id}", response_model=DocumentComplianceResponse)
+async def edit_compliance_document(document_id: str, request: DocumentEditRequest):
+    """
+    Применяет правки к документу и перепроверяет только затронутые фрагменты.
+    
+    Args:
+        document_id: Идентификатор документа
+        request: Последовательность правок
+    
+    Returns:
+        Результат проверки всего документа после правок
+    """
+    try:
+        issues = document_checker.get_verdicts(document_id)
+        for edit in request.edits:
+            issues = document_checker.apply_edit(document_id, edit.start, edit.end, edit.replacement)
+        return DocumentComplianceResponse(
+            document_id=document_id,
+            compliant=not any(issues.values()),
+            issues=issues
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Document {document_id} is not open")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error editing document {document_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/api/v1/compliance/documents/{document_id}")
+async def close_compliance_document(document_id: str):
+    """Удаляет состояние документа инкрементальной проверки."""
+    document_checker.close_document(document_id)
+    return {"success": True}
+
+# Стратегии монетизации для /api/v1/strategies
+STRATEGY_LIST = [
+    {
+        "name": "full",
+        "display_name": "Полная монетизация",
+        "description": "Все методы монетизации активны с явными дисклеймерами"
+    },
+    {
+        "name": "partial",
+        "display_name": "Частичная монетизация",
+        "description": "Выборочные методы монетизации"
+    },
+    {
+        "name": "masked",
+        "display_name": "Замаскированная монетизация",
+        "description": "Деликатная монетизация без явных дисклеймеров"
+    },
+    {
+        "name": "hidden",
+        "display_name": "Скрытая монетизация",
+        "description": "Минимальное вмешательство, приоритет на UX"
+    }
+]
+STRATEGIES_ETAG = make_etag(STRATEGY_LIST)
+
 @app.get("/api/v1/strategies", response_model=StrategiesResponse)
-async def get_strategies():
+async def get_strategies(response: Response, if_none_match: Optional[str] = Header(None)):
     """
     Возвращает список доступных стратегий монетизации.
     
+    Список не меняется во время работы сервера: ответ кэшируется клиентами
+    (Cache-Control) и перепроверяется по ETag.
+    
     Returns:
         Список стратегий с описаниями
     """
-    strategies = [
-        {
-            "name": "full",
-            "display_name": "Полная монетизация",
-            "description": "Все методы монетизации активны с явными дисклеймерами"
-        },
-        {
-            "name": "partial",
-            "display_name": "Частичная монетизация",
-            "description": "Выборочные методы монетизации"
-        },
-        {
-            "name": "masked",
-            "display_name": "Замаскированная монетизация",
-            "description": "Деликатная монетизация без явных дисклеймеров"
-        },
-        {
-            "name": "hidden",
-            "display_name": "Скрытая монетизация",
-            "description": "Минимальное вмешательство, приоритет на UX"
-        }
-    ]
-    return StrategiesResponse(strategies=strategies)
+    if etag_matches(if_none_match, STRATEGIES_ETAG):
+        return not_modified(STRATEGIES_ETAG, STATIC_CACHE_CONTROL)
+    response.headers.update(cache_headers(STRATEGIES_ETAG, STATIC_CACHE_CONTROL))
+    return StrategiesResponse(strategies=STRATEGY_LIST)
+
+@app.get("/api/v1/analytics/metrics")
+async def query_metrics(
+    metric: str = 'monetization_density',
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    strategy: Optional[str] = None,
+    content_type: Optional[str] = None,
+    group_by: Optional[str] = None,
+    percentiles: str = '50,90,99'
+):
+    """
+    Распределение метрики монетизации по колоночному хранилищу.
+    
+    Например, распределение плотности монетизации по стратегиям за месяц:
+    ?metric=monetization_density&start=2025-01-01&end=2025-02-01&group_by=strategy
+    
+    Args:
+        metric: Метрика из calculate_monetization_metrics
+        start: Начало периода (ISO-время, включительно)
+        end: Конец периода (ISO-время, не включительно)
+        strategy: Только эта стратегия
+        content_type: Только этот тип контента
+        group_by: strategy, content_type, day или hour
+        percentiles: Процентили через запятую
+    
+    Returns:
+        Статистика по группам: count, sum, mean, min, max и процентили
+    """
+    store = get_metrics_store()
+    if store is None:
+        raise HTTPException(status_code=500, detail="Metrics store is not enabled")
+    
+    try:
+        levels = [float(p) for p in percentiles.split(',') if p.strip()]
+        return store.query(metric, start, end, strategy, content_type, group_by, levels)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error querying metrics: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/v1/analytics/link", response_model=UniqueLinkResponse)
 async def generate_link(request: UniqueLinkRequest):
@@ -274,35 +885,243 @@ async def generate_link(request: UniqueLinkRequest):
             base_url=request.base_url,
             content_id=request.content_id,
             source=request.source,
-            medium=request.medium
+            medium=request.medium or "description"
         )
         return UniqueLinkResponse(link=link)
     except Exception as e:
         logger.error(f"Error generating link: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/v1/analytics/links")
+async def generate_links(request: UniqueLinksRequest):
+    """
+    Генерирует уникальные партнёрские ссылки для списка контента.
+    
+    Ответ передаётся потоком в формате NDJSON (строка
+    {"content_id": ..., "link": ...} на каждый идентификатор) по мере генерации.
+    
+    Args:
+        request: Базовая ссылка, идентификаторы контента и UTM-параметры
+    
+    Returns:
+        Поток NDJSON со ссылками
+    """
+    try:
+        links = generate_affiliate_links(
+            base_url=request.base_url,
+            content_ids=request.content_ids,
+            source=request.source,
+            medium=request.medium or "description",
+            campaign=request.campaign
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error generating links: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    logger.info(f"Streaming {len(request.content_ids)} unique links")
+    return StreamingResponse(_ndjson_links(links), media_type="application/x-ndjson")
+
+def _ndjson_links(links: Iterator[Tuple[str, str]], chunk_size: int = 1000) -> Iterator[str]:
+    """Кодирует ссылки в NDJSON и отдаёт их блоками по chunk_size строк."""
+    dumps = json.JSONEncoder(ensure_ascii=False).encode
+    for chunk in iter(lambda: list(islice(links, chunk_size)), []):
+        yield ''.join(
+            dumps({"content_id": content_id, "link": link}) + '\n'
+            for content_id, link in chunk
+        )
+
+@app.post("/api/v1/analytics/clicks")
+async def ingest_clicks(request: ClickBatchRequest):
+    """
+    Принимает пачку переходов по UTM-ссылкам и конверсий.
+    
+    События учитываются в скетчах в памяти (HyperLogLog уникальных посетителей,
+    count-min по ссылкам), которые периодически сохраняются на диск.
+    
+    Args:
+        request: События
+    
+    Returns:
+        Количество принятых и отклонённых событий
+    """
+    try:
+        return get_click_sketches().ingest(event.model_dump() for event in request.events)
+    except Exception as e:
+        logger.error(f"Error ingesting clicks: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/v1/analytics/clicks")
+async def get_click_report(
+    event_type: Literal['click', 'conversion'] = 'click',
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    campaign: Optional[str] = None,
+    content_ids: Optional[str] = None,
+    top: int = 10
+):
+    """
+    Сводка по переходам или конверсиям за период.
+    
+    Args:
+        event_type: click или conversion
+        start: Начало периода (ISO-время, включительно)
+        end: Конец периода (ISO-время, включительно)
+        campaign: Уникальные посетители только этой кампании
+        content_ids: Идентификаторы контента через запятую (оценка числа событий их ссылок)
+        top: Сколько самых популярных ссылок вернуть
+    
+    Returns:
+        События, оценка уникальных посетителей (всего и по кампаниям), топ ссылок
+    """
+    try:
+        ids = [content_id for content_id in content_ids.split(',') if content_id] if content_ids else None
+        return get_click_sketches().report(event_type, start, end, campaign, ids, top)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error building click report: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/api/v1/report")
-async def generate_report(content_ids: List[str]):
+async def generate_report(request: ReportRequest):
     """
-    Генерирует отчёт о монетизации для списка контента.
+    Генерирует агрегированный отчёт о монетизации.
+    
+    Отчёт строится по заранее агрегированным данным (по контенту, по часам
+    и дням), без повторного чтения сырых событий. Если заданы content_ids —
+    сводка по этому контенту с разбивкой по стратегиям, иначе — сводка
+    за период start..end с разбивкой по интервалам granularity.
     
     Args:
-        content_ids: Список идентификаторов контента
+        request: Параметры отчёта
     
     Returns:
         Агрегированный отчёт о монетизации
     """
     try:
-        # TODO: Реализовать загрузку данных контента и генерацию отчёта
-        return {
-            "success": True,
-            "content_count": len(content_ids),
-            "message": "Report generation not yet implemented"
-        }
+        rollups = get_rollups()
+        if request.content_ids is not None:
+            summary = rollups.summarize_contents(request.content_ids, request.strategy)
+        else:
+            summary = rollups.summarize_period(request.start, request.end, request.granularity, request.strategy)
+        
+        monetization = (config or {}).get('monetization', {})
+        report = prepare_monetization_report(
+            request.strategy or monetization.get('strategy', 'hidden'),
+            monetization.get('methods', []),
+            rollups=summary
+        )
+        report["success"] = True
+        return report
     except Exception as e:
         logger.error(f"Error generating report: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/v1/jobs", status_code=202)
+async def submit_job(request: JobSubmitRequest):
+    """
+    Ставит долгое задание в очередь: обработка каталога или рукописи книги.
+    
+    Задания хранятся в SQLite и выполняются пулом исполнителей (jobs.workers);
+    прерванные остановкой сервера продолжаются после перезапуска.
+    
+    Args:
+        request: Тип задания и его входные данные
+    
+    Returns:
+        Состояние задания (id для опроса)
+    """
+    try:
+        payload = request.model_dump(exclude={'kind'}, exclude_none=True)
+        validate_job_payload(request.kind, payload)
+        return _require_job_queue().submit(request.kind, payload)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error submitting job: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/v1/jobs")
+async def list_jobs(status: Optional[str] = None, limit: int = 100):
+    """
+    Возвращает последние задания (новые первыми).
+    
+    Args:
+        status: Только задания с этим статусом
+        limit: Сколько заданий вернуть
+    """
+    if status is not None and status not in JOB_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Unknown job status '{status}', expected one of {list(JOB_STATUSES)}")
+    return {"jobs": _require_job_queue().list_jobs(status, limit)}
+
+@app.get("/api/v1/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Состояние и прогресс задания.
+    
+    Returns:
+        status (queued, running, succeeded, failed, cancelled), progress
+        (done, total, failed), summary, error и время этапов
+    """
+    job = _require_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job
+
+@app.post("/api/v1/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """
+    Отменяет задание: из очереди — сразу, выполняющееся — между элементами.
+    
+    Returns:
+        Состояние задания
+    """
+    job = _require_job_queue().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job
+
+@app.get("/api/v1/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """
+    Выгружает результаты элементов задания (NDJSON, по порядку элементов).
+    
+    Доступны уже сохранённые результаты, в том числе до завершения задания.
+    """
+    queue = _require_job_queue()
+    if queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return StreamingResponse(_ndjson_job_results(queue, job_id), media_type=NDJSON_MEDIA_TYPE)
+
+@app.get("/api/v1/jobs/{job_id}/output")
+async def get_job_output(job_id: str):
+    """Выгружает обработанную рукопись задания типа book."""
+    queue = _require_job_queue()
+    job = queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    output_path = os.path.join(queue.job_directory(job_id), OUTPUT_FILE)
+    if job["status"] != 'succeeded' or not os.path.exists(output_path):
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' has no output file ({job['kind']}, {job['status']})")
+    return FileResponse(output_path, media_type="text/plain; charset=utf-8", filename=f"{job_id}.txt")
+
+def _require_job_queue() -> JobQueue:
+    queue = get_job_queue()
+    if queue is None:
+        raise HTTPException(status_code=500, detail="Job queue not configured")
+    return queue
+
+def _ndjson_job_results(queue: JobQueue, job_id: str, chunk_size: int = 1000) -> Iterator[str]:
+    """Кодирует результаты задания в NDJSON и отдаёт их блоками по chunk_size строк."""
+    dumps = json.JSONEncoder(ensure_ascii=False).encode
+    results = (result for _, result in queue.iter_results(job_id))
+    for chunk in iter(lambda: list(islice(results, chunk_size)), []):
+        yield ''.join(dumps(result) + '\n' for result in chunk)
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Process pool for batch monetization.
+
+Worker processes receive the loaded configuration once (in the pool
+initializer) and keep compiled injection plans in their own caches,
+so each task carries only the content items.
+"""
+
+import asyncio
+import logging
+import math
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List, Optional, Tuple
+
+from api.pipeline import run_monetization_pipeline
+from modules.plan_cache import get_injection_plan
+from utils.metrics import configure_metrics, drain_metrics, merge_metrics
+from utils.result_cache import configure_result_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_ITEMS = 5000
+DEFAULT_STREAM_IN_FLIGHT = 32
+# Задач на процесс: меньшие куски выравнивают нагрузку, большие — снижают накладные расходы
+CHUNKS_PER_WORKER = 4
+
+# Элемент пакета: (контент, стратегия, методы)
+BatchItem = Tuple[Dict[str, Any], Optional[str], Optional[List[str]]]
+
+# Состояние процесса-исполнителя (задаётся инициализатором пула)
+_worker_config: Optional[Dict[str, Any]] = None
+_worker_config_version: Optional[str] = None
+
+def _init_worker(config: Dict[str, Any], config_version: str) -> None:
+    """Инициализатор процесса: сохраняет конфигурацию и компилирует план по умолчанию."""
+    global _worker_config, _worker_config_version
+    _worker_config = config
+    _worker_config_version = config_version
+    configure_metrics(config)
+    configure_result_cache(config, config_version)
+
+    monetization = config.get('monetization', {})
+    get_injection_plan(monetization.get('strategy', 'hidden'), monetization.get('methods', []), config, config_version)
+
+def _run_chunk(items: List[BatchItem]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Обрабатывает кусок пакета в процессе-исполнителе; ошибка элемента не прерывает кусок.
+
+    Returns:
+        Результаты элементов и наблюдения метрик куска (drain_metrics)
+        для родительского процесса
+    """
+    outcomes = []
+    for content, strategy, methods in items:
+        try:
+            outcome = run_monetization_pipeline(content, _worker_config, _worker_config_version, strategy, methods)
+            outcome["success"] = True
+        except Exception as e:
+            outcome = {"success": False, "error": f"{type(e).__name__}: {e}"}
+        outcomes.append(outcome)
+    return outcomes, drain_metrics()
+
+class MonetizationPool:
+    """
+    Пул процессов для пакетной монетизации.
+
+    Процессы запускаются методом spawn: родительский процесс API держит
+    фоновые потоки (запись событий, сохранение скетчей), и fork мог бы
+    унаследовать их заблокированные мьютексы.
+
+    Если процесс-исполнитель погибает (OOM, сигнал), исполнитель переходит
+    в состояние BrokenProcessPool навсегда; пул отмечает это в broken,
+    и get_monetization_pool заменяет его новым.
+    """
+
+    def __init__(self, config: Dict[str, Any], config_version: str, workers: int = DEFAULT_WORKERS):
+        self.workers = workers
+        self.broken = False
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(config, config_version)
+        )
+
+    async def run(self, items: List[BatchItem]) -> List[Dict[str, Any]]:
+        """
+        Обрабатывает пакет в процессах пула, не блокируя цикл событий.
+
+        Args:
+            items: Элементы пакета (контент, стратегия, методы)
+
+        Returns:
+            Результаты в порядке элементов: словари run_monetization_pipeline
+            с success=True или {"success": False, "error": ...}
+        """
+        if not items:
+            return []
+        size = max(1, math.ceil(len(items) / (self.workers * CHUNKS_PER_WORKER)))
+        chunks = await asyncio.gather(*(
+            self._execute(items[start:start + size])
+            for start in range(0, len(items), size)
+        ))
+        return [outcome for chunk in chunks for outcome in chunk]
+
+    def submit(self, item: BatchItem) -> "asyncio.Future":
+        """
+        Отправляет один элемент в пул (для потоковой обработки).
+
+        Returns:
+            Future с результатом элемента (в формате run)
+        """
+        return asyncio.ensure_future(self._run_one(item))
+
+    def close(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    async def _run_one(self, item: BatchItem) -> Dict[str, Any]:
+        return (await self._execute([item]))[0]
+
+    async def _execute(self, items: List[BatchItem]) -> List[Dict[str, Any]]:
+        try:
+            outcomes, metrics = await asyncio.get_running_loop().run_in_executor(self._executor, _run_chunk, items)
+        except BrokenProcessPool:
+            self.broken = True
+            raise
+        # Этапы и счётчик элементов процесса пула попадают в /metrics родительского процесса
+        merge_metrics(metrics)
+        return outcomes
+
+_pool: Optional[MonetizationPool] = None
+_pool_lock = threading.Lock()
+
+def get_monetization_pool(config: Dict[str, Any], config_version: str) -> MonetizationPool:
+    """
+    Возвращает общий пул процессов (создаётся при первом пакетном запросе).
+
+    Число процессов — batch.workers конфигурации. Сломанный пул (погиб
+    процесс-исполнитель) останавливается и заменяется новым.
+    """
+    global _pool
+    if _pool is None or _pool.broken:
+        with _pool_lock:
+            if _pool is None or _pool.broken:
+                if _pool is not None:
+                    logger.warning("Monetization process pool is broken (a worker died), restarting it")
+                    # Не ждём: задачи сломанного пула уже завершены с ошибкой
+                    _pool.close(wait=False)
+                workers = config.get('batch', {}).get('workers', DEFAULT_WORKERS)
+                _pool = MonetizationPool(config, config_version, workers)
+                logger.info(f"Monetization process pool started: {workers} workers")
+    return _pool
+
+def close_monetization_pool() -> None:
+    """Останавливает общий пул процессов."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
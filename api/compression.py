@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Request body decompression for JSON endpoints (Content-Encoding: gzip).
+
+Routes created with gzip_route() read the body with a size limit and
+transparently decompress it before FastAPI parses the JSON.
+"""
+
+import zlib
+from typing import Callable, Type
+
+from fastapi import HTTPException, Request, Response
+from fastapi.routing import APIRoute
+
+# Максимальный размер тела запроса после распаковки
+DEFAULT_MAX_BODY_BYTES = 32 * 1024 * 1024
+
+def gunzip_limited(data: bytes, max_bytes: int) -> bytes:
+    """
+    Распаковывает gzip (в том числе из нескольких членов), не выходя за max_bytes.
+
+    Args:
+        data: Сжатое тело
+        max_bytes: Предел размера распакованных данных
+
+    Returns:
+        Распакованные данные
+
+    Raises:
+        HTTPException: 413, если данные больше предела; 400, если gzip повреждён
+    """
+    output = bytearray()
+    try:
+        while data:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            # Распаковывается не больше предела + 1 байт: «gzip-бомба» не раздувается в памяти
+            output += decompressor.decompress(data, max_bytes + 1 - len(output))
+            if len(output) > max_bytes:
+                raise HTTPException(status_code=413, detail=f"Decompressed body exceeds {max_bytes} bytes")
+            if not decompressor.eof:
+                raise HTTPException(status_code=400, detail="Truncated gzip body")
+            data = decompressor.unused_data
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid gzip body: {e}")
+    return bytes(output)
+
+class GzipRequest(Request):
+    """Запрос, тело которого читается с ограничением размера и распаковывается при Content-Encoding: gzip."""
+
+    max_body_bytes = DEFAULT_MAX_BODY_BYTES
+
+    async def body(self) -> bytes:
+        if not hasattr(self, '_body'):
+            chunks = []
+            size = 0
+            async for chunk in self.stream():
+                size += len(chunk)
+                if size > self.max_body_bytes:
+                    raise HTTPException(status_code=413, detail=f"Request body exceeds {self.max_body_bytes} bytes")
+                chunks.append(chunk)
+            body = b''.join(chunks)
+
+            encoding = self.headers.get('content-encoding', 'identity').strip().lower()
+            if encoding == 'gzip':
+                body = gunzip_limited(body, self.max_body_bytes)
+            elif encoding not in ('', 'identity'):
+                raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding '{encoding}'")
+            self._body = body
+        return self._body
+
+def gzip_route(max_body_bytes: int = DEFAULT_MAX_BODY_BYTES) -> Type[APIRoute]:
+    """
+    Создаёт класс маршрута FastAPI, принимающий тела в gzip.
+
+    Args:
+        max_body_bytes: Предел размера тела (сжатого и распакованного)
+
+    Returns:
+        Подкласс APIRoute для APIRouter(route_class=...)
+    """
+    request_class = type('GzipRequest', (GzipRequest,), {'max_body_bytes': max_body_bytes})
+
+    class GzipRoute(APIRoute):
+        def get_route_handler(self) -> Callable:
+            handler = super().get_route_handler()
+
+            async def gzip_route_handler(request: Request) -> Response:
+                return await handler(request_class(request.scope, request.receive))
+
+            return gzip_route_handler
+
+    return GzipRoute
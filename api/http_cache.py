@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP caching helpers: ETag construction and conditional request handling.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from fastapi import Response
+
+# Ответы, зависящие только от кода сервера (список стратегий и т.п.)
+STATIC_CACHE_CONTROL = "public, max-age=3600"
+# Ответы на содержимое запроса: клиент хранит ответ, но перепроверяет его по ETag
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+def make_etag(payload: Any) -> str:
+    """
+    Строгий ETag по содержимому: хеш канонического JSON.
+
+    Args:
+        payload: Сериализуемое в JSON значение или готовый ключ (строка)
+
+    Returns:
+        ETag в кавычках, например '"3f2a..."'
+    """
+    if not isinstance(payload, str):
+        payload = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return '"' + hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest() + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Проверяет If-None-Match (слабое сравнение: W/ не учитывается, "*" совпадает всегда).
+
+    Args:
+        if_none_match: Значение заголовка If-None-Match (или None)
+        etag: Текущий ETag ресурса
+
+    Returns:
+        True, если клиент уже имеет эту версию ответа
+    """
+    if not if_none_match:
+        return False
+    etag = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+def cache_headers(etag: str, cache_control: str = REVALIDATE_CACHE_CONTROL) -> Dict[str, str]:
+    """Заголовки кэширования ответа с данным ETag."""
+    return {"ETag": etag, "Cache-Control": cache_control}
+
+def not_modified(etag: str, cache_control: str = REVALIDATE_CACHE_CONTROL) -> Response:
+    """Ответ 304 без тела с заголовками кэширования."""
+    return Response(status_code=304, headers=cache_headers(etag, cache_control))
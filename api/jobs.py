@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Long-running job handlers for the job queue.
+
+Jobs run the same pipeline as the command-line tool (main.process_content
+and main.process_book_manuscript) in job queue worker threads.
+"""
+
+import os
+from typing import Dict, Any, Callable, Optional
+
+from main import process_content, process_book_manuscript
+from modules.job_queue import JobContext
+from utils.config_snapshot import freeze_config
+
+# Типы заданий
+JOB_KINDS = ('content', 'catalog', 'book')
+
+# Элементов каталога на одну запись результатов (и точку продолжения после перезапуска)
+CATALOG_COMMIT_ITEMS = 100
+
+OUTPUT_FILE = 'output.txt'
+
+def validate_job_payload(kind: str, payload: Dict[str, Any]) -> None:
+    """
+    Проверяет, что у задания есть входные данные его типа.
+
+    Raises:
+        ValueError: Если тип неизвестен или данных нет
+    """
+    required = {'content': 'content', 'catalog': 'items', 'book': 'manuscript'}
+    if kind not in required:
+        raise ValueError(f"Unknown job kind '{kind}', expected one of {list(JOB_KINDS)}")
+    if not payload.get(required[kind]):
+        raise ValueError(f"Job kind '{kind}' requires '{required[kind]}'")
+
+def build_job_handlers(config: Dict[str, Any]) -> Dict[str, Callable[[JobContext], Optional[Dict[str, Any]]]]:
+    """Возвращает обработчики заданий всех типов для данной конфигурации."""
+    # Один снимок на все задания: отпечаток конфигурации не пересчитывается на каждый элемент
+    config = freeze_config(config)
+    return {
+        'content': lambda context: run_content_job(context, config),
+        'catalog': lambda context: run_catalog_job(context, config),
+        'book': lambda context: run_book_job(context, config)
+    }
+
+def run_content_job(context: JobContext, config: Dict[str, Any]) -> Dict[str, Any]:
+    """Обрабатывает один элемент контента; результат — элемент 0."""
+    processed = process_content(context.payload['content'], config, context.payload.get('content_type', 'video'))
+    context.add_results([{"index": 0, "success": True, "result": processed}], total=1)
+    return {"items": 1, "failed": 0}
+
+def run_catalog_job(context: JobContext, config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Обрабатывает каталог (например, все видео канала) по элементам.
+
+    Ошибка элемента записывается в его результат и не прерывает задание.
+    Результаты сохраняются по CATALOG_COMMIT_ITEMS элементов, после
+    перезапуска обработка продолжается с первого несохранённого.
+    """
+    items = context.payload['items']
+    content_type = context.payload.get('content_type', 'video')
+    context.set_total(len(items))
+
+    while context.done < len(items):
+        results = []
+        failed = 0
+        for index in range(context.done, min(context.done + CATALOG_COMMIT_ITEMS, len(items))):
+            context.check_cancelled()
+            try:
+                results.append({"index": index, "success": True, "result": process_content(items[index], config, content_type)})
+            except Exception as e:
+                results.append({"index": index, "success": False, "error": f"{type(e).__name__}: {e}"})
+                failed += 1
+        context.add_results(results, failed)
+
+    return {"items": len(items), "failed": context.queue.get(context.job_id)["progress"]["failed"]}
+
+def run_book_job(context: JobContext, config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Обрабатывает рукопись книги целиком.
+
+    Рукопись сохраняется в каталог задания под именем <id задания>.txt
+    (имя файла — идентификатор книги в событиях аналитики), результат —
+    файл OUTPUT_FILE там же; статистика обработки — элемент 0 и сводка задания.
+    """
+    os.makedirs(context.directory, exist_ok=True)
+    input_path = os.path.join(context.directory, f"{context.job_id}.txt")
+    output_path = os.path.join(context.directory, OUTPUT_FILE)
+    if not os.path.exists(input_path):
+        # Через временный файл: после сбоя при записи рукопись не останется обрезанной
+        with open(input_path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(context.payload['manuscript'])
+        os.replace(input_path + '.tmp', input_path)
+
+    context.check_cancelled()
+    stats = process_book_manuscript(input_path, output_path, config)
+    context.add_results([{"index": 0, "success": True, "result": stats}], total=1)
+    return stats
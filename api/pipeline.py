@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Monetization pipeline shared by the API endpoints and batch worker processes.
+"""
+
+import hashlib
+import json
+from typing import Dict, Any, List, Optional, Tuple
+
+from modules.plan_cache import get_injection_plan
+from modules.content_injector import apply_injection_plan
+from modules.strategy_planner import STRATEGIES
+from modules.analytics_tracker import METRICS_VERSION, analyze_description
+from modules.compliance_checker import RULESET_VERSION
+from utils.config_loader import compute_config_version
+from utils.metrics import count_item, stage_labels
+
+# Платформы, по которым API проверяет монетизированное описание
+COMPLIANCE_PLATFORMS = ('youtube', 'general')
+# Тип контента в метках метрик: API проверяет описания как описания видео YouTube
+PIPELINE_CONTENT_TYPE = 'video'
+
+def resolve_strategy(
+    config: Dict[str, Any],
+    strategy: Optional[str] = None,
+    methods: Optional[List[str]] = None
+) -> Tuple[str, List[str]]:
+    """
+    Возвращает действующие стратегию и методы (не заданные — из конфигурации).
+    
+    Raises:
+        ValueError: Если стратегия неизвестна
+    """
+    monetization = config.get('monetization', {})
+    strategy = strategy or monetization.get('strategy', 'hidden')
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy '{strategy}', expected one of {list(STRATEGIES)}")
+    if methods is None:
+        methods = monetization.get('methods', [])
+    return strategy, list(methods)
+
+def monetization_request_key(
+    content: Dict[str, Any],
+    config: Dict[str, Any],
+    config_version: Optional[str] = None,
+    strategy: Optional[str] = None,
+    methods: Optional[List[str]] = None
+) -> str:
+    """
+    Детерминированный ключ запроса монетизации (ключ кэша результатов и ETag).
+    
+    Результат конвейера зависит только от контента, действующих стратегии
+    и методов, версии конфигурации и версий правил проверки и метрик,
+    поэтому одинаковые запросы дают одинаковый ключ, в том числе
+    когда стратегия задана явно и когда она взята из конфигурации.
+    
+    Args:
+        content: Словарь с контентом (id, title, description)
+        config: Конфигурация монетизации
+        config_version: Версия конфигурации (вычисляется, если не передана)
+        strategy: Стратегия (по умолчанию — из конфигурации)
+        methods: Методы монетизации (по умолчанию — из конфигурации)
+    
+    Returns:
+        Шестнадцатеричный хеш (32 символа)
+    
+    Raises:
+        ValueError: Если стратегия неизвестна
+    """
+    strategy, methods = resolve_strategy(config, strategy, methods)
+    if config_version is None:
+        config_version = compute_config_version(config)
+    fields = sorted(content)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps(
+        [config_version, RULESET_VERSION, METRICS_VERSION, strategy, methods, fields],
+        ensure_ascii=False
+    ).encode('utf-8'))
+    # Поля контента хешируются без сериализации всего словаря в JSON (описание бывает длинным);
+    # длина и тип значения исключают совпадение разных наборов полей
+    for field in fields:
+        value = content[field]
+        if isinstance(value, str):
+            data = b's' + value.encode('utf-8', 'surrogatepass')
+        else:
+            data = b'j' + json.dumps(value, sort_keys=True, ensure_ascii=False).encode('utf-8', 'surrogatepass')
+        digest.update(len(data).to_bytes(8, 'little'))
+        digest.update(data)
+    return digest.hexdigest()
+
+def run_monetization_pipeline(
+    content: Dict[str, Any],
+    config: Dict[str, Any],
+    config_version: Optional[str] = None,
+    strategy: Optional[str] = None,
+    methods: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    Применяет монетизацию к одному элементу контента: план, внедрение, проверка и метрики.
+    
+    Конфигурация не изменяется: стратегия и методы элемента передаются
+    в планировщик отдельно. События аналитики не отправляются — это делает
+    вызывающий код (в пакетном режиме — родительский процесс).
+    
+    Args:
+        content: Словарь с контентом (id, title, description)
+        config: Конфигурация монетизации
+        config_version: Версия конфигурации (ключ кэша планов)
+        strategy: Стратегия (по умолчанию — из конфигурации)
+        methods: Методы монетизации (по умолчанию — из конфигурации)
+    
+    Returns:
+        Словарь: result, metrics, compliance_warnings, strategy, actions
+    
+    Raises:
+        ValueError: Если стратегия неизвестна
+    """
+    strategy, methods = resolve_strategy(config, strategy, methods)
+    
+    with stage_labels(strategy, PIPELINE_CONTENT_TYPE):
+        plan = get_injection_plan(strategy, methods, config, config_version)
+        result = apply_injection_plan(content, plan)
+        
+        # Проверка соответствия и метрики — один проход по описанию
+        verdicts, metrics = analyze_description(result.get('description', ''), COMPLIANCE_PLATFORMS)
+        compliance_warnings = {platform: issues for platform, issues in verdicts.items() if issues}
+    count_item(strategy, PIPELINE_CONTENT_TYPE)
+    
+    return {
+        "result": result,
+        "metrics": metrics,
+        "compliance_warnings": compliance_warnings,
+        "strategy": strategy,
+        "actions": list(plan.actions)
+    }
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NDJSON streaming helpers for the API.
+
+The request body is read incrementally while the response is being sent,
+so both directions of a stream use constant memory.
+"""
+
+from typing import AsyncIterator
+
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Максимальная длина строки NDJSON (защита от тела без переводов строк)
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    Потоковый ответ, который можно формировать, пока читается тело запроса.
+
+    Обычный StreamingResponse параллельно ждёт отключения клиента через receive()
+    и при этом забирает из канала сообщения с телом запроса. Здесь канал читает
+    только генератор ответа (через request.stream()), а отключение клиента
+    проявляется в нём как ClientDisconnect.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+async def iter_ndjson_lines(request: Request) -> AsyncIterator[bytes]:
+    """
+    Читает тело запроса по частям и выдаёт непустые строки NDJSON.
+
+    Raises:
+        ValueError: Если строка длиннее MAX_LINE_BYTES
+    """
+    buffer = bytearray()
+    async for chunk in request.stream():
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b'\n', start)
+            if end < 0:
+                break
+            line = bytes(buffer[start:end]).strip()
+            if line:
+                yield line
+            start = end + 1
+        del buffer[:start]
+        if len(buffer) > MAX_LINE_BYTES:
+            raise ValueError(f"NDJSON line exceeds {MAX_LINE_BYTES} bytes")
+
+    line = bytes(buffer).strip()
+    if line:
+        yield line
@@ -7,12 +7,54 @@ Client library for SSV Monetization Tool API.
 Provides easy integration with ssv-web-dashboard and other tools.
 """
 
+import gzip
+import http.client
+import json
+import socket
+import threading
+import time
+from collections import OrderedDict
 import requests
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterable, Iterator, List, Optional
+from urllib.parse import urlencode, urlsplit
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Ответов с ETag, которые клиент хранит для условных запросов
+DEFAULT_ETAG_CACHE_SIZE = 256
+# Тела запросов больше этого размера сжимаются gzip
+DEFAULT_GZIP_MIN_BYTES = 1024
+# Пределы одного запроса пакетной проверки соответствия (текстов и байт JSON)
+DEFAULT_BULK_CHUNK_ITEMS = 1000
+DEFAULT_BULK_CHUNK_BYTES = 4 * 1024 * 1024
+
+
+def _shutdown_socket(sock: Optional[socket.socket]) -> None:
+    """Закрывает соединение в обе стороны (ошибки уже закрытого сокета игнорируются)."""
+    if sock is None:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def _chunk_texts(texts: List[str], max_items: int, max_bytes: int) -> Iterator[List[str]]:
+    """Делит тексты на куски не больше max_items штук и примерно max_bytes байт (не меньше одного текста)."""
+    chunk: List[str] = []
+    size = 0
+    for text in texts:
+        # Оценка размера в JSON: байты UTF-8 плюс кавычки и запятая
+        text_size = len(text.encode('utf-8')) + 3
+        if chunk and (len(chunk) >= max_items or size + text_size > max_bytes):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(text)
+        size += text_size
+    if chunk:
+        yield chunk
+
 
 class MonetizationClient:
     """
@@ -35,15 +77,85 @@ class MonetizationClient:
         ```
     """
     
-    def __init__(self, base_url: str = "http://localhost:8000"):
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8000",
+        etag_cache_size: int = DEFAULT_ETAG_CACHE_SIZE,
+        gzip_min_bytes: int = DEFAULT_GZIP_MIN_BYTES
+    ):
         """
         Инициализация клиента.
         
         Args:
             base_url: Базовый URL API сервера
+            etag_cache_size: Сколько ответов с ETag хранить для повторных
+                запросов (0 — не использовать условные запросы)
+            gzip_min_bytes: Тела проверок соответствия от этого размера
+                отправляются сжатыми gzip
         """
         self.base_url = base_url.rstrip('/')
         self.session = requests.Session()
+        self.etag_cache_size = etag_cache_size
+        self.gzip_min_bytes = gzip_min_bytes
+        # (метод, URL, тело запроса) -> (ETag, тело ответа), порядок — LRU
+        self._etag_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._etag_lock = threading.Lock()
+    
+    def _conditional_request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        Выполняет запрос с If-None-Match, если ответ на такой же запрос уже получен.
+        
+        При ответе 304 тело берётся из сохранённого ответа.
+        
+        Returns:
+            Разобранный JSON ответа
+        
+        Raises:
+            requests.RequestException: При ошибке запроса
+        """
+        url = f"{self.base_url}{path}"
+        body = json.dumps(payload, sort_keys=True, ensure_ascii=False) if payload is not None else None
+        key = (method, url, body)
+        with self._etag_lock:
+            cached = self._etag_cache.get(key)
+        headers = {'If-None-Match': cached[0]} if cached else None
+        
+        response = self.session.request(method, url, json=payload, headers=headers)
+        if response.status_code == 304 and cached is not None:
+            with self._etag_lock:
+                if key in self._etag_cache:
+                    self._etag_cache.move_to_end(key)
+            return json.loads(cached[1])
+        response.raise_for_status()
+        
+        etag = response.headers.get('ETag')
+        if etag and self.etag_cache_size > 0:
+            with self._etag_lock:
+                self._etag_cache[key] = (etag, response.content)
+                self._etag_cache.move_to_end(key)
+                while len(self._etag_cache) > self.etag_cache_size:
+                    self._etag_cache.popitem(last=False)
+        return response.json()
+    
+    def _post_json(self, path: str, payload: Dict[str, Any], compress: bool = True) -> Any:
+        """
+        Отправляет JSON POST-запросом; крупное тело сжимается gzip.
+        
+        Returns:
+            Разобранный JSON ответа
+        
+        Raises:
+            requests.RequestException: При ошибке запроса
+        """
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if compress and len(body) >= self.gzip_min_bytes:
+            body = gzip.compress(body, compresslevel=6)
+            headers['Content-Encoding'] = 'gzip'
+        
+        response = self.session.post(f"{self.base_url}{path}", data=body, headers=headers)
+        response.raise_for_status()
+        return response.json()
     
     def health_check(self) -> Dict[str, Any]:
         """
@@ -87,16 +199,136 @@ class MonetizationClient:
                 "methods": methods
             }
             
+            # Повторный запрос с тем же контентом подтверждается сервером по ETag (304 без тела)
+            return self._conditional_request('POST', '/api/v1/monetize', payload)
+        
+        except requests.RequestException as e:
+            logger.error(f"Failed to monetize content: {e}")
+            raise
+    
+    def monetize_batch(
+        self,
+        items: List[Dict[str, Any]],
+        strategy: Optional[str] = None,
+        methods: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Применяет монетизацию к пакету контента.
+        
+        Args:
+            items: Элементы {"content": {...}, "strategy": ..., "methods": [...]};
+                strategy и methods элемента необязательны
+            strategy: Стратегия для элементов без своей
+            methods: Методы для элементов без своих
+        
+        Returns:
+            Словарь: processed, failed и results в порядке элементов
+            (для ошибочных элементов — success=False и error)
+        """
+        try:
+            payload = {
+                "items": items,
+                "strategy": strategy,
+                "methods": methods
+            }
+            
             response = self.session.post(
-                f"{self.base_url}/api/v1/monetize",
+                f"{self.base_url}/api/v1/monetize/batch",
                 json=payload
             )
             response.raise_for_status()
             return response.json()
         
         except requests.RequestException as e:
-            logger.error(f"Failed to monetize content: {e}")
+            logger.error(f"Failed to monetize batch: {e}")
+            raise
+    
+    def monetize_stream(
+        self,
+        items: Iterable[Dict[str, Any]],
+        strategy: Optional[str] = None,
+        methods: Optional[List[str]] = None,
+        timeout: Optional[float] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Потоковая монетизация: элементы отправляются и результаты читаются одновременно.
+        
+        Тело запроса (NDJSON, chunked) пишется отдельным потоком по мере чтения
+        items, а результаты выдаются по мере получения, поэтому память клиента
+        не зависит от длины потока. Результаты приходят в порядке готовности,
+        элемент определяется по полю index (номер во входном потоке).
+        
+        Args:
+            items: Элементы {"content": {...}, "strategy": ..., "methods": [...]}
+                (итератор читается в отдельном потоке)
+            strategy: Стратегия для элементов без своей
+            methods: Методы для элементов без своих
+            timeout: Таймаут операций с сокетом в секундах
+        
+        Yields:
+            Результаты элементов (формат элемента ответа monetize_batch)
+        
+        Raises:
+            requests.RequestException: При ошибке соединения или ответа сервера
+        """
+        url = urlsplit(f"{self.base_url}/api/v1/monetize/stream")
+        params: Dict[str, Any] = {"methods": methods or []}
+        if strategy:
+            params["strategy"] = strategy
+        query = urlencode(params, doseq=True)
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        connection = connection_class(url.hostname, url.port, timeout=timeout)
+        send_errors: List[BaseException] = []
+        
+        def send_items(sock: socket.socket) -> None:
+            # Пишем прямо в сокет: getresponse() может закрыть connection.sock (Connection: close)
+            try:
+                for item in items:
+                    data = json.dumps(item, ensure_ascii=False).encode('utf-8') + b'\n'
+                    sock.sendall(b'%x\r\n%s\r\n' % (len(data), data))
+                sock.sendall(b'0\r\n\r\n')
+            except BaseException as e:
+                send_errors.append(e)
+                # Разблокируем чтение ответа в основном потоке
+                _shutdown_socket(sock)
+        
+        sender = None
+        sock = None
+        try:
+            connection.putrequest('POST', f"{url.path}?{query}" if query else url.path)
+            connection.putheader('Content-Type', 'application/x-ndjson')
+            connection.putheader('Transfer-Encoding', 'chunked')
+            connection.endheaders()
+            
+            sock = connection.sock
+            sender = threading.Thread(target=send_items, args=(sock,), name="monetize-stream-sender", daemon=True)
+            sender.start()
+            
+            response = connection.getresponse()
+            if response.status != 200:
+                raise requests.HTTPError(f"{response.status} {response.reason}: {response.read().decode('utf-8', 'replace')}")
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+            
+            sender.join()
+            if send_errors:
+                raise requests.ConnectionError(f"Failed to send stream items: {send_errors[0]}")
+        
+        except (OSError, http.client.HTTPException) as e:
+            if send_errors:
+                e = send_errors[0]
+            logger.error(f"Failed to monetize stream: {e}")
+            raise requests.ConnectionError(str(e)) from e
+        except requests.RequestException as e:
+            logger.error(f"Failed to monetize stream: {e}")
             raise
+        finally:
+            # Итерацию могли прервать досрочно: останавливаем отправку
+            if sender is not None and sender.is_alive():
+                _shutdown_socket(sock)
+                sender.join()
+            connection.close()
     
     def check_youtube_compliance(self, description: str) -> Dict[str, Any]:
         """
@@ -109,12 +341,7 @@ class MonetizationClient:
             Словарь с результатом проверки
         """
         try:
-            response = self.session.get(
-                f"{self.base_url}/api/v1/compliance/youtube",
-                params={"description": description}
-            )
-            response.raise_for_status()
-            return response.json()
+            return self._post_json("/api/v1/compliance/youtube", {"description": description})
         
         except requests.RequestException as e:
             logger.error(f"Failed to check YouTube compliance: {e}")
@@ -131,17 +358,52 @@ class MonetizationClient:
             Словарь с результатом проверки
         """
         try:
-            response = self.session.get(
-                f"{self.base_url}/api/v1/compliance/amazon-kdp",
-                params={"description": description}
-            )
-            response.raise_for_status()
-            return response.json()
+            return self._post_json("/api/v1/compliance/amazon-kdp", {"description": description})
         
         except requests.RequestException as e:
             logger.error(f"Failed to check Amazon KDP compliance: {e}")
             raise
     
+    def check_compliance_bulk(
+        self,
+        texts: List[str],
+        platforms: Optional[List[str]] = None,
+        chunk_size: int = DEFAULT_BULK_CHUNK_ITEMS,
+        chunk_bytes: int = DEFAULT_BULK_CHUNK_BYTES
+    ) -> Dict[str, Any]:
+        """
+        Проверяет пакет текстов для нескольких платформ.
+        
+        Большой список делится на запросы не больше chunk_size текстов и
+        примерно chunk_bytes байт JSON; ответы объединяются в порядке текстов.
+        
+        Args:
+            texts: Тексты для проверки
+            platforms: Платформы (по умолчанию youtube, amazon_kdp и general)
+            chunk_size: Максимум текстов в одном запросе
+            chunk_bytes: Примерный предел размера одного запроса до сжатия
+        
+        Returns:
+            Словарь: count, non_compliant и results — вердикты в порядке текстов
+            ({"compliant": true} или {"compliant": false, "issues": {платформа: [...]}})
+        """
+        result: Dict[str, Any] = {"count": 0, "non_compliant": 0, "results": []}
+        try:
+            for chunk in _chunk_texts(texts, chunk_size, chunk_bytes):
+                payload: Dict[str, Any] = {"texts": chunk}
+                if platforms is not None:
+                    payload["platforms"] = platforms
+                
+                response = self._post_json("/api/v1/compliance/bulk", payload)
+                result["count"] += response["count"]
+                result["non_compliant"] += response["non_compliant"]
+                result["results"].extend(response["results"])
+            return result
+        
+        except requests.RequestException as e:
+            logger.error(f"Failed to check bulk compliance: {e}")
+            raise
+    
     def get_strategies(self) -> List[Dict[str, str]]:
         """
         Получает список доступных стратегий монетизации.
@@ -150,9 +412,7 @@ class MonetizationClient:
             Список стратегий с описаниями
         """
         try:
-            response = self.session.get(f"{self.base_url}/api/v1/strategies")
-            response.raise_for_status()
-            return response.json()['strategies']
+            return self._conditional_request('GET', '/api/v1/strategies')['strategies']
         
         except requests.RequestException as e:
             logger.error(f"Failed to get strategies: {e}")
@@ -195,6 +455,312 @@ class MonetizationClient:
         except requests.RequestException as e:
             logger.error(f"Failed to generate unique link: {e}")
             raise
+    
+    def generate_unique_links(
+        self,
+        base_url: str,
+        content_ids: List[str],
+        source: str,
+        medium: str = "description",
+        campaign: Optional[str] = None
+    ) -> Iterator[Dict[str, str]]:
+        """
+        Генерирует уникальные ссылки для списка контента.
+        
+        Ответ сервера читается потоком, ссылки выдаются по мере получения.
+        
+        Args:
+            base_url: Базовый URL ссылки
+            content_ids: Идентификаторы контента
+            source: Источник трафика
+            medium: Тип размещения
+            campaign: Кампания (идентификатор контента тогда идёт в utm_content)
+        
+        Yields:
+            Словари {"content_id": ..., "link": ...} в порядке content_ids
+        """
+        try:
+            payload = {
+                "base_url": base_url,
+                "content_ids": content_ids,
+                "source": source,
+                "medium": medium,
+                "campaign": campaign
+            }
+            
+            with self.session.post(
+                f"{self.base_url}/api/v1/analytics/links",
+                json=payload,
+                stream=True
+            ) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if line:
+                        yield json.loads(line)
+        
+        except requests.RequestException as e:
+            logger.error(f"Failed to generate unique links: {e}")
+            raise
+    
+    def track_clicks(self, events: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Отправляет пачку переходов по UTM-ссылкам и конверсий.
+        
+        Args:
+            events: События: event_type ('click' или 'conversion'), utm_content,
+                utm_campaign, visitor_id, timestamp
+        
+        Returns:
+            Количество принятых и отклонённых событий
+        """
+        try:
+            response = self.session.post(
+                f"{self.base_url}/api/v1/analytics/clicks",
+                json={"events": events}
+            )
+            response.raise_for_status()
+            return response.json()
+        
+        except requests.RequestException as e:
+            logger.error(f"Failed to track clicks: {e}")
+            raise
+    
+    def get_click_report(
+        self,
+        event_type: str = "click",
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        campaign: Optional[str] = None,
+        content_ids: Optional[List[str]] = None,
+        top: int = 10
+    ) -> Dict[str, Any]:
+        """
+        Получает сводку по переходам или конверсиям за период.
+        
+        Args:
+            event_type: 'click' или 'conversion'
+            start: Начало периода (ISO-время)
+            end: Конец периода (ISO-время)
+            campaign: Уникальные посетители только этой кампании
+            content_ids: Оценить число событий ссылок этого контента
+            top: Сколько самых популярных ссылок вернуть
+        
+        Returns:
+            Сводка: events, unique_visitors, unique_visitors_by_campaign, top_links
+        """
+        try:
+            params = {
+                "event_type": event_type,
+                "start": start,
+                "end": end,
+                "campaign": campaign,
+                "content_ids": ','.join(content_ids) if content_ids else None,
+                "top": top
+            }
+            
+            response = self.session.get(
+                f"{self.base_url}/api/v1/analytics/clicks",
+                params=params
+            )
+            response.raise_for_status()
+            return response.json()
+        
+        except requests.RequestException as e:
+            logger.error(f"Failed to get click report: {e}")
+            raise
+    
+    def get_report(
+        self,
+        content_ids: Optional[List[str]] = None,
+        strategy: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        granularity: str = "day"
+    ) -> Dict[str, Any]:
+        """
+        Получает агрегированный отчёт о монетизации.
+        
+        Args:
+            content_ids: Отчёт по этому контенту (иначе — за период start..end)
+            strategy: Только события этой стратегии
+            start: Начало периода (ISO-время)
+            end: Конец периода (ISO-время)
+            granularity: Интервал временного ряда ('hour' или 'day')
+        
+        Returns:
+            Отчёт: totals, by_strategy и (для периода) timeline
+        """
+        try:
+            payload = {
+                "content_ids": content_ids,
+                "strategy": strategy,
+                "start": start,
+                "end": end,
+                "granularity": granularity
+            }
+            
+            response = self.session.post(
+                f"{self.base_url}/api/v1/report",
+                json=payload
+            )
+            response.raise_for_status()
+            return response.json()
+        
+        except requests.RequestException as e:
+            logger.error(f"Failed to get monetization report: {e}")
+            raise
+    
+    def submit_job(
+        self,
+        kind: str,
+        content: Optional[Dict[str, Any]] = None,
+        items: Optional[List[Dict[str, Any]]] = None,
+        manuscript: Optional[str] = None,
+        content_type: str = "video"
+    ) -> Dict[str, Any]:
+        """
+        Ставит долгое задание в очередь сервера.
+        
+        Args:
+            kind: 'content' (один элемент), 'catalog' (список элементов) или 'book' (рукопись)
+            content: Контент для kind='content'
+            items: Элементы контента для kind='catalog'
+            manuscript: Текст рукописи для kind='book'
+            content_type: Тип контента ('video' или 'book') для content и catalog
+        
+        Returns:
+            Состояние задания (id для опроса)
+        """
+        try:
+            payload = {
+                "kind": kind,
+                "content": content,
+                "items": items,
+                "manuscript": manuscript,
+                "content_type": content_type
+            }
+            
+            response = self.session.post(
+                f"{self.base_url}/api/v1/jobs",
+                json=payload
+            )
+            response.raise_for_status()
+            return response.json()
+        
+        except requests.RequestException as e:
+            logger.error(f"Failed to submit job: {e}")
+            raise
+    
+    def get_job(self, job_id: str) -> Dict[str, Any]:
+        """
+        Получает состояние и прогресс задания.
+        
+        Args:
+            job_id: Идентификатор задания
+        
+        Returns:
+            Словарь: status, progress (done, total, failed), summary, error
+        """
+        try:
+            response = self.session.get(f"{self.base_url}/api/v1/jobs/{job_id}")
+            response.raise_for_status()
+            return response.json()
+        
+        except requests.RequestException as e:
+            logger.error(f"Failed to get job {job_id}: {e}")
+            raise
+    
+    def wait_for_job(
+        self,
+        job_id: str,
+        poll_interval: float = 2.0,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Опрашивает задание, пока оно не завершится.
+        
+        Args:
+            job_id: Идентификатор задания
+            poll_interval: Пауза между опросами в секундах
+            timeout: Максимальное время ожидания в секундах (None — без ограничения)
+        
+        Returns:
+            Состояние завершённого задания (succeeded, failed или cancelled)
+        
+        Raises:
+            TimeoutError: Если задание не завершилось за timeout
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            job = self.get_job(job_id)
+            if job["status"] in ("succeeded", "failed", "cancelled"):
+                return job
+            if deadline is not None and time.monotonic() + poll_interval > deadline:
+                raise TimeoutError(f"Job {job_id} is still {job['status']} after {timeout} s")
+            time.sleep(poll_interval)
+    
+    def cancel_job(self, job_id: str) -> Dict[str, Any]:
+        """
+        Отменяет задание.
+        
+        Args:
+            job_id: Идентификатор задания
+        
+        Returns:
+            Состояние задания
+        """
+        try:
+            response = self.session.post(f"{self.base_url}/api/v1/jobs/{job_id}/cancel")
+            response.raise_for_status()
+            return response.json()
+        
+        except requests.RequestException as e:
+            logger.error(f"Failed to cancel job {job_id}: {e}")
+            raise
+    
+    def get_job_results(self, job_id: str) -> Iterator[Dict[str, Any]]:
+        """
+        Выгружает результаты элементов задания по мере чтения ответа.
+        
+        Args:
+            job_id: Идентификатор задания
+        
+        Yields:
+            Результаты элементов по порядку: index, success, result или error
+        """
+        try:
+            with self.session.get(f"{self.base_url}/api/v1/jobs/{job_id}/result", stream=True) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if line:
+                        yield json.loads(line)
+        
+        except requests.RequestException as e:
+            logger.error(f"Failed to get results of job {job_id}: {e}")
+            raise
+    
+    def download_job_output(self, job_id: str, path: str) -> str:
+        """
+        Сохраняет обработанную рукопись задания типа book в файл.
+        
+        Args:
+            job_id: Идентификатор задания
+            path: Путь к файлу результата
+        
+        Returns:
+            Путь к файлу
+        """
+        try:
+            with self.session.get(f"{self.base_url}/api/v1/jobs/{job_id}/output", stream=True) as response:
+                response.raise_for_status()
+                with open(path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=65536):
+                        f.write(chunk)
+            return path
+        
+        except requests.RequestException as e:
+            logger.error(f"Failed to download output of job {job_id}: {e}")
+            raise
 
 
 # Пример использования
@@ -252,3 +818,4 @@ if __name__ == "__main__":
         medium="description"
     )
     print(f"   Ссылка: {link}")
+
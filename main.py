@@ -10,28 +10,32 @@ SSV Monetization Tool - Main Entry Point
 
 import sys
 import json
+import time
 from pathlib import Path
 from typing import Dict, Any
 
 # Импорт модулей инструмента
-from utils.logger import setup_logger
-from utils.config_loader import load_and_validate_config
-from modules.strategy_planner import determine_actions_for_strategy
-from modules.content_injector import inject_monetization_elements
-from modules.compliance_checker import (
-    check_youtube_description_compliance,
-    check_amazon_kdp_compliance,
-    check_general_compliance
-)
+from utils.logger import setup_logger, configure_logging
+from utils.config_loader import load_and_validate_config, compute_config_version
+from utils.config_snapshot import freeze_config
+from utils.result_cache import configure_result_cache, get_result_cache
+from utils.metrics import configure_metrics, count_item, observe_stage, stage_id, stage_labels
+from modules.plan_cache import get_injection_plan
+from modules.content_injector import apply_injection_plan
+from modules.book_injector import inject_book_manuscript
+from modules.stream_compliance import check_amazon_kdp_compliance_stream
+from modules.event_sink import configure_event_sink
 from modules.analytics_tracker import (
     prepare_monetization_report,
-    calculate_monetization_metrics,
+    analyze_description,
     track_monetization_event
 )
 
 # Настройка логирования
 logger = setup_logger(__name__)
 
+STAGE_PROCESS = stage_id('process')
+
 
 def process_content(content: Dict[str, Any], config: Dict[str, Any], content_type: str = "video") -> Dict[str, Any]:
     """
@@ -39,67 +43,98 @@ def process_content(content: Dict[str, Any], config: Dict[str, Any], content_typ
     
     Args:
         content: Словарь с контентом для обработки
-        config: Конфигурация монетизации
+        config: Конфигурация монетизации; при обработке многих элементов
+            передавайте снимок freeze_config — отпечаток словаря
+            вычисляется при каждом вызове
         content_type: Тип контента ('video', 'book')
     
     Returns:
         Обработанный контент с элементами монетизации
     """
-    logger.info(f"Processing {content_type} content")
+    logger.info("Processing %s content", content_type)
     
     # Определяем стратегию
     strategy = config.get('monetization', {}).get('strategy', 'hidden')
-    logger.info(f"Using strategy: {strategy}")
-    
-    # Определяем действия на основе стратегии
-    actions = determine_actions_for_strategy(strategy, config)
-    
-    if not actions:
-        logger.info("No monetization actions required for this strategy")
-        return content
-    
-    # Внедряем элементы монетизации
-    modified_content = inject_monetization_elements(content, actions, config)
+    logger.info("Using strategy: %s", strategy)
+    
+    started = time.perf_counter()
+    with stage_labels(strategy, content_type):
+        # Версия конфигурации: ключ кэша планов и кэша результатов (у снимка — готовый отпечаток).
+        # Ограничения кэша задаются один раз в main(), здесь только сверка версии
+        config_version = compute_config_version(config)
+        get_result_cache().set_version(config_version)
+        
+        # Получаем скомпилированный план (действия, тексты, автомат ключевых слов)
+        methods = config.get('monetization', {}).get('methods', [])
+        plan = get_injection_plan(strategy, methods, config, config_version)
+        actions = list(plan.actions)
+        
+        if not actions:
+            logger.info("No monetization actions required for this strategy")
+            return content
+        
+        # Внедряем элементы монетизации
+        modified_content = apply_injection_plan(content, plan)
+        
+        # Проверяем соответствие политикам платформ
+        description = modified_content.get('description', '')
+        
+        # Все платформы и метрики считаются одним сканированием текста
+        platforms = {'video': ('youtube',), 'book': ('amazon_kdp',)}.get(content_type, ()) + ('general',)
+        verdicts, metrics = analyze_description(description, platforms)
+        
+        compliance_warnings = {platform: issues for platform, issues in verdicts.items() if issues}
+        if compliance_warnings:
+            logger.warning("Compliance issues found: %s", compliance_warnings)
+            modified_content['compliance_warnings'] = compliance_warnings
+        
+        modified_content['metrics'] = metrics
+        observe_stage(STAGE_PROCESS, started)
+        count_item(strategy, content_type)
+        
+        # Отслеживаем событие
+        track_monetization_event('content_processed', content.get('id', 'unknown'), {
+            'strategy': strategy,
+            'actions': actions,
+            'content_type': content_type,
+            'metrics': metrics,
+            'compliance_warnings': compliance_warnings
+        })
+        
+        logger.info("Content processing completed")
+        return modified_content
+
+
+def process_book_manuscript(input_path: str, output_path: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Потоково обрабатывает рукопись книги целиком.
     
-    # Проверяем соответствие политикам платформ
-    description = modified_content.get('description', '')
+    Args:
+        input_path: Путь к рукописи (UTF-8)
+        output_path: Путь к результату
+        config: Конфигурация монетизации
     
-    if content_type == "video":
-        youtube_issues = check_youtube_description_compliance(description)
-        if youtube_issues:
-            logger.warning(f"YouTube compliance issues found: {youtube_issues}")
-            modified_content['compliance_warnings'] = {
-                'youtube': youtube_issues
-            }
-    elif content_type == "book":
-        kdp_issues = check_amazon_kdp_compliance(description)
-        if kdp_issues:
-            logger.warning(f"Amazon KDP compliance issues found: {kdp_issues}")
-            modified_content['compliance_warnings'] = {
-                'amazon_kdp': kdp_issues
-            }
+    Returns:
+        Статистика обработки
+    """
+    monetization = config.get('monetization', {})
+    strategy = monetization.get('strategy', 'hidden')
+    plan = get_injection_plan(strategy, monetization.get('methods', []), config)
+    book_config = monetization.get('content_types', {}).get('ssv_book', {})
     
-    # Общая проверка
-    general_issues = check_general_compliance(description)
-    if general_issues:
-        logger.warning(f"General compliance issues found: {general_issues}")
-        if 'compliance_warnings' not in modified_content:
-            modified_content['compliance_warnings'] = {}
-        modified_content['compliance_warnings']['general'] = general_issues
+    stats = inject_book_manuscript(input_path, output_path, plan, book_config)
     
-    # Вычисляем метрики
-    metrics = calculate_monetization_metrics(modified_content)
-    modified_content['metrics'] = metrics
+    # Проверка Amazon KDP по готовому файлу — потоково, без загрузки книги в память
+    kdp_issues = check_amazon_kdp_compliance_stream(output_path)
+    if kdp_issues:
+        stats['compliance_warnings'] = {'amazon_kdp': kdp_issues}
     
-    # Отслеживаем событие
-    track_monetization_event('content_processed', content.get('id', 'unknown'), {
+    track_monetization_event('book_processed', Path(input_path).stem, {
         'strategy': strategy,
-        'actions': actions,
-        'content_type': content_type
+        'actions': list(plan.actions),
+        **stats
     })
-    
-    logger.info("Content processing completed")
-    return modified_content
+    return stats
 
 
 def generate_report(config: Dict[str, Any], processed_content: Dict[str, Any]) -> Dict[str, Any]:
@@ -131,7 +166,11 @@ def main():
     
     try:
         # Загрузка и валидация конфигурации
-        config = load_and_validate_config("monetization_config.yaml")
+        config = freeze_config(load_and_validate_config("monetization_config.yaml"))
+        configure_logging(config)
+        configure_metrics(config)
+        configure_event_sink(config)
+        configure_result_cache(config, config.version)
         strategy = config.get('monetization', {}).get('strategy', 'hidden')
         
         print(f"📊 Текущая стратегия монетизации: {strategy.upper()}")
@@ -1,21 +1,133 @@
 
 # modules/analytics_tracker.py
 import logging
+import time
 from datetime import datetime
-from typing import Dict, List, Any
+from functools import lru_cache
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
+from urllib.parse import quote, unquote_plus, urlsplit, urlunsplit
+
+from modules.compliance_checker import (
+    RULESET_VERSION,
+    ComplianceFeatures,
+    extract_compliance_features,
+    verdicts_from_features
+)
+from modules.event_sink import get_event_sink
+from utils.result_cache import get_result_cache, text_digest
+from utils.metrics import observe_stage, stage_id
 
 logger = logging.getLogger(__name__)
 
-def generate_unique_affiliate_link(base_link: str, campaign_id: str, content_id: str) -> str:
-    """Генерирует уникальную партнёрскую ссылку с UTM-метками."""
-    # Реализация генерации ссылки с параметрами
-    unique_link = f"{base_link}?utm_source=ssvproff&utm_campaign={campaign_id}&utm_content={content_id}"
-    logger.info(f"Generated unique link: {unique_link}")
+# UTM-метки, которые задаёт генератор ссылок (одноимённые параметры базовой ссылки заменяются)
+_UTM_KEYS = ('utm_source', 'utm_medium', 'utm_campaign', 'utm_content')
+
+@lru_cache(maxsize=1024)
+def _link_template(base_url: str, source: str, medium: str, campaign: Optional[str]) -> Tuple[str, str]:
+    """
+    Разбирает базовую ссылку один раз и возвращает префикс и суффикс ссылки.
+
+    Уникальная ссылка — это префикс + закодированный идентификатор контента + суффикс
+    (фрагмент '#...' базовой ссылки). Параметры базовой ссылки сохраняются как есть,
+    кроме заменяемых UTM-меток.
+    """
+    parts = urlsplit(base_url)
+    utm = [('utm_source', source), ('utm_medium', medium)]
+    if campaign:
+        utm.append(('utm_campaign', campaign))
+        content_key = 'utm_content'
+    else:
+        # Без кампании идентификатор контента служит меткой кампании
+        content_key = 'utm_campaign'
+    replaced = {key for key, _ in utm} | {content_key}
+
+    query = [
+        segment for segment in parts.query.split('&')
+        if segment and unquote_plus(segment.split('=', 1)[0]) not in replaced
+    ]
+    query.extend(f"{key}={quote(value, safe='')}" for key, value in utm)
+    query.append(f"{content_key}=")
+
+    prefix = urlunsplit((parts.scheme, parts.netloc, parts.path, '&'.join(query), ''))
+    suffix = f"#{parts.fragment}" if parts.fragment else ''
+    return prefix, suffix
+
+def generate_unique_affiliate_link(
+    base_url: str,
+    content_id: str,
+    source: str,
+    medium: str = "description",
+    campaign: Optional[str] = None
+) -> str:
+    """
+    Генерирует уникальную партнёрскую ссылку с UTM-метками.
+
+    Args:
+        base_url: Базовая ссылка (может содержать свои параметры и фрагмент)
+        content_id: Идентификатор контента
+        source: Источник трафика (utm_source)
+        medium: Тип размещения (utm_medium)
+        campaign: Кампания (utm_campaign, идентификатор контента тогда идёт в utm_content);
+            без неё меткой кампании служит идентификатор контента
+
+    Returns:
+        Ссылка с закодированными UTM-параметрами
+    """
+    prefix, suffix = _link_template(base_url, source, medium, campaign)
+    unique_link = prefix + quote(str(content_id), safe='') + suffix
+    logger.info("Generated unique link: %s", unique_link)
     return unique_link
 
-def prepare_monetization_report(strategy: str, methods: List[str], metrics: Dict[str, Any]) -> Dict[str, Any]:
-    """Подготавливает отчёт о монетизации."""
-    # Реализация подготовки отчёта
+def generate_affiliate_links(
+    base_url: str,
+    content_ids: Iterable[str],
+    source: str,
+    medium: str = "description",
+    campaign: Optional[str] = None
+) -> Iterator[Tuple[str, str]]:
+    """
+    Генерирует уникальные ссылки для множества контента (например, при перезапуске кампании).
+
+    Базовая ссылка разбирается один раз (сразу, поэтому ошибка в ней видна
+    до начала генерации), на каждый идентификатор приходится только его
+    кодирование и склейка строк. Ссылки выдаются по мере генерации, поэтому
+    список любой длины не собирается в памяти.
+
+    Args:
+        base_url: Базовая ссылка
+        content_ids: Идентификаторы контента
+        source: Источник трафика
+        medium: Тип размещения
+        campaign: Кампания (см. generate_unique_affiliate_link)
+
+    Returns:
+        Итератор пар (идентификатор контента, ссылка)
+    """
+    prefix, suffix = _link_template(base_url, source, medium, campaign)
+    return ((content_id, prefix + quote(str(content_id), safe='') + suffix) for content_id in content_ids)
+
+def prepare_monetization_report(
+    strategy: str,
+    methods: List[str],
+    metrics: Optional[Dict[str, Any]] = None,
+    rollups: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Подготавливает отчёт о монетизации.
+
+    Args:
+        strategy: Стратегия монетизации
+        methods: Методы монетизации
+        metrics: Метрики (для отчёта по одному контенту)
+        rollups: Сводка из MonetizationRollups (summarize_contents/summarize_period);
+            если metrics не заданы, берутся суммарные метрики сводки
+
+    Returns:
+        Отчёт о монетизации
+    """
+    if metrics is None:
+        metrics = rollups["totals"]["metrics"] if rollups else {}
+
     report = {
         "strategy": strategy,
         "methods_used": methods,
@@ -23,48 +135,111 @@ def prepare_monetization_report(strategy: str, methods: List[str], metrics: Dict
         "generated_at": datetime.now().isoformat(),
         "status": "success"
     }
+    if rollups is not None:
+        report.update(rollups)
     logger.info("Monetization report prepared")
     logger.info(f"Report summary: Strategy={strategy}, Methods={len(methods)}")
     return report
 
 def track_monetization_event(event_type: str, content_id: str, metadata: Dict[str, Any] = None) -> None:
-    """Отслеживает события монетизации для аналитики."""
+    """
+    Отслеживает события монетизации для аналитики.
+
+    Агрегаты отчётов обновляет поток записи приёмника после сохранения
+    события, поэтому отброшенные при переполнении буфера события в отчёты не попадают.
+    """
     event = {
         "event_type": event_type,
         "content_id": content_id,
         "timestamp": datetime.now().isoformat(),
         "metadata": metadata or {}
     }
-    logger.info(f"Tracked event: {event_type} for content {content_id}")
-    # В будущем можно добавить сохранение в базу данных или отправку в аналитическую систему
-    
+    # Запись в хранилище выполняет фоновый поток приёмника, вызов не блокируется
+    if get_event_sink().emit(event):
+        logger.debug("Tracked event: %s for content %s", event_type, content_id)
+
+# Версия алгоритма метрик: входит в ключ кэша результатов
+# (2 — точные количества дисклеймеров и CTA вместо признака наличия;
+# 3 — элемент считается один раз, дисклеймер спонсорства учитывается)
+METRICS_VERSION = "3"
+
+_STAGE_METRICS_HIT = stage_id('metrics', 'hit')
+_STAGE_METRICS_MISS = stage_id('metrics', 'miss')
+_STAGE_COMPLIANCE_SCAN = stage_id('compliance.scan')
+_STAGE_ANALYZE_HIT = stage_id('analyze', 'hit')
+_STAGE_ANALYZE_MISS = stage_id('analyze', 'miss')
+
 def calculate_monetization_metrics(content_data: Dict[str, Any]) -> Dict[str, Any]:
-    """Вычисляет метрики эффективности монетизации."""
-    metrics = {
-        "total_affiliate_links": 0,
-        "total_disclaimers": 0,
-        "total_cta": 0,
-        "content_length": len(content_data.get('description', '')),
-        "monetization_density": 0.0  # Отношение элементов монетизации к длине контента
-    }
-    
+    """Вычисляет метрики эффективности монетизации (с кэшированием по хешу описания)."""
+    started = time.perf_counter()
     description = content_data.get('description', '')
+    cache = get_result_cache()
+    key = ('metrics', METRICS_VERSION, text_digest(description))
+    
+    metrics = cache.get(key)
+    if metrics is None:
+        metrics = metrics_from_features(extract_compliance_features(description, (), elements=True))
+        cache.put(key, metrics)
+        logger.info("Calculated monetization metrics: %s", metrics)
+        observe_stage(_STAGE_METRICS_MISS, started)
+    else:
+        observe_stage(_STAGE_METRICS_HIT, started)
     
-    # Подсчёт партнёрских ссылок
-    metrics["total_affiliate_links"] = description.count('http')
+    return dict(metrics)
+
+def analyze_description(description: str, platforms: Iterable[str]) -> Tuple[Dict[str, list[str]], Dict[str, Any]]:
+    """
+    Проверка соответствия и метрики монетизации за один проход по тексту.
+
+    Результаты попадают в те же записи кэша, что и scan_compliance
+    и calculate_monetization_metrics, поэтому последующие вызовы этих функций
+    для того же текста не сканируют его повторно.
+
+    Args:
+        description: Текст описания
+        platforms: Платформы проверки соответствия
+
+    Returns:
+        Вердикты {платформа: список проблем} и метрики
+    """
+    started = time.perf_counter()
+    platforms = tuple(platforms)
+    cache = get_result_cache()
+    digest = text_digest(description)
+    verdicts_key = ('compliance', RULESET_VERSION, platforms, digest)
+    metrics_key = ('metrics', METRICS_VERSION, digest)
     
-    # Подсчёт дисклеймеров
-    if 'дисклеймер' in description.lower() or 'disclaimer' in description.lower():
-        metrics["total_disclaimers"] = 1
+    verdicts = cache.get(verdicts_key)
+    metrics = cache.get(metrics_key)
+    if verdicts is None or metrics is None:
+        scan_started = time.perf_counter()
+        features = extract_compliance_features(description, platforms, elements=True)
+        observe_stage(_STAGE_COMPLIANCE_SCAN, scan_started)
+        if verdicts is None:
+            verdicts = verdicts_from_features(features, platforms)
+            cache.put(verdicts_key, verdicts)
+        if metrics is None:
+            metrics = metrics_from_features(features)
+            cache.put(metrics_key, metrics)
+        observe_stage(_STAGE_ANALYZE_MISS, started)
+    else:
+        observe_stage(_STAGE_ANALYZE_HIT, started)
     
-    # Подсчёт призывов к действию
-    if 'узнайте больше' in description.lower() or 'премиум' in description.lower():
-        metrics["total_cta"] = 1
+    return {platform: list(issues) for platform, issues in verdicts.items()}, dict(metrics)
+
+def metrics_from_features(features: ComplianceFeatures) -> Dict[str, Any]:
+    """Формирует метрики монетизации по признакам текста (extract_compliance_features с elements=True)."""
+    metrics = {
+        "total_affiliate_links": features.http_count,
+        "total_disclaimers": features.disclaimer_count,
+        "total_cta": features.cta_count,
+        "content_length": features.length,
+        "monetization_density": 0.0  # Отношение элементов монетизации к длине контента
+    }
     
     # Вычисление плотности монетизации
     if metrics["content_length"] > 0:
         total_elements = metrics["total_affiliate_links"] + metrics["total_disclaimers"] + metrics["total_cta"]
         metrics["monetization_density"] = total_elements / (metrics["content_length"] / 1000.0)
     
-    logger.info(f"Calculated monetization metrics: {metrics}")
     return metrics
@@ -0,0 +1,158 @@
+# modules/batch_analytics.py
+import logging
+from typing import Dict, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # numpy — необязательная зависимость
+    np = None
+
+from modules.compliance_checker import AFFILIATE_LINK_MARKERS, CTA_MARKERS, DISCLAIMER_MARKERS, ELEMENT_BOUNDARIES
+
+logger = logging.getLogger(__name__)
+
+# Разделитель текстов в общем буфере: не входит ни в один искомый маркер,
+# поэтому совпадения не пересекают границы соседних текстов
+_SEPARATOR = '\x00'
+
+_upper_table = None
+_lower_table = None
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError("Batch analytics requires numpy: pip install numpy")
+
+def _get_case_tables() -> tuple:
+    """
+    Таблицы для всех кодовых точек Unicode (строятся один раз).
+
+    Возвращает маску str.isupper() и отображение в нижний регистр. Символы,
+    у которых lower() меняет длину (например, 'İ'), отображаются сами в себя:
+    после lower() они не могут стать частью маркера.
+    """
+    global _upper_table, _lower_table
+    if _upper_table is None:
+        characters = [chr(code) for code in range(0x110000)]
+        _upper_table = np.fromiter((c.isupper() for c in characters), dtype=bool, count=len(characters))
+        _lower_table = np.fromiter(
+            (ord(lowered) if len(lowered) == 1 else ord(c) for c, lowered in ((c, c.lower()) for c in characters)),
+            dtype=np.uint32, count=len(characters)
+        )
+    return _upper_table, _lower_table
+
+def _offsets(lengths: "np.ndarray") -> "np.ndarray":
+    """Начала текстов в буфере с разделителями."""
+    starts = np.zeros(len(lengths), dtype=np.int64)
+    if len(lengths) > 1:
+        starts[1:] = np.cumsum(lengths + 1)[:-1]
+    return starts
+
+def _marker_positions(codes: "np.ndarray", marker: str) -> "np.ndarray":
+    """Позиции начала маркера в буфере: сравнение всего буфера только по первому символу."""
+    marker_codes = [ord(c) for c in marker]
+    candidates = np.flatnonzero(codes[:max(len(codes) - len(marker) + 1, 0)] == marker_codes[0])
+    for shift, code in enumerate(marker_codes[1:], start=1):
+        candidates = candidates[codes[candidates + shift] == code]
+    return candidates
+
+def _marker_counts(codes: "np.ndarray", markers: tuple, starts: "np.ndarray") -> "np.ndarray":
+    """Количество вхождений маркеров в каждом тексте."""
+    positions = np.concatenate([_marker_positions(codes, marker) for marker in markers])
+    return np.bincount(np.searchsorted(starts, positions, side='right') - 1, minlength=len(starts))
+
+def _element_counts(codes: "np.ndarray", markers: tuple, starts: "np.ndarray", boundaries: "np.ndarray") -> "np.ndarray":
+    """
+    Количество элементов в каждом тексте, как в count_monetization_elements.
+
+    Вхождение маркера начинает новый элемент, если между концом предыдущего
+    вхождения того же вида и его началом есть граница предложения;
+    boundaries — накопленное число границ перед каждой позицией буфера
+    (разделитель текстов тоже граница).
+    """
+    found = [(_marker_positions(codes, marker), len(marker)) for marker in markers]
+    positions = np.concatenate([found_positions for found_positions, _ in found])
+    ends = np.concatenate([found_positions + length for found_positions, length in found])
+    order = np.argsort(positions, kind='stable')
+    positions, ends = positions[order], ends[order]
+
+    first = np.ones(len(positions), dtype=bool)
+    first[1:] = boundaries[positions[1:]] > boundaries[ends[:-1]]
+    return np.bincount(np.searchsorted(starts, positions[first], side='right') - 1, minlength=len(starts))
+
+def _segment_sum(mask: "np.ndarray", starts: "np.ndarray") -> "np.ndarray":
+    """
+    Сумма маски по текстам.
+
+    Отрезок каждого текста включает следующий за ним разделитель, на котором
+    маска всегда ложна, поэтому пустые тексты корректно дают ноль.
+    """
+    if not len(starts):
+        return np.zeros(0, dtype=np.int64)
+    return np.add.reduceat(mask, starts, dtype=np.int64)
+
+def compute_batch_metrics(texts: Sequence[str]) -> Dict[str, "np.ndarray"]:
+    """
+    Вычисляет метрики монетизации и признаки общей проверки для пакета текстов.
+
+    Все тексты склеиваются в один буфер UTF-32 с таблицей смещений, а счётчики
+    (заглавные буквы, '!', вхождения 'http', элементы из маркеров) считаются векторно по всему буферу.
+    Результаты совпадают с calculate_monetization_metrics и check_general_compliance.
+
+    Args:
+        texts: Список описаний
+
+    Returns:
+        Колоночный результат: словарь {имя метрики: numpy-массив длины len(texts)}
+    """
+    _require_numpy()
+    count = len(texts)
+
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=count)
+    starts = _offsets(lengths)
+
+    # Завершающий разделитель: отрезок последнего (в т.ч. пустого) текста не пуст
+    joined = _SEPARATOR.join(texts) + _SEPARATOR
+    codes = np.frombuffer(joined.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+
+    upper_table, lower_table = _get_case_tables()
+    uppercase_count = _segment_sum(upper_table[codes], starts)
+    exclamation_count = _marker_counts(codes, ('!',), starts)
+    affiliate_links = _marker_counts(codes, AFFILIATE_LINK_MARKERS, starts)
+
+    # Маркеры ищутся в нижнем регистре, соседние маркеры одного предложения — один элемент,
+    # как в calculate_monetization_metrics
+    lowered = lower_table[codes]
+    boundary_codes = [ord(c) for c in ELEMENT_BOUNDARIES + _SEPARATOR]
+    boundaries = np.concatenate(([0], np.cumsum(np.isin(codes, boundary_codes), dtype=np.int64)))
+    disclaimers = _element_counts(lowered, DISCLAIMER_MARKERS, starts, boundaries)
+    cta = _element_counts(lowered, CTA_MARKERS, starts, boundaries)
+
+    total_elements = affiliate_links + disclaimers + cta
+    density = np.zeros(count, dtype=np.float64)
+    nonempty = lengths > 0
+    density[nonempty] = total_elements[nonempty] / (lengths[nonempty] / 1000.0)
+
+    caps_ratio = uppercase_count / (lengths + 1)
+
+    logger.info(f"Calculated batch metrics for {count} texts")
+    return {
+        "content_length": lengths,
+        "total_affiliate_links": affiliate_links,
+        "total_disclaimers": disclaimers,
+        "total_cta": cta,
+        "monetization_density": density,
+        "uppercase_count": uppercase_count,
+        "caps_ratio": caps_ratio,
+        "exclamation_count": exclamation_count,
+        "excessive_caps": caps_ratio > 0.3,
+        "too_many_exclamations": exclamation_count > 10,
+    }
+
+def batch_general_issues(batch: Dict[str, "np.ndarray"], index: int) -> list[str]:
+    """Формирует список общих проблем для одного элемента пакетного результата."""
+    issues = []
+    if batch["excessive_caps"][index]:
+        issues.append("Excessive use of capital letters detected.")
+    if batch["too_many_exclamations"][index]:
+        issues.append(f"Too many exclamation marks: {int(batch['exclamation_count'][index])}.")
+    return issues
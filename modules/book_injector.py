@@ -0,0 +1,107 @@
+# modules/book_injector.py
+import logging
+import re
+from typing import Dict, Any, Iterable, Iterator, List, Set
+
+from modules.content_injector import InjectionPlan
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHAPTER_PATTERN = r'^\s*(?:Глава|ГЛАВА|Chapter|CHAPTER)\b'
+
+def iter_manuscript_chapters(lines: Iterable[str], chapter_pattern: str = DEFAULT_CHAPTER_PATTERN) -> Iterator[List[str]]:
+    """
+    Разбивает поток строк рукописи на главы.
+
+    Текст до первого заголовка (титульная часть) возвращается отдельным блоком.
+    В памяти одновременно находится только одна глава.
+
+    Args:
+        lines: Итератор строк рукописи (например, открытый файл)
+        chapter_pattern: Регулярное выражение заголовка главы
+
+    Yields:
+        Список строк очередной главы (с символами перевода строки)
+    """
+    heading = re.compile(chapter_pattern)
+    chapter: List[str] = []
+
+    for line in lines:
+        if chapter and heading.match(line):
+            yield chapter
+            chapter = []
+        chapter.append(line)
+
+    if chapter:
+        yield chapter
+
+def inject_book_manuscript(
+    input_path: str,
+    output_path: str,
+    plan: InjectionPlan,
+    book_config: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Потоково внедряет элементы монетизации в рукопись книги.
+
+    Рукопись читается по главам и записывается в выходной файл по мере
+    обработки, поэтому потребление памяти не зависит от размера книги.
+    Позиции внедрения берутся из content_types.ssv_book конфигурации:
+    inject_beginning (спонсор и дисклеймеры), inject_between_chapters и
+    inject_end (призыв к действию). Партнёрские ссылки ставятся на первое
+    вхождение каждого ключевого слова во всей книге.
+
+    Args:
+        input_path: Путь к рукописи (UTF-8)
+        output_path: Путь к результату
+        plan: Скомпилированный план внедрения
+        book_config: Раздел content_types.ssv_book конфигурации
+
+    Returns:
+        Статистика обработки (количество глав и вставок)
+    """
+    logger.info(f"Starting streaming book injection: {input_path}")
+
+    front_matter = "\n\n".join(
+        text for text in (plan.sponsor_mention, plan.affiliate_disclaimer, plan.sponsorship_disclaimer) if text
+    )
+    chapter_pattern = book_config.get('chapter_pattern', DEFAULT_CHAPTER_PATTERN)
+    heading = re.compile(chapter_pattern)
+
+    used_keywords: Set[int] = set()
+    stats = {"chapters": 0, "insertions": 0}
+    seen_heading = False
+    ends_with_newline = True
+
+    with open(input_path, 'r', encoding='utf-8') as source, \
+            open(output_path, 'w', encoding='utf-8') as target:
+
+        if book_config.get('inject_beginning') and front_matter:
+            target.write(f"{front_matter}\n\n")
+            stats["insertions"] += 1
+
+        for chapter in iter_manuscript_chapters(source, chapter_pattern):
+            is_chapter = bool(heading.match(chapter[0]))
+
+            if is_chapter:
+                if seen_heading and book_config.get('inject_between_chapters') and plan.premium_cta:
+                    target.write(f"{plan.premium_cta}\n\n")
+                    stats["insertions"] += 1
+                seen_heading = True
+                stats["chapters"] += 1
+
+            text = ''.join(chapter)
+            if plan.affiliate_matcher is not None:
+                text = plan.affiliate_matcher.replace(text, used_keywords)
+
+            target.write(text)
+            ends_with_newline = text.endswith('\n')
+
+        if book_config.get('inject_end') and plan.premium_cta:
+            if not ends_with_newline:
+                target.write("\n")
+            target.write(f"\n{plan.premium_cta}\n")
+            stats["insertions"] += 1
+
+    logger.info(f"Book injection completed: {stats['chapters']} chapters, {stats['insertions']} insertions")
+    return stats
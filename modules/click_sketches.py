@@ -0,0 +1,534 @@
+# modules/click_sketches.py
+import atexit
+import base64
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+from array import array
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterable, List, Optional
+
+from modules.report_rollups import GRANULARITIES
+
+logger = logging.getLogger(__name__)
+
+CLICK_EVENTS = ('click', 'conversion')
+
+DEFAULT_CLICKS_PATH = 'ssv_clicks'
+DEFAULT_GRANULARITY = 'day'
+DEFAULT_HLL_PRECISION = 12
+DEFAULT_CMS_WIDTH = 4096
+DEFAULT_CMS_DEPTH = 4
+DEFAULT_TOP_LINKS = 100
+DEFAULT_MAX_CAMPAIGNS = 100
+DEFAULT_RETENTION_DAYS = 90
+DEFAULT_CHECKPOINT_INTERVAL = 30.0
+
+# Ключ скетча уникальных посетителей по всем кампаниям
+ALL_CAMPAIGNS = '*'
+
+_CHECKPOINT_PREFIX = 'clicks-'
+
+def _hash64(value: str) -> int:
+    """64-битный хеш строки (общий для HyperLogLog и count-min)."""
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'little')
+
+class HyperLogLog:
+    """
+    Скетч HyperLogLog для оценки числа уникальных значений.
+
+    2^precision однобайтовых регистров; относительная ошибка около
+    1.04 / sqrt(2^precision) (1.6% при precision=12, 4 КБ памяти).
+    Скетчи с одинаковой точностью объединяются поэлементным максимумом.
+    """
+
+    def __init__(self, precision: int = DEFAULT_HLL_PRECISION, registers: Optional[bytes] = None):
+        self.precision = precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(1 << precision)
+
+    def add_hash(self, value: int) -> None:
+        """Учитывает значение по его 64-битному хешу."""
+        bits = 64 - self.precision
+        index = value >> bits
+        rank = bits - (value & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add(self, value: str) -> None:
+        self.add_hash(_hash64(value))
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge HyperLogLog of precision {other.precision} into {self.precision}")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        """Оценка числа уникальных значений (для малых оценок — линейный подсчёт)."""
+        m = len(self.registers)
+        histogram = Counter(self.registers)
+        estimate = (0.7213 / (1 + 1.079 / m)) * m * m / sum(n * 2.0 ** -rank for rank, n in histogram.items())
+        zeros = histogram.get(0, 0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+class CountMinSketch:
+    """
+    Скетч count-min: приближённые счётчики по ключам в фиксированной памяти.
+
+    depth строк по width счётчиков; оценка никогда не меньше истинного
+    значения и превышает его не более чем на e/width от суммы всех счётчиков
+    с вероятностью 1 - e^-depth. Скетчи одного размера объединяются сложением.
+    """
+
+    def __init__(self, width: int = DEFAULT_CMS_WIDTH, depth: int = DEFAULT_CMS_DEPTH, table: Optional[bytes] = None):
+        self.width = width
+        self.depth = depth
+        self.table = array('q', table if table is not None else bytes(8 * width * depth))
+        self.total = 0
+
+    def _cells(self, value: int) -> List[int]:
+        # Двойное хеширование: строки индексируются h1 + row * h2 от одного 64-битного хеша
+        low, high = value & 0xFFFFFFFF, (value >> 32) | 1
+        width = self.width
+        return [row * width + (low + row * high) % width for row in range(self.depth)]
+
+    def add_hash(self, value: int, count: int = 1) -> int:
+        """Увеличивает счётчик ключа и возвращает его новую оценку."""
+        table = self.table
+        estimate = None
+        for cell in self._cells(value):
+            table[cell] += count
+            if estimate is None or table[cell] < estimate:
+                estimate = table[cell]
+        self.total += count
+        return estimate
+
+    def estimate_hash(self, value: int) -> int:
+        table = self.table
+        return min(table[cell] for cell in self._cells(value))
+
+    def estimate(self, key: str) -> int:
+        return self.estimate_hash(_hash64(key))
+
+    def merge(self, other: "CountMinSketch") -> None:
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError(f"Cannot merge count-min sketch {other.width}x{other.depth} into {self.width}x{self.depth}")
+        self.table = array('q', map(int.__add__, self.table, other.table))
+        self.total += other.total
+
+class _WindowSketches:
+    """Скетчи одного интервала времени для одного типа события."""
+
+    def __init__(self, precision: int, width: int, depth: int):
+        self.events = 0
+        self.visitors: Dict[str, HyperLogLog] = {ALL_CAMPAIGNS: HyperLogLog(precision)}
+        self.counts = CountMinSketch(width, depth)
+        # Кандидаты в самые популярные ссылки: {content_id: оценка}
+        self.top: Dict[str, int] = {}
+        self.floor = 0
+
+    def offer(self, content_id: str, estimate: int, capacity: int) -> None:
+        """Обновляет кандидатов в топ ссылок (O(1), пока оценка не выше минимальной)."""
+        top = self.top
+        if content_id in top or len(top) < capacity:
+            top[content_id] = estimate
+            return
+        if estimate <= self.floor:
+            return
+        # floor — нижняя граница минимума: оценки кандидатов только растут
+        weakest = min(top, key=top.__getitem__)
+        self.floor = top[weakest]
+        if estimate > self.floor:
+            del top[weakest]
+            top[content_id] = estimate
+            self.floor = min(self.floor, estimate)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "events": self.events,
+            "visitors": {
+                campaign: base64.b64encode(bytes(sketch.registers)).decode('ascii')
+                for campaign, sketch in self.visitors.items()
+            },
+            "counts": base64.b64encode(self.counts.table.tobytes()).decode('ascii'),
+            "counts_total": self.counts.total,
+            "top": self.top
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], precision: int, width: int, depth: int) -> "_WindowSketches":
+        window = cls(precision, width, depth)
+        window.events = data["events"]
+        window.visitors = {
+            campaign: HyperLogLog(precision, base64.b64decode(registers))
+            for campaign, registers in data["visitors"].items()
+        }
+        window.counts = CountMinSketch(width, depth, base64.b64decode(data["counts"]))
+        window.counts.total = data["counts_total"]
+        window.top = dict(data["top"])
+        return window
+
+class ClickSketches:
+    """
+    Приближённая аналитика переходов по UTM-ссылкам и конверсий.
+
+    События (click/conversion) раскладываются по интервалам времени
+    (час или день, как в отчётах). В каждом интервале для каждого типа
+    события хранятся:
+    - HyperLogLog уникальных посетителей — по всем кампаниям и по каждой
+      кампании (не больше max_campaigns, остальные учитываются только в общем);
+    - count-min скетч числа событий по идентификатору контента (уникальная
+      ссылка создаётся на каждый контент) и top_links кандидатов в самые
+      популярные ссылки.
+
+    Память интервала фиксирована и не зависит от числа событий. Интервалы
+    периодически сохраняются на диск (файл JSON на интервал и тип события)
+    и восстанавливаются при запуске; интервалы старше retention_days удаляются.
+    Отчёт за период объединяет скетчи его интервалов.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = DEFAULT_CLICKS_PATH,
+        granularity: str = DEFAULT_GRANULARITY,
+        precision: int = DEFAULT_HLL_PRECISION,
+        width: int = DEFAULT_CMS_WIDTH,
+        depth: int = DEFAULT_CMS_DEPTH,
+        top_links: int = DEFAULT_TOP_LINKS,
+        max_campaigns: int = DEFAULT_MAX_CAMPAIGNS,
+        retention_days: int = DEFAULT_RETENTION_DAYS,
+        checkpoint_interval: float = DEFAULT_CHECKPOINT_INTERVAL
+    ):
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity '{granularity}', expected one of {list(GRANULARITIES)}")
+        self.directory = directory
+        self.granularity = granularity
+        self.precision = precision
+        self.width = width
+        self.depth = depth
+        self.top_links = top_links
+        self.max_campaigns = max_campaigns
+        self.retention_days = retention_days
+        self.checkpoint_interval = checkpoint_interval
+
+        self._lock = threading.Lock()
+        # {(интервал, тип события): скетчи}
+        self._windows: Dict[tuple, _WindowSketches] = {}
+        self._dirty: set = set()
+        self._valid_windows: set = set()
+        self._stats = {"accepted": 0, "rejected": 0, "campaigns_overflow": 0, "checkpoints": 0}
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._restore()
+
+        self._stop = threading.Event()
+        self._thread = None
+        if directory and checkpoint_interval > 0:
+            self._thread = threading.Thread(target=self._run, name="click-sketch-checkpoint", daemon=True)
+            self._thread.start()
+
+    def ingest(self, events: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Учитывает пачку событий переходов и конверсий.
+
+        Событие: event_type ('click' или 'conversion'), utm_content и/или
+        utm_campaign, необязательные visitor_id и timestamp (ISO-время,
+        по умолчанию — текущее). Идентификатор контента — utm_content,
+        а если его нет, utm_campaign (так generate_unique_affiliate_link
+        размечает ссылки без кампании).
+
+        Args:
+            events: События
+
+        Returns:
+            Количество принятых и отклонённых событий
+        """
+        length = GRANULARITIES[self.granularity]
+        now = datetime.now().isoformat()
+        counts: Counter = Counter()
+        visitors: Dict[tuple, set] = defaultdict(set)
+        accepted = rejected = 0
+
+        # Пачка сначала сворачивается: одинаковые ключи обновляют скетчи один раз
+        for event in events:
+            event_type = event.get('event_type', 'click')
+            utm_content = event.get('utm_content')
+            utm_campaign = event.get('utm_campaign')
+            content_id = utm_content or utm_campaign
+            window = (event.get('timestamp') or now)[:length]
+            if event_type not in CLICK_EVENTS or not content_id or not self._valid_window(window):
+                rejected += 1
+                continue
+
+            key = (window, event_type)
+            counts[key, content_id] += 1
+            visitor_id = event.get('visitor_id')
+            if visitor_id:
+                visitors[key, utm_campaign if utm_content else None].add(visitor_id)
+            accepted += 1
+
+        with self._lock:
+            for (key, content_id), count in counts.items():
+                window = self._window(key)
+                window.events += count
+                estimate = window.counts.add_hash(_hash64(content_id), count)
+                window.offer(content_id, estimate, self.top_links)
+                self._dirty.add(key)
+
+            for (key, campaign), ids in visitors.items():
+                window = self._window(key)
+                sketches = [window.visitors[ALL_CAMPAIGNS]]
+                if campaign:
+                    sketch = window.visitors.get(campaign)
+                    if sketch is None:
+                        if len(window.visitors) > self.max_campaigns:
+                            self._stats["campaigns_overflow"] += 1
+                        else:
+                            sketch = window.visitors[campaign] = HyperLogLog(self.precision)
+                    if sketch is not None:
+                        sketches.append(sketch)
+                for visitor_id in ids:
+                    value = _hash64(visitor_id)
+                    for sketch in sketches:
+                        sketch.add_hash(value)
+
+            self._stats["accepted"] += accepted
+            self._stats["rejected"] += rejected
+
+        return {"accepted": accepted, "rejected": rejected}
+
+    def report(
+        self,
+        event_type: str = 'click',
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        campaign: Optional[str] = None,
+        content_ids: Optional[List[str]] = None,
+        top: int = 10
+    ) -> Dict[str, Any]:
+        """
+        Сводка за период: скетчи интервалов объединяются.
+
+        Args:
+            event_type: 'click' или 'conversion'
+            start: Начало периода (ISO-время, включительно, с точностью до интервала)
+            end: Конец периода (ISO-время, включительно, с точностью до интервала)
+            campaign: Уникальные посетители только этой кампании
+            content_ids: Дополнительно оценить число событий этих ссылок
+            top: Сколько самых популярных ссылок вернуть
+
+        Returns:
+            Сводка: events, unique_visitors, unique_visitors_by_campaign,
+            top_links, content_counts (если заданы content_ids)
+
+        Raises:
+            ValueError: Если тип события не поддерживается
+        """
+        if event_type not in CLICK_EVENTS:
+            raise ValueError(f"Unknown event type '{event_type}', expected one of {list(CLICK_EVENTS)}")
+        length = GRANULARITIES[self.granularity]
+        low = start[:length] if start else None
+        high = end[:length] if end else None
+
+        events = 0
+        visitors: Dict[str, HyperLogLog] = {}
+        counts = CountMinSketch(self.width, self.depth)
+        candidates: set = set()
+        with self._lock:
+            windows = sorted(
+                window for window, window_type in self._windows
+                if window_type == event_type and (low is None or window >= low) and (high is None or window <= high)
+            )
+            for window in windows:
+                sketches = self._windows[window, event_type]
+                events += sketches.events
+                counts.merge(sketches.counts)
+                candidates.update(sketches.top)
+                for name, sketch in sketches.visitors.items():
+                    if campaign is not None and name not in (campaign, ALL_CAMPAIGNS):
+                        continue
+                    merged = visitors.get(name)
+                    if merged is None:
+                        merged = visitors[name] = HyperLogLog(self.precision)
+                    merged.merge(sketch)
+
+        # Кандидаты из разных интервалов переоцениваются по объединённому скетчу
+        ranked = sorted(((counts.estimate(content_id), content_id) for content_id in candidates), reverse=True)
+        selected = visitors.get(campaign if campaign is not None else ALL_CAMPAIGNS)
+        result = {
+            "event_type": event_type,
+            "granularity": self.granularity,
+            "start": start,
+            "end": end,
+            "windows": windows,
+            "events": events,
+            "campaign": campaign,
+            "unique_visitors": selected.count() if selected is not None else 0,
+            "unique_visitors_by_campaign": {
+                name: sketch.count() for name, sketch in sorted(visitors.items()) if name != ALL_CAMPAIGNS
+            },
+            "top_links": [{"content_id": content_id, "count": count} for count, content_id in ranked[:top]]
+        }
+        if content_ids:
+            result["content_counts"] = {content_id: counts.estimate(content_id) for content_id in content_ids}
+        return result
+
+    def checkpoint(self) -> int:
+        """
+        Сохраняет изменённые интервалы на диск и удаляет устаревшие.
+
+        Returns:
+            Количество записанных интервалов
+        """
+        if not self.directory:
+            return 0
+
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat()[:GRANULARITIES[self.granularity]]
+        with self._lock:
+            expired = [key for key in self._windows if key[0] < cutoff]
+            for key in expired:
+                del self._windows[key]
+                self._dirty.discard(key)
+            # Сериализация под блокировкой, запись файлов — без неё
+            snapshots = {key: self._windows[key].to_dict() for key in self._dirty}
+            self._dirty.clear()
+
+        for (window, event_type), data in snapshots.items():
+            path = self._checkpoint_path(window, event_type)
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({"window": window, "event_type": event_type, **self._parameters(), **data}, f, ensure_ascii=False)
+            os.replace(path + '.tmp', path)
+        for window, event_type in expired:
+            path = self._checkpoint_path(window, event_type)
+            if os.path.exists(path):
+                os.remove(path)
+
+        if snapshots or expired:
+            with self._lock:
+                self._stats["checkpoints"] += 1
+            logger.info(f"Click sketches checkpoint: {len(snapshots)} windows written, {len(expired)} expired")
+        return len(snapshots)
+
+    def close(self) -> None:
+        """Останавливает фоновое сохранение и сохраняет несохранённые интервалы."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.checkpoint()
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики принятых событий и размер скетчей в памяти."""
+        with self._lock:
+            return {
+                **self._stats,
+                "windows": len(self._windows),
+                "campaign_sketches": sum(len(window.visitors) - 1 for window in self._windows.values())
+            }
+
+    def _window(self, key: tuple) -> _WindowSketches:
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = _WindowSketches(self.precision, self.width, self.depth)
+        return window
+
+    def _valid_window(self, window: str) -> bool:
+        # Проверенные интервалы запоминаются: разбор ISO-времени — один раз на интервал
+        if window in self._valid_windows:
+            return True
+        if len(window) != GRANULARITIES[self.granularity]:
+            return False
+        try:
+            datetime.fromisoformat(window)
+        except ValueError:
+            return False
+        self._valid_windows.add(window)
+        return True
+
+    def _parameters(self) -> Dict[str, Any]:
+        return {"granularity": self.granularity, "precision": self.precision, "width": self.width, "depth": self.depth}
+
+    def _checkpoint_path(self, window: str, event_type: str) -> str:
+        return os.path.join(self.directory, f"{_CHECKPOINT_PREFIX}{event_type}-{window}.json")
+
+    def _restore(self) -> None:
+        parameters = self._parameters()
+        restored = 0
+        for entry in sorted(os.listdir(self.directory)):
+            if not (entry.startswith(_CHECKPOINT_PREFIX) and entry.endswith('.json')):
+                continue
+            with open(os.path.join(self.directory, entry), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if any(data.get(name) != value for name, value in parameters.items()):
+                logger.warning(f"Skipping click sketch checkpoint {entry}: sketch parameters differ from configuration")
+                continue
+            self._windows[data["window"], data["event_type"]] = _WindowSketches.from_dict(
+                data, self.precision, self.width, self.depth
+            )
+            restored += 1
+        if restored:
+            logger.info(f"Click sketches restored: {restored} windows from {self.directory}")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.checkpoint_interval):
+            try:
+                self.checkpoint()
+            except Exception as e:
+                logger.error(f"Click sketches checkpoint failed: {e}", exc_info=True)
+
+_click_sketches: Optional[ClickSketches] = None
+_click_sketches_lock = threading.Lock()
+
+def configure_click_sketches(config: Dict[str, Any]) -> ClickSketches:
+    """
+    Создаёт общие скетчи переходов по разделу analytics конфигурации.
+
+    Args:
+        config: Конфигурация монетизации
+
+    Returns:
+        Общие скетчи переходов
+    """
+    global _click_sketches
+    analytics_config = config.get('analytics', {})
+    sketches = ClickSketches(
+        directory=analytics_config.get('clicks_path', DEFAULT_CLICKS_PATH),
+        granularity=analytics_config.get('clicks_granularity', DEFAULT_GRANULARITY),
+        precision=analytics_config.get('clicks_hll_precision', DEFAULT_HLL_PRECISION),
+        width=analytics_config.get('clicks_cms_width', DEFAULT_CMS_WIDTH),
+        depth=analytics_config.get('clicks_cms_depth', DEFAULT_CMS_DEPTH),
+        top_links=analytics_config.get('clicks_top_links', DEFAULT_TOP_LINKS),
+        max_campaigns=analytics_config.get('clicks_max_campaigns', DEFAULT_MAX_CAMPAIGNS),
+        retention_days=analytics_config.get('clicks_retention_days', DEFAULT_RETENTION_DAYS),
+        checkpoint_interval=analytics_config.get('clicks_checkpoint_seconds', DEFAULT_CHECKPOINT_INTERVAL)
+    )
+
+    with _click_sketches_lock:
+        previous, _click_sketches = _click_sketches, sketches
+    if previous is not None:
+        previous.close()
+    return sketches
+
+def get_click_sketches() -> ClickSketches:
+    """Возвращает общие скетчи переходов (при первом обращении — с настройками по умолчанию)."""
+    global _click_sketches
+    if _click_sketches is None:
+        with _click_sketches_lock:
+            if _click_sketches is None:
+                _click_sketches = ClickSketches()
+    return _click_sketches
+
+def close_click_sketches() -> None:
+    """Сохраняет и закрывает общие скетчи переходов."""
+    global _click_sketches
+    with _click_sketches_lock:
+        sketches, _click_sketches = _click_sketches, None
+    if sketches is not None:
+        sketches.close()
+
+atexit.register(close_click_sketches)
@@ -1,76 +1,394 @@
-
 # modules/compliance_checker.py
+import hashlib
 import logging
 import re
+import string
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, Iterable
+
+from utils.result_cache import get_result_cache, text_digest
+from utils.metrics import observe_stage, stage_id
 
 logger = logging.getLogger(__name__)
 
-def check_youtube_description_compliance(description: str) -> list[str]:
-    """Проверяет описание YouTube на потенциальные нарушения политик."""
-    logger.info("Checking YouTube description compliance")
+PLATFORMS = ('youtube', 'amazon_kdp', 'general')
+
+# Фразовые правила проверяются одним проходом по тексту: находим все вхождения
+# ключевых слов (опережающая проверка допускает перекрытия) и переводы строк.
+# Правило вида "A.*B" выполнено, если B встретилось после A в той же строке —
+# это эквивалентно исходным шаблонам, но работает за линейное время.
+_PHRASE_TOKENS = {
+    'free': 'free',
+    'money': 'money',
+    'get_rich_quick': 'get rich quick',
+    'buy': 'buy',
+    'now': 'now',
+    'click': 'click',
+    'here': 'here',
+    'limited': 'limited',
+    'offer': 'offer',
+    'adult_content': 'adult content',
+    'explicit_material': 'explicit material',
+    'copyright': 'copyright',
+    'plagiarism': 'plagiarism',
+}
+_PHRASE_PATTERN = re.compile(
+    r'(?=[fmgbnchloaep\n])(?=(?:'
+    + '|'.join(f'(?P<{name}>{re.escape(token)})' for name, token in _PHRASE_TOKENS.items())
+    + r'|(?P<newline>\n)))',
+    re.IGNORECASE
+)
+
+# Элементы монетизации для метрик: вид элемента -> маркеры. Ссылки ищутся
+# с учётом регистра (как count('http')), остальные маркеры — в нижнем регистре.
+# Маркеры покрывают отрендеренные тексты content_injector: дисклеймер
+# партнёрских ссылок, дисклеймер спонсорства ("...спонсирован...") и CTA.
+# Элемент считается один раз: маркеры одного вида, между которыми нет границы
+# предложения (ELEMENT_BOUNDARIES), относятся к одному элементу, поэтому
+# "Узнайте больше в премиум-версии." — один CTA, а не два.
+AFFILIATE_LINK_MARKERS = ('http',)
+DISCLAIMER_MARKERS = ('дисклеймер', 'disclaimer', 'спонсирован')
+CTA_MARKERS = ('узнайте больше', 'премиум')
+ELEMENT_BOUNDARIES = '.!?\n'
+
+def _element_pattern(markers: tuple) -> "re.Pattern":
+    """Маркер и следующие за ним маркеры того же вида в пределах предложения."""
+    marker = '(?:' + '|'.join(map(re.escape, markers)) + ')'
+    gap = '[^' + ''.join(map(re.escape, ELEMENT_BOUNDARIES)) + ']*?'
+    return re.compile(f'{marker}(?:{gap}{marker})*')
+
+# Вид элемента -> (маркеры для быстрой проверки, шаблон элемента в нижнем регистре)
+_ELEMENT_PATTERNS = {
+    'disclaimer': (DISCLAIMER_MARKERS, _element_pattern(DISCLAIMER_MARKERS)),
+    'cta': (CTA_MARKERS, _element_pattern(CTA_MARKERS)),
+}
+_LINK_MARKER_PATTERN = re.compile('|'.join(map(re.escape, AFFILIATE_LINK_MARKERS)))
+
+# Правила "A.*B": закрывающее слово -> (открывающее слово, признак)
+_LINE_RULES = {
+    'money': ('free', 'spam'),
+    'now': ('buy', 'aggressive'),
+    'here': ('click', 'aggressive'),
+    'offer': ('limited', 'aggressive'),
+}
+_LINE_OPENERS = {'free', 'buy', 'click', 'limited'}
+
+# Простые правила: слово -> признак
+_WORD_RULES = {
+    'get_rich_quick': 'spam',
+    'adult_content': 'adult',
+    'explicit_material': 'adult',
+    'copyright': 'copyright',
+    'plagiarism': 'copyright',
+}
+
+# Класс символов ссылки эквивалентен исходному набору альтернатив
+# ([a-zA-Z], [0-9], [$-_@.&+], [!*\\(),], %xx), но без перебора вариантов
+_LINK_PATTERN = re.compile(r'https?://[!$-_a-z]+')
+
+# Какие признаки текста нужны для вердикта каждой платформы
+_PLATFORM_FEATURES = {
+    'youtube': ('spam', 'aggressive'),
+    'amazon_kdp': ('adult', 'copyright', 'links'),
+    'general': ('uppercase', 'exclamation'),
+}
+
+_PHRASE_FEATURES = {'spam', 'aggressive', 'adult', 'copyright'}
+
+# Сколько символов предыдущего фрагмента нужно повторить, чтобы не пропустить фразу на границе
+PHRASE_OVERLAP = max(map(len, _PHRASE_TOKENS.values())) - 1
+
+# Символы, из которых состоит ссылка после схемы (см. _LINK_PATTERN)
+LINK_CHARS = '!' + ''.join(map(chr, range(ord('$'), ord('_') + 1))) + string.ascii_lowercase
+
+# Версия набора правил: входит в ключ кэша, поэтому изменение правил
+# автоматически делает старые результаты недоступными
+RULESET_VERSION = hashlib.sha256(repr((
+    sorted(_PHRASE_TOKENS.items()), sorted(_LINE_RULES.items()), sorted(_WORD_RULES.items()),
+    _LINK_PATTERN.pattern, sorted(_PLATFORM_FEATURES.items())
+)).encode('utf-8')).hexdigest()[:16]
+
+@dataclass
+class ComplianceFeatures:
+    """Признаки текста, из которых выводятся вердикты всех платформ."""
+    length: int = 0
+    uppercase_count: int = 0
+    exclamation_count: int = 0
+    link_count: int = 0
+    spam: bool = False
+    aggressive: bool = False
+    adult: bool = False
+    copyright: bool = False
+    # Элементы монетизации (только при elements=True)
+    http_count: int = 0
+    disclaimer_count: int = 0
+    cta_count: int = 0
+
+def extract_compliance_features(
+    text: str,
+    platforms: Iterable[str] = PLATFORMS,
+    elements: bool = False
+) -> ComplianceFeatures:
+    """
+    Вычисляет признаки текста за один обход для выбранных платформ.
+
+    Args:
+        text: Текст для проверки
+        platforms: Платформы, для которых нужны признаки
+        elements: Подсчитать также элементы монетизации (ссылки, дисклеймеры, CTA)
+
+    Returns:
+        Признаки текста
+    """
+    needed = set()
+    for platform in platforms:
+        needed.update(_PLATFORM_FEATURES[platform])
+
+    features = ComplianceFeatures(length=len(text))
+
+    phrase_features = needed & _PHRASE_FEATURES
+    if phrase_features:
+        _scan_phrases(text, features, phrase_features)
+    if elements:
+        counts = count_monetization_elements(text)
+        features.http_count = counts['affiliate_link']
+        features.disclaimer_count = counts['disclaimer']
+        features.cta_count = counts['cta']
+    if 'links' in needed:
+        features.link_count = count_links(text)
+    if 'uppercase' in needed:
+        features.uppercase_count = sum(map(str.isupper, text))
+    if 'exclamation' in needed:
+        features.exclamation_count = text.count('!')
+
+    return features
+
+def count_links(text: str) -> int:
+    """Считает внешние ссылки без построения списка совпадений."""
+    return sum(1 for _ in _LINK_PATTERN.finditer(text))
+
+def _lower_keeping_positions(text: str) -> str:
+    """
+    Нижний регистр без сдвига позиций.
+
+    Символы, у которых lower() меняет длину (например, 'İ'), остаются
+    как есть — так же, как в таблицах batch_analytics; частью маркера
+    они стать не могут.
+    """
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return ''.join(c if len(lower) != 1 else lower for c, lower in zip(text, map(str.lower, text)))
+
+def count_monetization_elements(text: str, positions: bool = False) -> Dict[str, Any]:
+    """
+    Считает элементы монетизации в тексте: все элементы, а не признак наличия.
+
+    Текст переводится в нижний регистр один раз; шаблон вида элемента
+    применяется, только если в тексте есть хотя бы один его маркер.
+
+    Args:
+        text: Текст описания
+        positions: Дополнительно вернуть позиции элементов
+
+    Returns:
+        Количества affiliate_link, disclaimer, cta и (если positions) список
+        positions из кортежей (вид, начало, конец) в порядке появления
+    """
+    result: Dict[str, Any] = {'affiliate_link': sum(text.count(marker) for marker in AFFILIATE_LINK_MARKERS)}
+    spans = []
+    if positions:
+        spans = [('affiliate_link', match.start(), match.end()) for match in _LINK_MARKER_PATTERN.finditer(text)]
+
+    lowered = _lower_keeping_positions(text)
+    for kind, (markers, pattern) in _ELEMENT_PATTERNS.items():
+        # Шаблон запускается с первого маркера: поиск подстроки быстрее поиска шаблоном
+        first = min((index for index in map(lowered.find, markers) if index >= 0), default=-1)
+        if first < 0:
+            result[kind] = 0
+        elif positions:
+            found = [(kind, match.start(), match.end()) for match in pattern.finditer(lowered, first)]
+            spans.extend(found)
+            result[kind] = len(found)
+        else:
+            result[kind] = sum(1 for _ in pattern.finditer(lowered, first))
+
+    if positions:
+        result['positions'] = sorted(spans, key=lambda span: span[1])
+    return result
+
+def mark_phrase_features(text: str, features: ComplianceFeatures, platforms: Iterable[str] = PLATFORMS) -> None:
+    """
+    Отмечает в features фразовые признаки платформ, найденные в тексте.
+
+    Флаги только устанавливаются и никогда не сбрасываются, поэтому при потоковой
+    проверке пословных правил (amazon_kdp) фрагменты могут пересекаться
+    на PHRASE_OVERLAP символов. Правила "A.*B" требуют целых строк.
+    """
+    needed = set()
+    for platform in platforms:
+        needed.update(_PLATFORM_FEATURES[platform])
+    needed = {feature for feature in needed & _PHRASE_FEATURES if not getattr(features, feature)}
+    if needed:
+        _scan_phrases(text, features, needed)
+
+def _scan_phrases(text: str, features: ComplianceFeatures, needed: set) -> None:
+    """Проверяет фразовые правила за один линейный проход по тексту."""
+    pending = set(needed)
+    opened = set()
+
+    for match in _PHRASE_PATTERN.finditer(text):
+        token = match.lastgroup
+
+        if token == 'newline':
+            opened.clear()
+            continue
+
+        if token in _LINE_OPENERS:
+            opened.add(token)
+            continue
+
+        rule = _LINE_RULES.get(token)
+        if rule is not None:
+            opener, feature = rule
+            if opener not in opened:
+                continue
+        else:
+            feature = _WORD_RULES[token]
+
+        if feature in pending:
+            setattr(features, feature, True)
+            pending.discard(feature)
+            if not pending:
+                break
+
+def youtube_issues(features: ComplianceFeatures) -> list[str]:
+    """Формирует список нарушений политик YouTube по признакам текста."""
     issues = []
-    
-    # Примеры простых проверок
-    if re.search(r'free.*money|get rich quick', description, re.IGNORECASE):
+
+    if features.spam:
         issues.append("Potential spam/scam language detected.")
-    
-    if re.search(r'buy.*now|click.*here|limited.*offer', description, re.IGNORECASE):
+
+    if features.aggressive:
         issues.append("Potentially aggressive marketing language detected.")
-    
+
     # Проверка длины описания (YouTube ограничивает до 5000 символов)
-    if len(description) > 5000:
-        issues.append(f"Description too long: {len(description)} characters (max 5000).")
-    
+    if features.length > 5000:
+        issues.append(f"Description too long: {features.length} characters (max 5000).")
+
+    return issues
+
+def amazon_kdp_issues(features: ComplianceFeatures) -> list[str]:
+    """Формирует список нарушений политик Amazon KDP по признакам текста."""
+    issues = []
+
+    if features.adult:
+        issues.append("Potential adult content detected.")
+
+    if features.copyright:
+        issues.append("Potential copyright issues detected.")
+
+    # Проверка на слишком много ссылок
+    if features.link_count > 5:
+        issues.append(f"Too many external links: {features.link_count} (recommended: max 5).")
+
+    return issues
+
+def general_issues(features: ComplianceFeatures) -> list[str]:
+    """Формирует список общих проблем контента по признакам текста."""
+    issues = []
+
+    # Проверка на чрезмерное использование заглавных букв (CAPS LOCK)
+    caps_ratio = features.uppercase_count / (features.length + 1)
+    if caps_ratio > 0.3:
+        issues.append("Excessive use of capital letters detected.")
+
+    # Проверка на чрезмерное количество восклицательных знаков
+    if features.exclamation_count > 10:
+        issues.append(f"Too many exclamation marks: {features.exclamation_count}.")
+
+    return issues
+
+_PLATFORM_VERDICTS = {
+    'youtube': youtube_issues,
+    'amazon_kdp': amazon_kdp_issues,
+    'general': general_issues,
+}
+
+def verdicts_from_features(features: ComplianceFeatures, platforms: Iterable[str] = PLATFORMS) -> Dict[str, list[str]]:
+    """Формирует вердикты платформ по уже вычисленным признакам текста."""
+    return {platform: _PLATFORM_VERDICTS[platform](features) for platform in platforms}
+
+# Номера этапов метрик: проверка платформ — compliance.<платформа>[+<платформа>...]
+_COMPLIANCE_STAGES: Dict[tuple, int] = {}
+
+def _compliance_stage(platforms: tuple, cache: str) -> int:
+    stage = _COMPLIANCE_STAGES.get((platforms, cache))
+    if stage is None:
+        stage = _COMPLIANCE_STAGES[(platforms, cache)] = stage_id('compliance.' + '+'.join(platforms), cache)
+    return stage
+
+def scan_compliance(text: str, platforms: Iterable[str] = PLATFORMS) -> Dict[str, list[str]]:
+    """
+    Проверяет текст сразу для нескольких платформ за один проход.
+
+    Args:
+        text: Текст для проверки
+        platforms: Платформы ('youtube', 'amazon_kdp', 'general')
+
+    Returns:
+        Словарь {платформа: список проблем}
+    """
+    started = time.perf_counter()
+    platforms = tuple(platforms)
+    cache = get_result_cache()
+    key = ('compliance', RULESET_VERSION, platforms, text_digest(text))
+
+    verdicts = cache.get(key)
+    if verdicts is None:
+        features = extract_compliance_features(text, platforms)
+        verdicts = verdicts_from_features(features, platforms)
+        cache.put(key, verdicts)
+        observe_stage(_compliance_stage(platforms, 'miss'), started)
+    else:
+        observe_stage(_compliance_stage(platforms, 'hit'), started)
+
+    # Вызывающий код получает копии списков, закэшированный результат не меняется
+    return {platform: list(issues) for platform, issues in verdicts.items()}
+
+def check_youtube_description_compliance(description: str) -> list[str]:
+    """Проверяет описание YouTube на потенциальные нарушения политик."""
+    logger.info("Checking YouTube description compliance")
+    issues = scan_compliance(description, ('youtube',))['youtube']
+
     if not issues:
         logger.info("✅ YouTube description compliance check passed")
     else:
-        logger.warning(f"⚠️ YouTube description compliance issues: {issues}")
-    
+        logger.warning("⚠️ YouTube description compliance issues: %s", issues)
+
     return issues
 
 def check_amazon_kdp_compliance(book_content: str) -> list[str]:
     """Проверяет содержимое книги на потенциальные нарушения политик Amazon KDP."""
     logger.info("Checking Amazon KDP content compliance")
-    issues = []
-    
-    # Примеры простых проверок
-    if re.search(r'adult content|explicit material', book_content, re.IGNORECASE):
-        issues.append("Potential adult content detected.")
-    
-    if re.search(r'copyright|plagiarism', book_content, re.IGNORECASE):
-        issues.append("Potential copyright issues detected.")
-    
-    # Проверка на слишком много ссылок
-    link_count = len(re.findall(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', 
-                                book_content))
-    if link_count > 5:
-        issues.append(f"Too many external links: {link_count} (recommended: max 5).")
-    
+    issues = scan_compliance(book_content, ('amazon_kdp',))['amazon_kdp']
+
     if not issues:
         logger.info("✅ Amazon KDP content compliance check passed")
     else:
-        logger.warning(f"⚠️ Amazon KDP content compliance issues: {issues}")
-    
+        logger.warning("⚠️ Amazon KDP content compliance issues: %s", issues)
+
     return issues
 
 def check_general_compliance(content: str) -> list[str]:
     """Общая проверка контента на потенциальные проблемы."""
     logger.info("Performing general compliance check")
-    issues = []
-    
-    # Проверка на чрезмерное использование заглавных букв (CAPS LOCK)
-    caps_ratio = sum(1 for c in content if c.isupper()) / (len(content) + 1)
-    if caps_ratio > 0.3:
-        issues.append("Excessive use of capital letters detected.")
-    
-    # Проверка на чрезмерное количество восклицательных знаков
-    exclamation_count = content.count('!')
-    if exclamation_count > 10:
-        issues.append(f"Too many exclamation marks: {exclamation_count}.")
-    
+    issues = scan_compliance(content, ('general',))['general']
+
     if not issues:
         logger.info("✅ General compliance check passed")
     else:
-        logger.warning(f"⚠️ General compliance issues: {issues}")
-    
+        logger.warning("⚠️ General compliance issues: %s", issues)
+
     return issues
@@ -1,11 +1,72 @@
-
 # modules/content_injector.py
 import logging
-import re
-from typing import Dict, Any, List
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+
+from modules.keyword_matcher import KeywordMatcher, get_keyword_matcher
+from utils.metrics import observe_stage, stage_id
 
 logger = logging.getLogger(__name__)
 
+# Номера этапов метрик для шагов внедрения
+_INJECT_STAGES = {
+    action: stage_id(f'inject.{action}')
+    for action in (
+        'inject_affiliate_links', 'add_affiliate_disclaimer', 'inject_sponsorship',
+        'add_sponsorship_disclaimer', 'add_premium_cta'
+    )
+}
+
+@dataclass(frozen=True)
+class InjectionPlan:
+    """
+    Скомпилированный план внедрения.
+
+    Содержит список действий, заранее отрендеренные тексты дисклеймеров и CTA
+    и скомпилированный автомат ключевых слов, поэтому применение плана
+    не обращается к конфигурации.
+    """
+    actions: Tuple[str, ...]
+    affiliate_matcher: Optional[KeywordMatcher] = None
+    affiliate_disclaimer: str = ""
+    sponsor_mention: str = ""
+    sponsorship_disclaimer: str = ""
+    premium_cta: str = ""
+
+def compile_injection_plan(actions: List[str], config: Dict[str, Any]) -> InjectionPlan:
+    """
+    Компилирует план внедрения для списка действий.
+
+    Args:
+        actions: Список действий для выполнения
+        config: Конфигурация монетизации
+
+    Returns:
+        Неизменяемый план внедрения
+    """
+    monetization = config.get('monetization', {})
+
+    affiliate_matcher = None
+    if 'inject_affiliate_links' in actions:
+        default_links = monetization.get('affiliate_links', {}).get('default_links', {})
+        if default_links:
+            affiliate_matcher = get_keyword_matcher(default_links)
+
+    sponsorship_disclaimer = ""
+    if 'add_sponsorship_disclaimer' in actions:
+        sponsor_name = monetization.get('sponsorship', {}).get('sponsor_name', 'Партнёр')
+        sponsorship_disclaimer = _generate_sponsorship_disclaimer(sponsor_name, config)
+
+    return InjectionPlan(
+        actions=tuple(actions),
+        affiliate_matcher=affiliate_matcher,
+        affiliate_disclaimer=_generate_affiliate_disclaimer(config) if 'add_affiliate_disclaimer' in actions else "",
+        sponsor_mention=_generate_sponsor_mention(config) if 'inject_sponsorship' in actions else "",
+        sponsorship_disclaimer=sponsorship_disclaimer,
+        premium_cta=_generate_premium_cta(config) if 'add_premium_cta' in actions else ""
+    )
+
 def inject_monetization_elements(
     content: Dict[str, Any],
     actions: List[str],
@@ -13,96 +74,130 @@ def inject_monetization_elements(
 ) -> Dict[str, Any]:
     """
     Внедряет элементы монетизации в контент.
-    
+
     Args:
         content: Словарь с контентом (description, chapters, etc.)
         actions: Список действий для выполнения
         config: Конфигурация монетизации
-    
+
+    Returns:
+        Обновлённый контент с элементами монетизации
+    """
+    return apply_injection_plan(content, compile_injection_plan(actions, config))
+
+def apply_injection_plan(content: Dict[str, Any], plan: InjectionPlan) -> Dict[str, Any]:
+    """
+    Применяет скомпилированный план внедрения к контенту.
+
+    Шаги внедрения только собирают фрагменты до и после описания;
+    итоговая строка описания склеивается один раз.
+
+    Args:
+        content: Словарь с контентом (description, chapters, etc.)
+        plan: План, полученный из compile_injection_plan
+
     Returns:
         Обновлённый контент с элементами монетизации
     """
     logger.info("Starting content injection")
-    modified_content = content.copy()
-    
+    actions = plan.actions
+    segments = _DescriptionSegments(content.get('description', ''))
+
     if 'inject_affiliate_links' in actions:
-        modified_content = _inject_affiliate_links(modified_content, config)
-    
+        started = time.perf_counter()
+        _inject_affiliate_links(segments, plan.affiliate_matcher)
+        observe_stage(_INJECT_STAGES['inject_affiliate_links'], started)
+
     if 'add_affiliate_disclaimer' in actions:
-        modified_content = _inject_disclaimer_to_description(
-            modified_content, 
-            _generate_affiliate_disclaimer(config)
-        )
-    
+        started = time.perf_counter()
+        _inject_disclaimer_to_description(segments, plan.affiliate_disclaimer)
+        observe_stage(_INJECT_STAGES['add_affiliate_disclaimer'], started)
+
     if 'inject_sponsorship' in actions:
-        modified_content = _inject_sponsorship(modified_content, config)
-    
+        started = time.perf_counter()
+        _inject_sponsorship(segments, plan.sponsor_mention)
+        observe_stage(_INJECT_STAGES['inject_sponsorship'], started)
+
     if 'add_sponsorship_disclaimer' in actions:
-        sponsor_name = config.get('monetization', {}).get('sponsorship', {}).get('sponsor_name', 'Партнёр')
-        modified_content = _inject_disclaimer_to_description(
-            modified_content,
-            _generate_sponsorship_disclaimer(sponsor_name, config)
-        )
-    
+        started = time.perf_counter()
+        _inject_disclaimer_to_description(segments, plan.sponsorship_disclaimer)
+        observe_stage(_INJECT_STAGES['add_sponsorship_disclaimer'], started)
+
     if 'add_premium_cta' in actions:
-        modified_content = _inject_premium_cta(modified_content, config)
-    
+        started = time.perf_counter()
+        _inject_premium_cta(segments, plan.premium_cta)
+        observe_stage(_INJECT_STAGES['add_premium_cta'], started)
+
+    modified_content = dict(content)
+    modified_content['description'] = segments.join()
+
     logger.info("Content injection completed")
     return modified_content
 
-def _inject_affiliate_links(content: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+class _DescriptionSegments:
+    """Фрагменты описания: префиксы, исходный текст и суффиксы."""
+
+    __slots__ = ('prefix', 'body', 'suffix', 'length')
+
+    def __init__(self, body: str):
+        self.prefix: List[str] = []
+        self.body = body
+        self.suffix: List[str] = []
+        self.length = len(body)
+
+    def prepend(self, *parts: str) -> None:
+        self.prefix[:0] = parts
+        self.length += sum(len(part) for part in parts)
+
+    def append(self, *parts: str) -> None:
+        self.suffix.extend(parts)
+        self.length += sum(len(part) for part in parts)
+
+    def join(self) -> str:
+        if not self.prefix and not self.suffix:
+            return self.body
+        return ''.join([*self.prefix, self.body, *self.suffix])
+
+def _inject_affiliate_links(segments: _DescriptionSegments, matcher: Optional[KeywordMatcher]) -> None:
     """Внедряет партнёрские ссылки в описание."""
     logger.info("Injecting affiliate links")
-    
-    description = content.get('description', '')
-    affiliate_config = config.get('monetization', {}).get('affiliate_links', {})
-    default_links = affiliate_config.get('default_links', {})
-    
-    for keyword, affiliate_url in default_links.items():
-        # Простая замена ключевых слов на ссылки
-        pattern = rf'\b{re.escape(keyword)}\b'
-        replacement = f"{keyword} ({affiliate_url})"
-        description = re.sub(pattern, replacement, description, count=1, flags=re.IGNORECASE)
-        logger.debug(f"Replaced keyword '{keyword}' with affiliate link")
-    
-    content['description'] = description
-    return content
-
-def _inject_disclaimer_to_description(content: Dict[str, Any], disclaimer: str) -> Dict[str, Any]:
+
+    if matcher is not None:
+        # Все ключевые слова заменяются за один проход скомпилированным автоматом
+        body = matcher.replace(segments.body)
+        segments.length += len(body) - len(segments.body)
+        segments.body = body
+
+def _inject_disclaimer_to_description(segments: _DescriptionSegments, disclaimer: str) -> None:
     """Добавляет дисклеймер в описание."""
     logger.info("Injecting disclaimer to description")
-    
-    description = content.get('description', '')
-    if description:
-        content['description'] = f"{description}\n\n{disclaimer}"
+
+    if segments.length:
+        segments.append("\n\n", disclaimer)
     else:
-        content['description'] = disclaimer
-    
-    return content
+        segments.append(disclaimer)
 
-def _inject_sponsorship(content: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+def _inject_sponsorship(segments: _DescriptionSegments, sponsor_mention: str) -> None:
     """Внедряет спонсорский контент."""
     logger.info("Injecting sponsorship content")
-    
-    sponsorship_config = config.get('monetization', {}).get('sponsorship', {})
-    sponsor_mention = f"При поддержке: {sponsorship_config.get('sponsor_name', 'Наш спонсор')}"
-    
-    description = content.get('description', '')
-    content['description'] = f"{sponsor_mention}\n\n{description}"
-    
-    return content
-
-def _inject_premium_cta(content: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+
+    segments.prepend(sponsor_mention, "\n\n")
+
+def _inject_premium_cta(segments: _DescriptionSegments, cta: str) -> None:
     """Добавляет призыв к действию для премиум-контента."""
     logger.info("Injecting premium CTA")
-    
-    cta = config.get('monetization', {}).get('premium_content', {}).get('call_to_action',
-                                                                          "Узнайте больше в премиум-версии.")
-    
-    description = content.get('description', '')
-    content['description'] = f"{description}\n\n{cta}"
-    
-    return content
+
+    segments.append("\n\n", cta)
+
+def _generate_sponsor_mention(config: Dict[str, Any]) -> str:
+    """Генерирует упоминание спонсора."""
+    sponsorship_config = config.get('monetization', {}).get('sponsorship', {})
+    return f"При поддержке: {sponsorship_config.get('sponsor_name', 'Наш спонсор')}"
+
+def _generate_premium_cta(config: Dict[str, Any]) -> str:
+    """Генерирует призыв к действию для премиум-контента."""
+    return config.get('monetization', {}).get('premium_content', {}).get('call_to_action',
+                                                                         "Узнайте больше в премиум-версии.")
 
 def _generate_affiliate_disclaimer(config: Dict[str, Any]) -> str:
     """Генерирует дисклеймер для партнёрских ссылок."""
@@ -0,0 +1,457 @@
+# modules/event_sink.py
+import asyncio
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Any, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EVENTS_PATH = 'ssv_events.db'
+DEFAULT_BUFFER_CAPACITY = 100000
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_PUT_TIMEOUT = 0.05
+
+class EventStore:
+    """
+    Хранилище событий аналитики.
+
+    Для подключения другого хранилища (БД, очередь, внешняя аналитика)
+    достаточно реализовать write_batch и при необходимости close.
+    write_batch возвращает id последнего записанного события, если
+    хранилище нумерует события, иначе None.
+    """
+
+    def write_batch(self, events: List[Dict[str, Any]]) -> Optional[int]:
+        raise NotImplementedError
+
+    def write_copy(self, events: List[Dict[str, Any]], last_id: Optional[int]) -> None:
+        """
+        Дописывает копию пачки, уже сохранённой основным хранилищем с id до last_id.
+
+        Вызывается CompositeEventStore для дополнительных хранилищ; хранилище,
+        которое догоняет основное после перезапуска, запоминает last_id.
+        """
+        self.write_batch(events)
+
+    def close(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики хранилища для /health (по умолчанию нет)."""
+        return {}
+
+class NullEventStore(EventStore):
+    """
+    Хранилище, которое ничего не сохраняет.
+
+    Используется, когда в конфигурации не задан analytics.events_path:
+    слушатели приёмника (агрегаты отчётов) получают события, но на диск
+    они не попадают.
+    """
+
+    def write_batch(self, events: List[Dict[str, Any]]) -> Optional[int]:
+        return None
+
+class SQLiteEventStore(EventStore):
+    """Локальное хранилище событий только на добавление: SQLite в режиме WAL."""
+
+    def __init__(self, path: str = DEFAULT_EVENTS_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Соединение используется только потоком записи, но создаётся здесь
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            "id INTEGER PRIMARY KEY, event_type TEXT NOT NULL, content_id TEXT, "
+            "timestamp TEXT NOT NULL, metadata TEXT)"
+        )
+        self._connection.commit()
+
+    def write_batch(self, events: List[Dict[str, Any]]) -> Optional[int]:
+        rows = [
+            (
+                event["event_type"],
+                event["content_id"],
+                event["timestamp"],
+                json.dumps(event["metadata"], ensure_ascii=False, default=str)
+            )
+            for event in events
+        ]
+        with self._connection:
+            self._connection.executemany(
+                "INSERT INTO events (event_type, content_id, timestamp, metadata) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            # Запись ведёт только этот поток: id пачки — последние вставленные
+            return self._connection.execute("SELECT last_insert_rowid()").fetchone()[0]
+
+    def close(self) -> None:
+        self._connection.close()
+
+class CompositeEventStore(EventStore):
+    """
+    Передаёт каждую пачку событий в несколько хранилищ по очереди.
+
+    Первое хранилище — основное: его ошибка означает, что пачка не записана,
+    и его id — id пачки. Ошибки дополнительных хранилищ (например, колоночного
+    хранилища метрик) пишутся в журнал и считаются отдельно, а пачка считается
+    записанной — иначе слушатели (агрегаты отчётов) пропустили бы события,
+    уже сохранённые в основном хранилище.
+    """
+
+    def __init__(self, stores: List[EventStore]):
+        self.stores = stores
+        # Путь основного хранилища (для чтения событий при запуске)
+        self.path = getattr(stores[0], 'path', None) if stores else None
+        self._secondary_failed: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def write_batch(self, events: List[Dict[str, Any]]) -> Optional[int]:
+        if not self.stores:
+            return None
+        # Ошибка основного хранилища передаётся приёмнику: пачка не записана
+        last_id = self.stores[0].write_batch(events)
+        for store in self.stores[1:]:
+            try:
+                store.write_copy(events, last_id)
+            except Exception as e:
+                name = type(store).__name__
+                logger.error(f"Failed to write {len(events)} analytics events to {name}: {e}", exc_info=True)
+                with self._lock:
+                    self._secondary_failed[name] = self._secondary_failed.get(name, 0) + len(events)
+        return last_id
+
+    def stats(self) -> Dict[str, Any]:
+        """Число событий, не записанных в дополнительные хранилища, по типу хранилища."""
+        with self._lock:
+            return {"secondary_failed": dict(self._secondary_failed)}
+
+    def close(self) -> None:
+        for store in self.stores:
+            store.close()
+
+def iter_stored_events(
+    path: str = DEFAULT_EVENTS_PATH,
+    event_type: Optional[str] = None,
+    after_id: int = 0
+) -> Iterator[Dict[str, Any]]:
+    """
+    Читает сохранённые события (отдельным соединением, не мешая записи).
+
+    Args:
+        path: Путь к базе событий
+        event_type: Только события этого типа
+        after_id: Только события с id больше этого
+
+    Yields:
+        События в порядке записи (с полем id)
+    """
+    connection = sqlite3.connect(path)
+    try:
+        query = "SELECT id, event_type, content_id, timestamp, metadata FROM events WHERE id > ?"
+        params: tuple = (after_id,)
+        if event_type is not None:
+            query += " AND event_type = ?"
+            params += (event_type,)
+        for row in connection.execute(query + " ORDER BY id", params):
+            yield {
+                "id": row[0],
+                "event_type": row[1],
+                "content_id": row[2],
+                "timestamp": row[3],
+                "metadata": json.loads(row[4]) if row[4] else {}
+            }
+    finally:
+        connection.close()
+
+def last_stored_event_id(path: str = DEFAULT_EVENTS_PATH) -> int:
+    """Возвращает id последнего сохранённого события (0, если событий нет)."""
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+    finally:
+        connection.close()
+
+class NullEventSink:
+    """
+    Приёмник по умолчанию, пока configure_event_sink не вызван: события отбрасываются.
+
+    Не создаёт файлов и потоков, поэтому библиотечные вызовы (process_content,
+    задания, тесты) без настройки аналитики ничего не пишут в текущий каталог.
+    """
+
+    def __init__(self):
+        self.store = NullEventStore()
+        self._lock = threading.Lock()
+        self._discarded = 0
+
+    def emit(self, event: Dict[str, Any]) -> bool:
+        """Отбрасывает событие; возвращает False — событие не принято к записи."""
+        with self._lock:
+            self._discarded += 1
+        return False
+
+    def add_listener(self, listener: Callable[[List[Dict[str, Any]], Optional[int]], None]) -> None:
+        """Слушатели не вызываются: записанных пачек не бывает."""
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        return True
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"configured": False, "discarded": self._discarded}
+
+def _in_event_loop() -> bool:
+    """Выполняется ли код в потоке работающего цикла событий asyncio."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+class BufferedEventSink:
+    """
+    Буферизованная запись событий.
+
+    События складываются в ограниченный кольцевой буфер в памяти, а фоновый
+    поток сбрасывает их в хранилище пачками — при накоплении batch_size событий
+    или раз в flush_interval секунд. Если буфер заполнен, emit из рабочего
+    потока ждёт освобождения места не дольше put_timeout секунд, после чего
+    событие отбрасывается (и учитывается в статистике). В потоке цикла событий
+    emit не ждёт вовсе: ожидание остановило бы все асинхронные обработчики.
+
+    Слушатели (add_listener) получают каждую успешно записанную пачку
+    в потоке записи — так агрегаты отчётов учитывают только сохранённые события.
+    """
+
+    def __init__(
+        self,
+        store: EventStore,
+        capacity: int = DEFAULT_BUFFER_CAPACITY,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        put_timeout: float = DEFAULT_PUT_TIMEOUT
+    ):
+        self.store = store
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+
+        self._buffer: deque = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._drained = threading.Condition(self._lock)
+        self._writing = False
+        self._flush_requested = False
+        self._closed = False
+        self._stats = {"emitted": 0, "written": 0, "dropped": 0, "failed": 0, "batches": 0}
+        self._reported_dropped = 0
+        self._listeners: List[Callable[[List[Dict[str, Any]], Optional[int]], None]] = []
+
+        self._thread = threading.Thread(target=self._run, name="event-sink-writer", daemon=True)
+        self._thread.start()
+
+    def emit(self, event: Dict[str, Any]) -> bool:
+        """
+        Добавляет событие в буфер.
+
+        Returns:
+            False, если буфер переполнен или запись остановлена и событие отброшено
+        """
+        with self._lock:
+            if len(self._buffer) >= self.capacity and not self._closed:
+                self._not_empty.notify()
+                if not _in_event_loop():
+                    self._not_full.wait_for(lambda: len(self._buffer) < self.capacity or self._closed, self.put_timeout)
+            if self._closed or len(self._buffer) >= self.capacity:
+                self._stats["dropped"] += 1
+                return False
+
+            self._buffer.append(event)
+            self._stats["emitted"] += 1
+            if len(self._buffer) == self.batch_size:
+                self._not_empty.notify()
+            return True
+
+    def add_listener(self, listener: Callable[[List[Dict[str, Any]], Optional[int]], None]) -> None:
+        """
+        Подписывает listener(events, last_id) на записанные пачки событий.
+
+        Вызывается в потоке записи после успешной записи пачки, до того как
+        flush сочтёт её записанной; last_id — результат write_batch.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Ждёт записи всех накопленных событий.
+
+        Returns:
+            True, если буфер опустел до истечения timeout
+        """
+        with self._lock:
+            self._flush_requested = True
+            self._not_empty.notify()
+            return self._drained.wait_for(lambda: not self._buffer and not self._writing, timeout)
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """Сбрасывает оставшиеся события, останавливает поток записи и закрывает хранилище."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._not_empty.notify()
+            self._not_full.notify_all()
+        self._thread.join(timeout)
+        self.store.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает счётчики принятых, записанных и отброшенных событий."""
+        with self._lock:
+            stats = {**self._stats, "buffered": len(self._buffer), "capacity": self.capacity}
+        stats.update(self.store.stats())
+        return stats
+
+    def _run(self) -> None:
+        last_flush = time.monotonic()
+        while True:
+            with self._lock:
+                self._not_empty.wait_for(
+                    lambda: len(self._buffer) >= self.batch_size or self._flush_requested or self._closed,
+                    max(self.flush_interval - (time.monotonic() - last_flush), 0)
+                )
+                if not self._buffer:
+                    self._flush_requested = False
+                    self._drained.notify_all()
+                    if self._closed:
+                        return
+                    last_flush = time.monotonic()
+                    continue
+
+                count = min(len(self._buffer), self.batch_size)
+                batch = [self._buffer.popleft() for _ in range(count)]
+                self._writing = True
+                self._not_full.notify_all()
+
+            try:
+                last_id = self.store.write_batch(batch)
+                written, failed = len(batch), 0
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} analytics events: {e}", exc_info=True)
+                written, failed = 0, len(batch)
+
+            if written:
+                for listener in list(self._listeners):
+                    try:
+                        listener(batch, last_id)
+                    except Exception as e:
+                        logger.error(f"Analytics event listener failed: {e}", exc_info=True)
+
+            with self._lock:
+                self._writing = False
+                self._stats["written"] += written
+                self._stats["failed"] += failed
+                self._stats["batches"] += 1
+                dropped = self._stats["dropped"] - self._reported_dropped
+                self._reported_dropped = self._stats["dropped"]
+                last_flush = time.monotonic()
+                if not self._buffer:
+                    self._flush_requested = False
+                    self._drained.notify_all()
+
+            # Отброшенные события сообщаются сводно, а не по одному на событие
+            if dropped:
+                logger.warning(f"Event buffer full: dropped {dropped} analytics events")
+
+_event_sink: Optional[Any] = None
+_event_sink_lock = threading.Lock()
+
+def configure_event_sink(config: Dict[str, Any], store: Optional[EventStore] = None) -> BufferedEventSink:
+    """
+    Создаёт общий приёмник событий по разделу analytics конфигурации.
+
+    Args:
+        config: Конфигурация монетизации
+        store: Своё хранилище вместо SQLite
+
+    Returns:
+        Общий приёмник событий (без analytics.events_path и своего хранилища
+        события не сохраняются на диск)
+    """
+    global _event_sink
+    analytics_config = config.get('analytics', {})
+    events_path = analytics_config.get('events_path')
+    if store is None and not events_path:
+        logger.info("analytics.events_path is not set: analytics events are not persisted")
+        store = NullEventStore()
+    elif store is None:
+        store = SQLiteEventStore(events_path)
+        metrics_path = analytics_config.get('metrics_store_path')
+        if metrics_path:
+            # Импорт здесь: колоночное хранилище требует numpy только при включении
+            try:
+                from modules.metrics_store import open_metrics_store
+                metrics_store = open_metrics_store(metrics_path, analytics_config.get('metrics_segment_rows'))
+                # Строки, не записанные в сегменты до остановки, берутся из журнала событий
+                metrics_store.catch_up(events_path)
+                store = CompositeEventStore([store, metrics_store])
+            except ImportError as e:
+                logger.warning(f"Metrics store disabled: {e}")
+
+    sink = BufferedEventSink(
+        store,
+        capacity=analytics_config.get('buffer_capacity', DEFAULT_BUFFER_CAPACITY),
+        batch_size=analytics_config.get('batch_size', DEFAULT_BATCH_SIZE),
+        flush_interval=analytics_config.get('flush_interval_seconds', DEFAULT_FLUSH_INTERVAL),
+        put_timeout=analytics_config.get('put_timeout_seconds', DEFAULT_PUT_TIMEOUT)
+    )
+
+    with _event_sink_lock:
+        previous, _event_sink = _event_sink, sink
+    if previous is not None:
+        previous.close()
+
+    logger.info(f"Event sink configured: {type(sink.store).__name__}")
+    return sink
+
+def get_event_sink() -> Any:
+    """
+    Возвращает общий приёмник событий.
+
+    До configure_event_sink — NullEventSink: события отбрасываются,
+    файлы и поток записи не создаются.
+    """
+    global _event_sink
+    if _event_sink is None:
+        with _event_sink_lock:
+            if _event_sink is None:
+                _event_sink = NullEventSink()
+    return _event_sink
+
+def close_event_sink() -> None:
+    """Сбрасывает и закрывает общий приёмник событий."""
+    global _event_sink
+    with _event_sink_lock:
+        sink, _event_sink = _event_sink, None
+    if sink is not None:
+        sink.close()
+
+atexit.register(close_event_sink)
@@ -0,0 +1,198 @@
+# modules/incremental_compliance.py
+import logging
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Dict, Iterable, List
+
+from modules.compliance_checker import (
+    ComplianceFeatures,
+    extract_compliance_features,
+    verdicts_from_features
+)
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 4096
+MAX_DOCUMENTS = 1000
+
+_COUNTERS = ('length', 'uppercase_count', 'exclamation_count', 'link_count')
+_FLAGS = ('spam', 'aggressive', 'adult', 'copyright')
+
+def _split_chunks(text: str, chunk_size: int) -> List[str]:
+    """
+    Делит текст на фрагменты не короче chunk_size, заканчивающиеся переводом строки.
+
+    Ни одно правило проверки не пересекает перевод строки: фразовые правила
+    работают в пределах строки, а символ '\\n' не входит в класс символов ссылки.
+    Поэтому признаки таких фрагментов складываются без перекрытия границ.
+    """
+    chunks = []
+    position = 0
+    while position < len(text):
+        newline = text.find('\n', position + chunk_size - 1)
+        if newline == -1:
+            chunks.append(text[position:])
+            break
+        chunks.append(text[position:newline + 1])
+        position = newline + 1
+    return chunks
+
+class _Document:
+    """Состояние документа: фрагменты, их признаки и суммарные счётчики."""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.features: List[ComplianceFeatures] = []
+        self.starts: List[int] = []
+        self.totals: Dict[str, int] = dict.fromkeys(_COUNTERS + _FLAGS, 0)
+
+    def add(self, features: ComplianceFeatures, sign: int) -> None:
+        for name in _COUNTERS:
+            self.totals[name] += sign * getattr(features, name)
+        for name in _FLAGS:
+            self.totals[name] += sign * int(getattr(features, name))
+
+    def reindex(self) -> None:
+        self.starts = []
+        offset = 0
+        for chunk in self.chunks:
+            self.starts.append(offset)
+            offset += len(chunk)
+
+    def combined(self) -> ComplianceFeatures:
+        features = ComplianceFeatures()
+        for name in _COUNTERS:
+            setattr(features, name, self.totals[name])
+        for name in _FLAGS:
+            setattr(features, name, self.totals[name] > 0)
+        return features
+
+class IncrementalComplianceChecker:
+    """
+    Инкрементальная проверка соответствия для редактируемых документов.
+
+    Для каждого документа хранятся признаки по фрагментам (вхождения правил,
+    заглавные буквы, ссылки, '!'). При правке пересканируются только
+    затронутые фрагменты, а вердикты совпадают с полной проверкой.
+    """
+
+    def __init__(
+        self,
+        platforms: Iterable[str] = ('amazon_kdp', 'general'),
+        chunk_size: int = CHUNK_SIZE,
+        max_documents: int = MAX_DOCUMENTS
+    ):
+        self.platforms = tuple(platforms)
+        self.chunk_size = chunk_size
+        self.max_documents = max_documents
+        self._documents: "OrderedDict[str, _Document]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open_document(self, doc_id: str, text: str) -> Dict[str, list[str]]:
+        """
+        Регистрирует документ и выполняет полную проверку.
+
+        Args:
+            doc_id: Идентификатор документа
+            text: Полный текст
+
+        Returns:
+            Словарь {платформа: список проблем}
+        """
+        document = _Document()
+        document.chunks = _split_chunks(text, self.chunk_size)
+        document.features = [self._scan(chunk) for chunk in document.chunks]
+        for features in document.features:
+            document.add(features, 1)
+        document.reindex()
+
+        with self._lock:
+            self._documents[doc_id] = document
+            self._documents.move_to_end(doc_id)
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+
+        logger.info(f"Opened document {doc_id} for incremental checks ({len(document.chunks)} chunks)")
+        return self._verdicts(document)
+
+    def apply_edit(self, doc_id: str, start: int, end: int, replacement: str) -> Dict[str, list[str]]:
+        """
+        Применяет правку text[start:end] = replacement и перепроверяет затронутые фрагменты.
+
+        Args:
+            doc_id: Идентификатор документа
+            start: Начало заменяемого диапазона
+            end: Конец заменяемого диапазона
+            replacement: Новый текст диапазона
+
+        Returns:
+            Словарь {платформа: список проблем} для всего документа
+
+        Raises:
+            KeyError: Если документ не открыт
+            ValueError: Если диапазон правки выходит за границы текста
+        """
+        with self._lock:
+            document = self._documents[doc_id]
+            self._documents.move_to_end(doc_id)
+
+            length = document.totals['length']
+            if not 0 <= start <= end <= length:
+                raise ValueError(f"Invalid edit range [{start}, {end}) for document of length {length}")
+
+            if not document.chunks:
+                first, last = 0, -1
+                region = ""
+                region_start = 0
+            else:
+                first = max(bisect_right(document.starts, start) - 1, 0)
+                last = max(bisect_right(document.starts, max(end - 1, start)) - 1, first)
+                # Слишком маленький фрагмент объединяется с предыдущим
+                if first > 0 and len(document.chunks[first]) < self.chunk_size // 4:
+                    first -= 1
+                region_start = document.starts[first]
+                region = ''.join(document.chunks[first:last + 1])
+
+            region = region[:start - region_start] + replacement + region[end - region_start:]
+
+            # Фрагмент должен заканчиваться переводом строки — иначе присоединяем следующий
+            while not region.endswith('\n') and last + 1 < len(document.chunks):
+                last += 1
+                region += document.chunks[last]
+
+            new_chunks = _split_chunks(region, self.chunk_size)
+            new_features = [self._scan(chunk) for chunk in new_chunks]
+
+            for features in document.features[first:last + 1]:
+                document.add(features, -1)
+            for features in new_features:
+                document.add(features, 1)
+
+            document.chunks[first:last + 1] = new_chunks
+            document.features[first:last + 1] = new_features
+            document.reindex()
+
+            logger.debug(f"Rescanned {len(region)} characters of document {doc_id}")
+            return self._verdicts(document)
+
+    def get_verdicts(self, doc_id: str) -> Dict[str, list[str]]:
+        """Возвращает текущие вердикты документа без пересканирования."""
+        with self._lock:
+            return self._verdicts(self._documents[doc_id])
+
+    def get_text(self, doc_id: str) -> str:
+        """Возвращает текущий текст документа."""
+        with self._lock:
+            return ''.join(self._documents[doc_id].chunks)
+
+    def close_document(self, doc_id: str) -> None:
+        """Удаляет состояние документа."""
+        with self._lock:
+            self._documents.pop(doc_id, None)
+
+    def _scan(self, chunk: str) -> ComplianceFeatures:
+        return extract_compliance_features(chunk, self.platforms)
+
+    def _verdicts(self, document: _Document) -> Dict[str, list[str]]:
+        return verdicts_from_features(document.combined(), self.platforms)
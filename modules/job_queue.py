@@ -0,0 +1,421 @@
+# modules/job_queue.py
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOBS_PATH = 'ssv_jobs.db'
+DEFAULT_JOBS_DIRECTORY = 'ssv_jobs'
+DEFAULT_JOB_WORKERS = 2
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_JOIN_TIMEOUT = 10.0
+
+JOB_STATUSES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+FINAL_STATUSES = ('succeeded', 'failed', 'cancelled')
+
+# Строк результатов, читаемых за одно обращение к базе при выгрузке
+RESULTS_PAGE_SIZE = 1000
+
+_JOB_COLUMNS = (
+    "id, kind, status, progress_done, progress_total, progress_failed, summary, error, "
+    "created_at, started_at, finished_at, cancel_requested"
+)
+
+class JobCancelled(Exception):
+    """Задание отменено (поднимается при проверке отмены в обработчике)."""
+
+class _JobInterrupted(Exception):
+    """Очередь останавливается: задание вернётся в очередь при следующем запуске."""
+
+class JobContext:
+    """
+    Контекст выполнения задания для обработчика.
+
+    Результаты элементов и прогресс записываются одной транзакцией, поэтому
+    после перезапуска сервера обработчик продолжает с done — первого
+    несохранённого элемента.
+    """
+
+    def __init__(self, queue: "JobQueue", job_id: str, kind: str, payload: Dict[str, Any], done: int):
+        self.queue = queue
+        self.job_id = job_id
+        self.kind = kind
+        self.payload = payload
+        self.done = done
+        self.directory = queue.job_directory(job_id)
+
+    def add_results(self, results: List[Any], failed: int = 0, total: Optional[int] = None) -> None:
+        """
+        Сохраняет результаты следующих элементов и продвигает прогресс.
+
+        Args:
+            results: Результаты элементов done, done + 1, ...
+            failed: Сколько из них завершились ошибкой
+            total: Общее число элементов (если известно)
+
+        Raises:
+            JobCancelled: Если задание отменено
+        """
+        self.queue._store_results(self.job_id, self.done, results, failed, total)
+        self.done += len(results)
+        self.check_cancelled()
+
+    def set_total(self, total: int) -> None:
+        """Задаёт общее число элементов задания."""
+        self.queue._update_job(self.job_id, progress_total=total)
+
+    def check_cancelled(self) -> None:
+        """
+        Raises:
+            JobCancelled: Если задание отменено
+        """
+        if self.job_id in self.queue._cancel_requested:
+            raise JobCancelled(self.job_id)
+        if self.queue._closed:
+            raise _JobInterrupted(self.job_id)
+
+class JobQueue:
+    """
+    Персистентная очередь долгих заданий: SQLite (WAL) и потоки-исполнители.
+
+    Задание выполняет обработчик его типа (handlers[kind]): он получает
+    JobContext и возвращает сводку (словарь) или None. Задания, прерванные
+    остановкой сервера, при следующем запуске возвращаются в очередь.
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, Callable[[JobContext], Optional[Dict[str, Any]]]],
+        path: str = DEFAULT_JOBS_PATH,
+        directory: str = DEFAULT_JOBS_DIRECTORY,
+        workers: int = DEFAULT_JOB_WORKERS,
+        poll_interval: float = DEFAULT_POLL_INTERVAL
+    ):
+        self.handlers = handlers
+        self.path = path
+        self.directory = directory
+        self.workers = workers
+        self.poll_interval = poll_interval
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        os.makedirs(directory, exist_ok=True)
+
+        # Одно соединение на очередь; доступ из потоков сериализуется _lock
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, payload TEXT NOT NULL, "
+            "progress_done INTEGER NOT NULL DEFAULT 0, progress_total INTEGER, "
+            "progress_failed INTEGER NOT NULL DEFAULT 0, summary TEXT, error TEXT, "
+            "created_at TEXT NOT NULL, started_at TEXT, finished_at TEXT, "
+            "cancel_requested INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS job_results ("
+            "job_id TEXT NOT NULL, item_index INTEGER NOT NULL, result TEXT NOT NULL, "
+            "PRIMARY KEY (job_id, item_index)) WITHOUT ROWID"
+        )
+        self._connection.commit()
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._cancel_requested: set = set()
+        self._closed = False
+        self._recover()
+
+        self._threads = [
+            threading.Thread(target=self._run, name=f"job-worker-{number}", daemon=True)
+            for number in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Ставит задание в очередь.
+
+        Args:
+            kind: Тип задания (ключ handlers)
+            payload: Параметры задания (JSON-сериализуемые)
+
+        Returns:
+            Состояние задания (см. get)
+
+        Raises:
+            ValueError: Если тип задания неизвестен
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind '{kind}', expected one of {sorted(self.handlers)}")
+
+        job_id = uuid.uuid4().hex
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO jobs (id, kind, status, payload, created_at) VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, kind, json.dumps(payload, ensure_ascii=False), _now())
+            )
+        with self._wakeup:
+            self._wakeup.notify()
+
+        logger.info(f"Job {job_id} ({kind}) queued")
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает состояние задания.
+
+        Returns:
+            Словарь: id, kind, status, progress (done, total, failed), summary,
+            error и время создания, запуска и завершения; None, если задания нет
+        """
+        with self._lock:
+            row = self._connection.execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job_from_row(row) if row else None
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Возвращает последние задания (новые первыми), при необходимости — только с данным статусом."""
+        query = f"SELECT {_JOB_COLUMNS} FROM jobs"
+        params: tuple = ()
+        if status is not None:
+            query += " WHERE status = ?"
+            params = (status,)
+        with self._lock:
+            rows = self._connection.execute(query + " ORDER BY rowid DESC LIMIT ?", params + (limit,)).fetchall()
+        return [_job_from_row(row) for row in rows]
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Отменяет задание.
+
+        Задание в очереди отменяется сразу, выполняющееся — при следующей
+        проверке отмены в обработчике; завершённое не меняется.
+
+        Returns:
+            Состояние задания; None, если задания нет
+        """
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            if row[0] == 'queued':
+                self._connection.execute(
+                    "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished_at = ? WHERE id = ?",
+                    (_now(), job_id)
+                )
+            elif row[0] == 'running':
+                self._connection.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+                self._cancel_requested.add(job_id)
+        logger.info(f"Job {job_id} cancellation requested ({row[0]})")
+        return self.get(job_id)
+
+    def iter_results(self, job_id: str) -> Iterator[Tuple[int, Any]]:
+        """
+        Читает сохранённые результаты элементов задания страницами.
+
+        Yields:
+            (номер элемента, результат) по возрастанию номера
+        """
+        start = 0
+        while True:
+            with self._lock:
+                rows = self._connection.execute(
+                    "SELECT item_index, result FROM job_results WHERE job_id = ? AND item_index >= ? "
+                    "ORDER BY item_index LIMIT ?",
+                    (job_id, start, RESULTS_PAGE_SIZE)
+                ).fetchall()
+            for index, result in rows:
+                yield index, json.loads(result)
+            if len(rows) < RESULTS_PAGE_SIZE:
+                return
+            start = rows[-1][0] + 1
+
+    def job_directory(self, job_id: str) -> str:
+        """Каталог файлов задания (входные данные и результаты обработчика)."""
+        return os.path.join(self.directory, job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает число заданий по статусам и число исполнителей."""
+        with self._lock:
+            counts = dict(self._connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {"workers": self.workers, **{status: counts.get(status, 0) for status in JOB_STATUSES}}
+
+    def close(self, timeout: Optional[float] = DEFAULT_JOIN_TIMEOUT) -> None:
+        """
+        Останавливает исполнителей и закрывает базу.
+
+        Выполняющиеся задания прерываются при следующей проверке отмены
+        и остаются в статусе running — при следующем запуске они вернутся в очередь.
+        """
+        with self._wakeup:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        with self._lock:
+            self._connection.close()
+
+    def _recover(self) -> None:
+        """Возвращает в очередь задания, прерванные остановкой сервера."""
+        with self._lock, self._connection:
+            cancelled = self._connection.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE status = 'running' AND cancel_requested = 1",
+                (_now(),)
+            ).rowcount
+            requeued = self._connection.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'").rowcount
+        if requeued or cancelled:
+            logger.info(f"Job queue recovered: {requeued} interrupted jobs requeued, {cancelled} cancelled")
+
+    def _run(self) -> None:
+        while not self._closed:
+            try:
+                job = self._claim()
+            except sqlite3.ProgrammingError:
+                return
+            if job is None:
+                with self._wakeup:
+                    if not self._closed:
+                        self._wakeup.wait(self.poll_interval)
+                continue
+            self._execute(*job)
+
+    def _claim(self) -> Optional[Tuple[str, str, str, int]]:
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT id, kind, payload, progress_done FROM jobs WHERE status = 'queued' ORDER BY rowid LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                self._connection.execute(
+                    "UPDATE jobs SET status = 'running', started_at = COALESCE(started_at, ?) WHERE id = ?",
+                    (_now(), row[0])
+                )
+        return row
+
+    def _execute(self, job_id: str, kind: str, payload: str, done: int) -> None:
+        logger.info(f"Job {job_id} ({kind}) started" + (f", resuming at item {done}" if done else ""))
+        context = JobContext(self, job_id, kind, json.loads(payload), done)
+        summary, error = None, None
+        try:
+            summary = self.handlers[kind](context)
+            status = 'succeeded'
+        except JobCancelled:
+            status = 'cancelled'
+        except _JobInterrupted:
+            logger.info(f"Job {job_id} interrupted by shutdown at item {context.done}")
+            return
+        except Exception as e:
+            logger.error(f"Job {job_id} ({kind}) failed: {e}", exc_info=True)
+            status, error = 'failed', f"{type(e).__name__}: {e}"
+
+        try:
+            self._update_job(
+                job_id,
+                status=status,
+                summary=json.dumps(summary, ensure_ascii=False, default=str) if summary is not None else None,
+                error=error,
+                finished_at=_now()
+            )
+        except sqlite3.ProgrammingError:
+            logger.warning(f"Job {job_id} finished after the queue was closed; status not saved")
+        self._cancel_requested.discard(job_id)
+        logger.info(f"Job {job_id} ({kind}) {status}")
+
+    def _store_results(self, job_id: str, start: int, results: List[Any], failed: int, total: Optional[int]) -> None:
+        rows = [
+            (job_id, start + offset, json.dumps(result, ensure_ascii=False, default=str))
+            for offset, result in enumerate(results)
+        ]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO job_results (job_id, item_index, result) VALUES (?, ?, ?)",
+                rows
+            )
+            self._connection.execute(
+                "UPDATE jobs SET progress_done = ?, progress_failed = progress_failed + ?, "
+                "progress_total = COALESCE(?, progress_total) WHERE id = ?",
+                (start + len(results), failed, total, job_id)
+            )
+
+    def _update_job(self, job_id: str, **columns: Any) -> None:
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        with self._lock, self._connection:
+            self._connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*columns.values(), job_id))
+
+def _now() -> str:
+    return datetime.now().isoformat()
+
+def _job_from_row(row: tuple) -> Dict[str, Any]:
+    (job_id, kind, status, done, total, failed, summary, error,
+     created_at, started_at, finished_at, cancel_requested) = row
+    return {
+        "id": job_id,
+        "kind": kind,
+        "status": status,
+        "progress": {"done": done, "total": total, "failed": failed},
+        "summary": json.loads(summary) if summary else None,
+        "error": error,
+        "created_at": created_at,
+        "started_at": started_at,
+        "finished_at": finished_at,
+        "cancel_requested": bool(cancel_requested)
+    }
+
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+def configure_job_queue(
+    config: Dict[str, Any],
+    handlers: Dict[str, Callable[[JobContext], Optional[Dict[str, Any]]]]
+) -> JobQueue:
+    """
+    Создаёт общую очередь заданий по разделу jobs конфигурации и запускает исполнителей.
+
+    Args:
+        config: Конфигурация монетизации
+        handlers: Обработчики по типам заданий
+
+    Returns:
+        Общая очередь заданий
+    """
+    global _job_queue
+    jobs_config = config.get('jobs', {})
+
+    # Предыдущая очередь закрывается до открытия новой: обе работают с одной базой
+    close_job_queue()
+    queue = JobQueue(
+        handlers,
+        path=jobs_config.get('path', DEFAULT_JOBS_PATH),
+        directory=jobs_config.get('directory', DEFAULT_JOBS_DIRECTORY),
+        workers=jobs_config.get('workers', DEFAULT_JOB_WORKERS),
+        poll_interval=jobs_config.get('poll_interval_seconds', DEFAULT_POLL_INTERVAL)
+    )
+    with _job_queue_lock:
+        _job_queue = queue
+
+    logger.info(f"Job queue configured: {queue.workers} workers, {queue.path}")
+    return queue
+
+def get_job_queue() -> Optional[JobQueue]:
+    """Возвращает общую очередь заданий (None, если она не настроена)."""
+    return _job_queue
+
+def close_job_queue() -> None:
+    """Останавливает общую очередь заданий."""
+    global _job_queue
+    with _job_queue_lock:
+        queue, _job_queue = _job_queue, None
+    if queue is not None:
+        queue.close()
+
+atexit.register(close_job_queue)
@@ -0,0 +1,194 @@
+# modules/keyword_matcher.py
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _fold(text: str) -> str:
+    """Приводит текст к нижнему регистру, сохраняя длину (посимвольно)."""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    # Редкий случай: lower() меняет длину (например, 'İ'), складываем посимвольно
+    return ''.join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+
+def _is_word(c: str) -> bool:
+    """Аналог класса \\w модуля re для str-шаблонов."""
+    return c.isalnum() or c == '_'
+
+
+def _is_boundary(text: str, pos: int) -> bool:
+    """Аналог \\b: граница между text[pos - 1] и text[pos]."""
+    before = pos > 0 and _is_word(text[pos - 1])
+    after = pos < len(text) and _is_word(text[pos])
+    return before != after
+
+
+class KeywordMatcher:
+    """
+    Многошаблонный поиск ключевых слов (автомат Ахо-Корасик).
+
+    Автомат строится один раз для словаря {keyword: affiliate_url} и заменяет
+    первое вхождение каждого ключевого слова за один проход по тексту.
+    Поиск регистронезависимый и учитывает границы слов так же, как
+    шаблон ``\\b{keyword}\\b``. При перекрытии совпадений побеждает более
+    раннее, а при вложенности — более длинное.
+
+    Если вхождения разных ключевых слов не пересекаются и не соприкасаются,
+    результат совпадает с последовательными заменами ``re.sub`` по словарю. Иначе поведение
+    отличается намеренно: последовательные замены вставляют ссылку внутрь
+    уже вставленной ("machine learning (url2) (url1)") и находят ключевые
+    слова в URL предыдущих ссылок, а автомат ищет только в исходном тексте.
+    """
+
+    def __init__(self, links: Dict[str, str]):
+        self._keywords: List[str] = []
+        self._replacements: List[str] = []
+        self._lengths: List[int] = []
+
+        # Бор: переходы, суффиксные ссылки, выходы узла и ссылки на ближайший узел с выходом
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[Tuple[int, ...]] = [()]
+        self._dict_link: List[int] = [0]
+
+        for keyword, affiliate_url in links.items():
+            if not keyword:
+                continue
+            index = len(self._keywords)
+            self._keywords.append(keyword)
+            self._replacements.append(f"{keyword} ({affiliate_url})")
+            self._lengths.append(len(keyword))
+            self._add(_fold(keyword), index)
+
+        self._build_links()
+
+    def __len__(self) -> int:
+        return len(self._keywords)
+
+    def _add(self, folded: str, index: int) -> None:
+        node = 0
+        for ch in folded:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append(())
+                self._dict_link.append(0)
+            node = nxt
+        self._outputs[node] = self._outputs[node] + (index,)
+
+    def _build_links(self) -> None:
+        goto, fail, outputs, dict_link = self._goto, self._fail, self._outputs, self._dict_link
+        queue = list(goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for ch, child in goto[node].items():
+                state = fail[node]
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(ch, 0) if node else 0
+                fail[child] = target if target != child else 0
+                dict_link[child] = fail[child] if outputs[fail[child]] else dict_link[fail[child]]
+                queue.append(child)
+
+    def find(self, text: str, used: Optional[Set[int]] = None) -> List[Tuple[int, int, int]]:
+        """
+        Находит первые вхождения ключевых слов за один проход.
+
+        Args:
+            text: Исходный текст
+            used: Индексы уже заменённых ключевых слов (пополняется найденными)
+
+        Returns:
+            Список непересекающихся совпадений (start, end, keyword_index) по возрастанию start
+        """
+        if used is None:
+            used = set()
+        total = len(self._keywords)
+        if not total or len(used) >= total:
+            return []
+
+        goto, fail, outputs, dict_link, lengths = (
+            self._goto, self._fail, self._outputs, self._dict_link, self._lengths
+        )
+        accepted: List[Tuple[int, int, int]] = []
+        node = 0
+
+        for i, ch in enumerate(_fold(text)):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            out = node if outputs[node] else dict_link[node]
+
+            while out:
+                # Внутри одного узла все ключевые слова одной длины
+                start = i + 1 - lengths[outputs[out][0]]
+                index = next((k for k in outputs[out] if k not in used), None)
+                if index is not None and _is_boundary(text, start) and _is_boundary(text, i + 1):
+                    # Принятые совпадения, начинающиеся не раньше start, лежат внутри нового
+                    inner = len(accepted)
+                    while inner and accepted[inner - 1][0] >= start:
+                        inner -= 1
+                    if not inner or accepted[inner - 1][1] <= start:
+                        # Более длинное совпадение поглощает вложенные
+                        for _, _, absorbed in accepted[inner:]:
+                            used.discard(absorbed)
+                        del accepted[inner:]
+                        accepted.append((start, i + 1, index))
+                        used.add(index)
+                        # Выходы по dict_link короче — дальше они только пересекаются
+                        break
+                    # Пересекается с более ранним совпадением: пробуем более короткие,
+                    # которые могут начинаться уже после него
+                out = dict_link[out]
+
+            if len(used) >= total:
+                break
+
+        return accepted
+
+    def replace(self, text: str, used: Optional[Set[int]] = None) -> str:
+        """
+        Заменяет первое вхождение каждого ключевого слова на "keyword (url)".
+
+        Args:
+            text: Исходный текст
+            used: Индексы уже заменённых ключевых слов (пополняется найденными)
+
+        Returns:
+            Текст с партнёрскими ссылками
+        """
+        matches = self.find(text, used)
+        if not matches:
+            return text
+
+        parts = []
+        position = 0
+        for start, end, index in matches:
+            parts.append(text[position:start])
+            parts.append(self._replacements[index])
+            position = end
+        parts.append(text[position:])
+
+        logger.debug("Replaced %d keywords with affiliate links", len(matches))
+        return ''.join(parts)
+
+
+@lru_cache(maxsize=8)
+def _build_keyword_matcher(items: Tuple[Tuple[str, str], ...]) -> KeywordMatcher:
+    matcher = KeywordMatcher(dict(items))
+    logger.info(f"Compiled keyword matcher for {len(matcher)} keywords")
+    return matcher
+
+
+def get_keyword_matcher(links: Dict[str, str]) -> KeywordMatcher:
+    """Возвращает скомпилированный автомат для словаря ссылок (кэшируется)."""
+    return _build_keyword_matcher(tuple(links.items()))
@@ -0,0 +1,355 @@
+# modules/metrics_store.py
+import json
+import logging
+import os
+import threading
+from typing import Dict, Any, Iterable, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # numpy — необязательная зависимость
+    np = None
+
+from modules.event_sink import EventStore, iter_stored_events, last_stored_event_id
+from modules.report_rollups import METRIC_FIELDS, REPORTED_EVENTS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEGMENT_ROWS = 65536
+
+# Колонки сегмента и их типы; строковые поля хранятся кодами словаря
+_COLUMNS = {
+    'timestamp': 'datetime64[s]',
+    'strategy': 'uint16',
+    'content_type': 'uint16',
+    'total_affiliate_links': 'int32',
+    'total_disclaimers': 'int32',
+    'total_cta': 'int32',
+    'content_length': 'int64',
+    'monetization_density': 'float64',
+}
+_DICTIONARY_COLUMNS = ('strategy', 'content_type')
+_DICTIONARY_FILE = 'dictionary.json'
+_SEGMENT_META_FILE = 'meta.json'
+_SEGMENT_PREFIX = 'seg-'
+
+GROUP_BY = ('strategy', 'content_type', 'day', 'hour')
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError("Metrics store requires numpy: pip install numpy")
+
+class MetricsStore(EventStore):
+    """
+    Колоночное хранилище метрик монетизации на локальном диске.
+
+    Метрики событий content_processed/content_monetized накапливаются в памяти
+    и записываются сегментами: каталог seg-NNNNNNNN с отдельным .npy-файлом
+    на каждую колонку. Сегмент сначала пишется во временный каталог и затем
+    переименовывается, поэтому читатели видят только целые сегменты.
+    При запросах колонки открываются через mmap, а фильтры, группировка и
+    процентили считаются векторно.
+
+    Подключается как дополнительное хранилище приёмника событий (см.
+    configure_event_sink), поэтому запись идёт в фоновом потоке и не задерживает
+    запросы. Сегмент хранит id последнего вошедшего в него события журнала:
+    строки, не дошедшие до сегмента (например, при аварийной остановке),
+    восстанавливаются из журнала при запуске (catch_up).
+    """
+
+    def __init__(self, directory: str, segment_rows: int = DEFAULT_SEGMENT_ROWS):
+        _require_numpy()
+        self.directory = directory
+        self.segment_rows = segment_rows
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._pending: Dict[str, list] = {name: [] for name in _COLUMNS}
+        self._dictionary: Dict[str, List[str]] = {name: [] for name in _DICTIONARY_COLUMNS}
+        self._codes: Dict[str, Dict[str, int]] = {name: {} for name in _DICTIONARY_COLUMNS}
+        self._segments: List[str] = []
+        # id последнего события журнала в строках хранилища; None — сегменты
+        # записаны без id (старый формат), догонять журнал не с чего
+        self._last_event_id: Optional[int] = 0
+
+        dictionary_path = os.path.join(directory, _DICTIONARY_FILE)
+        if os.path.exists(dictionary_path):
+            with open(dictionary_path, 'r', encoding='utf-8') as f:
+                self._dictionary.update(json.load(f))
+            for name, values in self._dictionary.items():
+                self._codes[name] = {value: code for code, value in enumerate(values)}
+
+        self._segments = sorted(
+            entry for entry in os.listdir(directory)
+            if entry.startswith(_SEGMENT_PREFIX) and not entry.endswith('.tmp')
+        )
+        if self._segments:
+            meta_path = os.path.join(directory, self._segments[-1], _SEGMENT_META_FILE)
+            if os.path.exists(meta_path):
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    self._last_event_id = json.load(f).get('last_event_id')
+            else:
+                self._last_event_id = None
+
+    @property
+    def last_event_id(self) -> Optional[int]:
+        """id последнего события журнала, вошедшего в хранилище (None — неизвестен)."""
+        with self._lock:
+            return self._last_event_id
+
+    def catch_up(self, events_path: str) -> int:
+        """
+        Дописывает из журнала события, не попавшие в записанные сегменты.
+
+        Args:
+            events_path: Путь к базе событий (основное хранилище приёмника)
+
+        Returns:
+            Количество прочитанных из журнала событий
+        """
+        stored = last_stored_event_id(events_path)
+        with self._lock:
+            after_id = self._last_event_id
+            if after_id is None or after_id > stored:
+                # Сегменты без id или от другого журнала: повторное чтение дало бы двойной счёт
+                logger.warning(
+                    f"Metrics store {self.directory} does not match events log {events_path}: "
+                    f"continuing from event {stored} without replay"
+                )
+                self._last_event_id = stored
+                return 0
+
+        replayed = 0
+        batch: List[Dict[str, Any]] = []
+        for event in iter_stored_events(events_path, after_id=after_id):
+            batch.append(event)
+            if len(batch) >= self.segment_rows:
+                self.write_copy(batch, batch[-1]['id'])
+                replayed += len(batch)
+                batch = []
+        if batch:
+            self.write_copy(batch, batch[-1]['id'])
+            replayed += len(batch)
+        if replayed:
+            logger.info(f"Metrics store caught up: {replayed} events after id {after_id}")
+        return replayed
+
+    def write_copy(self, events: List[Dict[str, Any]], last_id: Optional[int]) -> None:
+        """Добавляет метрики пачки, сохранённой в журнале с id до last_id."""
+        self._append(events, last_id)
+
+    def write_batch(self, events: List[Dict[str, Any]]) -> None:
+        """Добавляет метрики событий; полный сегмент сразу записывается на диск."""
+        self._append(events, None)
+
+    def _append(self, events: List[Dict[str, Any]], last_id: Optional[int]) -> None:
+        with self._lock:
+            if last_id is not None:
+                self._last_event_id = last_id
+            pending = self._pending
+            for event in events:
+                if event.get('event_type') not in REPORTED_EVENTS:
+                    continue
+                metadata = event.get('metadata') or {}
+                metrics = metadata.get('metrics') or {}
+
+                pending['timestamp'].append(event['timestamp'][:19])
+                pending['strategy'].append(self._code('strategy', metadata.get('strategy') or 'unknown'))
+                pending['content_type'].append(self._code('content_type', metadata.get('content_type') or 'unknown'))
+                for field in METRIC_FIELDS:
+                    pending[field].append(metrics.get(field, 0))
+
+            if len(pending['timestamp']) >= self.segment_rows:
+                self._write_segment()
+
+    def flush(self) -> None:
+        """Записывает накопленные строки отдельным сегментом."""
+        with self._lock:
+            if self._pending['timestamp']:
+                self._write_segment()
+
+    def close(self) -> None:
+        self.flush()
+
+    def row_count(self) -> int:
+        """Количество строк на диске и в памяти."""
+        with self._lock:
+            pending = len(self._pending['timestamp'])
+            segments = list(self._segments)
+        return pending + sum(len(self._load_column(segment, 'timestamp')) for segment in segments)
+
+    def query(
+        self,
+        metric: str = 'monetization_density',
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        strategy: Optional[str] = None,
+        content_type: Optional[str] = None,
+        group_by: Optional[str] = None,
+        percentiles: Sequence[float] = (50, 90, 99)
+    ) -> Dict[str, Any]:
+        """
+        Агрегирует метрику с фильтрами и группировкой.
+
+        Args:
+            metric: Метрика (одно из полей calculate_monetization_metrics)
+            start: Начало периода (ISO-время, включительно)
+            end: Конец периода (ISO-время, не включительно)
+            strategy: Только эта стратегия
+            content_type: Только этот тип контента
+            group_by: None, 'strategy', 'content_type', 'day' или 'hour'
+            percentiles: Процентили распределения метрики
+
+        Returns:
+            Словарь: metric, rows_scanned, rows_matched, groups
+            (для каждой группы: key, count, sum, mean, min, max, pNN)
+
+        Raises:
+            ValueError: Если метрика или группировка не поддерживается
+        """
+        if metric not in METRIC_FIELDS:
+            raise ValueError(f"Unknown metric '{metric}', expected one of {list(METRIC_FIELDS)}")
+        if group_by is not None and group_by not in GROUP_BY:
+            raise ValueError(f"Unknown group_by '{group_by}', expected one of {list(GROUP_BY)}")
+
+        with self._lock:
+            segments = list(self._segments)
+            pending = {name: list(values) for name, values in self._pending.items()}
+            dictionary = {name: list(values) for name, values in self._dictionary.items()}
+            codes = {name: dict(values) for name, values in self._codes.items()}
+
+        filters = {'strategy': strategy, 'content_type': content_type}
+        filter_codes = {}
+        for name, value in filters.items():
+            if value is not None:
+                if value not in codes[name]:
+                    return self._result(metric, 0, np.zeros(0), None, group_by, dictionary, percentiles)
+                filter_codes[name] = codes[name][value]
+        low = np.datetime64(start, 's') if start else None
+        high = np.datetime64(end, 's') if end else None
+
+        needed = {'timestamp', metric, *filter_codes}
+        if group_by in _DICTIONARY_COLUMNS:
+            needed.add(group_by)
+
+        values_parts, keys_parts = [], []
+        scanned = 0
+        sources = [(segment, None) for segment in segments]
+        if pending['timestamp']:
+            sources.append((None, self._pending_arrays(pending, needed)))
+
+        for segment, arrays in sources:
+            column = (lambda name: arrays[name]) if arrays is not None else (lambda name: self._load_column(segment, name))
+            timestamps = column('timestamp')
+            scanned += len(timestamps)
+
+            mask = np.ones(len(timestamps), dtype=bool)
+            if low is not None:
+                mask &= timestamps >= low
+            if high is not None:
+                mask &= timestamps < high
+            for name, code in filter_codes.items():
+                mask &= column(name) == code
+
+            values_parts.append(np.asarray(column(metric)[mask], dtype=np.float64))
+            if group_by in _DICTIONARY_COLUMNS:
+                keys_parts.append(np.asarray(column(group_by)[mask], dtype=np.int64))
+            elif group_by is not None:
+                unit = 'D' if group_by == 'day' else 'h'
+                keys_parts.append(timestamps[mask].astype(f'datetime64[{unit}]'))
+
+        values = np.concatenate(values_parts) if values_parts else np.zeros(0)
+        keys = np.concatenate(keys_parts) if keys_parts else None
+        return self._result(metric, scanned, values, keys, group_by, dictionary, percentiles)
+
+    def _result(self, metric, scanned, values, keys, group_by, dictionary, percentiles) -> Dict[str, Any]:
+        groups = []
+        if keys is None or not len(values):
+            if len(values) or group_by is None:
+                groups.append(_describe_values(None, values, percentiles))
+        else:
+            # Устойчивая сортировка по ключу: группы становятся непрерывными отрезками
+            order = np.argsort(keys, kind='stable')
+            keys, values = keys[order], values[order]
+            boundaries = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+            for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, len(keys)]):
+                key = keys[start]
+                label = dictionary[group_by][int(key)] if group_by in _DICTIONARY_COLUMNS else str(key)
+                groups.append(_describe_values(label, values[start:end], percentiles))
+
+        return {
+            "metric": metric,
+            "group_by": group_by,
+            "rows_scanned": scanned,
+            "rows_matched": int(len(values)),
+            "groups": groups
+        }
+
+    def _pending_arrays(self, pending: Dict[str, list], needed: Iterable[str]) -> Dict[str, "np.ndarray"]:
+        return {name: np.array(pending[name], dtype=_COLUMNS[name]) for name in needed}
+
+    def _load_column(self, segment: str, name: str) -> "np.ndarray":
+        return np.load(os.path.join(self.directory, segment, f"{name}.npy"), mmap_mode='r')
+
+    def _code(self, column: str, value: str) -> int:
+        code = self._codes[column].get(value)
+        if code is None:
+            code = self._codes[column][value] = len(self._dictionary[column])
+            self._dictionary[column].append(value)
+        return code
+
+    def _write_segment(self) -> None:
+        """Записывает накопленные строки сегментом (вызывается под блокировкой)."""
+        # Словарь пишется раньше сегмента: коды только добавляются, старые не меняются
+        dictionary_path = os.path.join(self.directory, _DICTIONARY_FILE)
+        with open(dictionary_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self._dictionary, f, ensure_ascii=False)
+        os.replace(dictionary_path + '.tmp', dictionary_path)
+
+        last = int(self._segments[-1][len(_SEGMENT_PREFIX):]) if self._segments else -1
+        name = f"{_SEGMENT_PREFIX}{last + 1:08d}"
+        temporary = os.path.join(self.directory, name + '.tmp')
+        os.makedirs(temporary, exist_ok=True)
+        for column, dtype in _COLUMNS.items():
+            np.save(os.path.join(temporary, f"{column}.npy"), np.array(self._pending[column], dtype=dtype))
+        # id пишется внутри сегмента: он появляется на диске вместе со строками
+        with open(os.path.join(temporary, _SEGMENT_META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({"last_event_id": self._last_event_id}, f)
+        os.rename(temporary, os.path.join(self.directory, name))
+
+        rows = len(self._pending['timestamp'])
+        self._segments.append(name)
+        self._pending = {column: [] for column in _COLUMNS}
+        logger.info(f"Metrics segment {name} written: {rows} rows")
+
+def _describe_values(key: Optional[str], values: "np.ndarray", percentiles: Sequence[float]) -> Dict[str, Any]:
+    """Статистика по значениям группы (процентили — через частичную сортировку)."""
+    count = int(len(values))
+    description: Dict[str, Any] = {"key": key, "count": count}
+    if not count:
+        description.update({"sum": 0.0, "mean": None, "min": None, "max": None})
+        description.update({f"p{p:g}": None for p in percentiles})
+        return description
+
+    total = float(values.sum())
+    description.update({
+        "sum": total,
+        "mean": total / count,
+        "min": float(values.min()),
+        "max": float(values.max()),
+    })
+    for p, value in zip(percentiles, np.percentile(values, list(percentiles))):
+        description[f"p{p:g}"] = float(value)
+    return description
+
+_metrics_store: Optional[MetricsStore] = None
+
+def open_metrics_store(directory: str, segment_rows: Optional[int] = None) -> MetricsStore:
+    """Открывает общее колоночное хранилище метрик (для записи из приёмника событий и запросов API)."""
+    global _metrics_store
+    _metrics_store = MetricsStore(directory, segment_rows or DEFAULT_SEGMENT_ROWS)
+    return _metrics_store
+
+def get_metrics_store() -> Optional[MetricsStore]:
+    """Возвращает общее хранилище метрик или None, если оно не включено в конфигурации."""
+    return _metrics_store
@@ -0,0 +1,106 @@
+# modules/plan_cache.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from modules.strategy_planner import determine_actions_for_strategy
+from modules.content_injector import InjectionPlan, compile_injection_plan
+from utils.config_loader import compute_config_version
+from utils.config_snapshot import freeze_config
+from utils.metrics import observe_stage, stage_id
+
+logger = logging.getLogger(__name__)
+
+PLAN_CACHE_SIZE = 128
+
+_plans: "OrderedDict[Tuple[str, Tuple[str, ...], str], InjectionPlan]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+_STAGE_PLAN_HIT = stage_id('plan', 'hit')
+_STAGE_PLAN_MISS = stage_id('plan', 'miss')
+_STAGE_DETERMINE_ACTIONS = stage_id('plan.determine_actions')
+_STAGE_COMPILE = stage_id('plan.compile')
+
+def build_injection_plan(strategy: str, methods: List[str], config: Dict[str, Any]) -> InjectionPlan:
+    """
+    Строит план внедрения для стратегии и набора методов.
+
+    Args:
+        strategy: Стратегия монетизации ('full', 'partial', 'masked', 'hidden')
+        methods: Список методов монетизации
+        config: Конфигурация монетизации
+
+    Returns:
+        Неизменяемый план внедрения
+    """
+    # Стратегия и методы накладываются слоем поверх снимка конфигурации, не изменяя её
+    effective_config = freeze_config(config).overlay({
+        'monetization': {'strategy': strategy, 'methods': list(methods)}
+    })
+
+    started = time.perf_counter()
+    actions = determine_actions_for_strategy(strategy, effective_config)
+    observe_stage(_STAGE_DETERMINE_ACTIONS, started)
+    started = time.perf_counter()
+    plan = compile_injection_plan(actions, effective_config)
+    observe_stage(_STAGE_COMPILE, started)
+    return plan
+
+def get_injection_plan(
+    strategy: str,
+    methods: List[str],
+    config: Dict[str, Any],
+    config_version: Optional[str] = None
+) -> InjectionPlan:
+    """
+    Возвращает план внедрения из LRU-кэша, компилируя его при промахе.
+
+    Args:
+        strategy: Стратегия монетизации
+        methods: Список методов монетизации
+        config: Конфигурация монетизации
+        config_version: Версия конфигурации (вычисляется, если не передана)
+
+    Returns:
+        Неизменяемый план внедрения
+    """
+    started = time.perf_counter()
+    if config_version is None:
+        config_version = compute_config_version(config)
+    key = (strategy, tuple(methods), config_version)
+
+    with _lock:
+        plan = _plans.get(key)
+        if plan is not None:
+            _plans.move_to_end(key)
+            _stats["hits"] += 1
+            observe_stage(_STAGE_PLAN_HIT, started)
+            return plan
+        _stats["misses"] += 1
+
+    plan = build_injection_plan(strategy, methods, config)
+    logger.info(f"Compiled injection plan for strategy={strategy}, actions={list(plan.actions)}")
+
+    with _lock:
+        _plans[key] = plan
+        _plans.move_to_end(key)
+        while len(_plans) > PLAN_CACHE_SIZE:
+            _plans.popitem(last=False)
+
+    observe_stage(_STAGE_PLAN_MISS, started)
+    return plan
+
+def clear_injection_plan_cache() -> None:
+    """Очищает кэш планов внедрения (например, после перезагрузки конфигурации)."""
+    with _lock:
+        _plans.clear()
+        _stats["hits"] = 0
+        _stats["misses"] = 0
+
+def injection_plan_cache_info() -> Dict[str, int]:
+    """Возвращает статистику кэша планов внедрения."""
+    with _lock:
+        return {"size": len(_plans), "maxsize": PLAN_CACHE_SIZE, **_stats}
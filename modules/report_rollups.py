@@ -0,0 +1,496 @@
+# modules/report_rollups.py
+import atexit
+import json
+import logging
+import operator
+import os
+import threading
+from array import array
+from collections import defaultdict
+from itertools import chain, compress, zip_longest
+from typing import Dict, Any, Iterable, List, Optional
+
+from modules.event_sink import BufferedEventSink, iter_stored_events, last_stored_event_id
+
+try:
+    import numpy as np
+except ImportError:  # numpy — необязательная зависимость, без него суммирование идёт в Python
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# События, из которых строятся отчёты
+REPORTED_EVENTS = ('content_processed', 'content_monetized')
+
+METRIC_FIELDS = (
+    'total_affiliate_links',
+    'total_disclaimers',
+    'total_cta',
+    'content_length',
+    'monetization_density'
+)
+
+# Длина ключа интервала в ISO-времени: 'YYYY-MM-DDTHH' и 'YYYY-MM-DD'
+GRANULARITIES = {'hour': 13, 'day': 10}
+
+DEFAULT_ROLLUPS_PATH = 'ssv_rollups.json'
+DEFAULT_CHECKPOINT_INTERVAL = 60.0
+# Версия формата снимка: снимок другой версии не читается, агрегаты строятся из журнала
+SNAPSHOT_VERSION = 1
+
+_ACTION_PREFIX = 'action:'
+_WARNING_PREFIX = 'warning:'
+
+class MonetizationRollups:
+    """
+    Инкрементально поддерживаемые агрегаты событий монетизации.
+
+    Каждое событие за O(1) добавляется в три агрегата: по контенту и стратегии,
+    по часу и стратегии, по дню и стратегии. Набор счётчиков общий (число
+    событий, метрики, действия, предупреждения по платформам); новые действия
+    и платформы добавляют колонки на лету.
+
+    Агрегаты по контенту хранятся по колонкам (array('d'), строка на пару
+    контент/стратегия), поэтому отчёт по множеству контента — это выборка
+    строк и суммирование колонок (векторно, если установлен numpy)
+    без повторного чтения сырых событий.
+
+    Агрегаты периодически сохраняются в снимок (файл JSON) вместе с id
+    последнего учтённого сохранённого события; при запуске снимок
+    восстанавливается, и из журнала дочитываются только более новые события.
+    """
+
+    def __init__(self, path: Optional[str] = None, checkpoint_interval: float = DEFAULT_CHECKPOINT_INTERVAL):
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self._lock = threading.Lock()
+        self._names: List[str] = ['events', *METRIC_FIELDS]
+        self._columns: Dict[str, int] = {name: index for index, name in enumerate(self._names)}
+        self._strategies: List[str] = []
+        self._strategy_codes: Dict[str, int] = {}
+
+        # Агрегаты по контенту: колонки счётчиков, стратегия строки и строки контента
+        self._data: List[array] = [array('d') for _ in self._names]
+        self._row_strategy = array('q')
+        self._row_index: Dict[tuple, int] = {}
+        self._content_rows: Dict[str, List[int]] = {}
+
+        # Агрегаты по интервалам времени: {(интервал, стратегия): строка счётчиков}
+        self._buckets: Dict[str, Dict[tuple, list]] = {granularity: {} for granularity in GRANULARITIES}
+
+        # id последнего учтённого сохранённого события (метка для дочитывания журнала)
+        self.last_event_id = 0
+        self._dirty = False
+
+        if path:
+            self._restore()
+
+        self._stop = threading.Event()
+        self._thread = None
+        if path and checkpoint_interval > 0:
+            self._thread = threading.Thread(target=self._run, name="rollups-checkpoint", daemon=True)
+            self._thread.start()
+
+    def record(self, event: Dict[str, Any]) -> None:
+        """Учитывает событие в агрегатах (события других типов пропускаются)."""
+        with self._lock:
+            self._record(event)
+
+    def record_batch(self, events: List[Dict[str, Any]], last_id: Optional[int] = None) -> None:
+        """
+        Учитывает пачку сохранённых событий (слушатель приёмника событий).
+
+        Пачка учитывается под одной блокировкой вместе с меткой last_id,
+        поэтому снимок не может содержать половину пачки.
+
+        Args:
+            events: События в порядке записи
+            last_id: id последнего события пачки в хранилище
+        """
+        with self._lock:
+            for event in events:
+                self._record(event)
+            if last_id is not None and last_id > self.last_event_id:
+                self.last_event_id = last_id
+                self._dirty = True
+
+    def load(self, events: Iterable[Dict[str, Any]]) -> int:
+        """
+        Дочитывает сохранённые события (при запуске, после восстановления снимка).
+
+        Args:
+            events: События из iter_stored_events (поле id продвигает метку last_event_id)
+
+        Returns:
+            Количество учтённых событий
+        """
+        count = 0
+        for event in events:
+            with self._lock:
+                if self._record(event):
+                    count += 1
+                if event.get('id', 0) > self.last_event_id:
+                    self.last_event_id = event['id']
+                    self._dirty = True
+        logger.info(f"Rollups caught up on {count} stored events (last event id {self.last_event_id})")
+        return count
+
+    def summarize_contents(self, content_ids: Iterable[str], strategy: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Сводка по списку контента с разбивкой по стратегиям.
+
+        Args:
+            content_ids: Идентификаторы контента
+            strategy: Только события этой стратегии
+
+        Returns:
+            Сводка: content_count, missing_content_ids, totals, by_strategy
+        """
+        content_ids = list(content_ids)
+
+        with self._lock:
+            found = list(map(self._content_rows.get, content_ids))
+            rows = list(chain.from_iterable(filter(None, found)))
+            if strategy is not None:
+                code = self._strategy_codes.get(strategy)
+                rows = [row for row in rows if self._row_strategy[row] == code]
+
+            names = list(self._names)
+            sums = self._sum_content_rows(rows)
+            strategies = list(self._strategies)
+
+        missing = list(compress(content_ids, map(operator.not_, found)))
+        by_strategy = {
+            strategies[code]: self._describe(counters, names)
+            for code, counters in sums.items()
+        }
+        return {
+            "content_count": len(content_ids) - len(missing),
+            "missing_content_ids": missing,
+            "totals": self._describe(_sum_rows(sums.values()), names),
+            "by_strategy": by_strategy
+        }
+
+    def summarize_period(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        granularity: str = 'day',
+        strategy: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Сводка по интервалам времени.
+
+        Args:
+            start: Начало периода (ISO-время, включительно, с точностью до интервала)
+            end: Конец периода (ISO-время, включительно, с точностью до интервала)
+            granularity: 'hour' или 'day'
+            strategy: Только события этой стратегии
+
+        Returns:
+            Сводка: totals, by_strategy, timeline (по интервалам и стратегиям)
+
+        Raises:
+            ValueError: Если granularity не поддерживается
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity '{granularity}', expected one of {list(GRANULARITIES)}")
+        length = GRANULARITIES[granularity]
+        low = start[:length] if start else None
+        high = end[:length] if end else None
+
+        with self._lock:
+            names = list(self._names)
+            selected = sorted(
+                (bucket, row_strategy, list(counters))
+                for (bucket, row_strategy), counters in self._buckets[granularity].items()
+                if (low is None or bucket >= low) and (high is None or bucket <= high)
+                and (strategy is None or row_strategy == strategy)
+            )
+
+        groups: Dict[str, List[list]] = defaultdict(list)
+        for _, row_strategy, counters in selected:
+            groups[row_strategy].append(counters)
+        by_strategy = {name: _sum_rows(rows) for name, rows in groups.items()}
+
+        return {
+            "granularity": granularity,
+            "start": start,
+            "end": end,
+            "totals": self._describe(_sum_rows(by_strategy.values()), names),
+            "by_strategy": {name: self._describe(counters, names) for name, counters in by_strategy.items()},
+            "timeline": [
+                {"bucket": bucket, "strategy": row_strategy, **self._describe(counters, names)}
+                for bucket, row_strategy, counters in selected
+            ]
+        }
+
+    def clear(self) -> None:
+        """Сбрасывает все агрегаты и метку last_event_id."""
+        with self._lock:
+            self._data = [array('d') for _ in self._names]
+            self._row_strategy = array('q')
+            self._row_index.clear()
+            self._content_rows.clear()
+            for buckets in self._buckets.values():
+                buckets.clear()
+            self.last_event_id = 0
+            self._dirty = True
+
+    def checkpoint(self) -> bool:
+        """
+        Сохраняет снимок агрегатов с меткой last_event_id (запись атомарная).
+
+        Returns:
+            True, если снимок записан (были изменения после прошлого снимка)
+        """
+        if not self.path:
+            return False
+
+        # Сериализация под блокировкой, запись файла — без неё
+        with self._lock:
+            if not self._dirty:
+                return False
+            snapshot = {
+                "version": SNAPSHOT_VERSION,
+                "last_event_id": self.last_event_id,
+                "names": list(self._names),
+                "strategies": list(self._strategies),
+                # Порядок ключей _row_index совпадает с порядком строк
+                "rows": [content_id for content_id, _ in self._row_index],
+                "row_strategy": self._row_strategy.tolist(),
+                "columns": [column.tolist() for column in self._data],
+                "buckets": {
+                    granularity: [[bucket, strategy, list(counters)] for (bucket, strategy), counters in buckets.items()]
+                    for granularity, buckets in self._buckets.items()
+                }
+            }
+            self._dirty = False
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(self.path + '.tmp', self.path)
+        logger.info(f"Rollups checkpoint: {len(snapshot['rows'])} rows up to event id {snapshot['last_event_id']}")
+        return True
+
+    def close(self) -> None:
+        """Останавливает фоновое сохранение и сохраняет снимок."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.checkpoint()
+
+    def _restore(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") != SNAPSHOT_VERSION:
+            logger.warning(f"Skipping rollups snapshot {self.path}: unsupported version {data.get('version')}")
+            return
+
+        self._names = data["names"]
+        self._columns = {name: index for index, name in enumerate(self._names)}
+        self._strategies = data["strategies"]
+        self._strategy_codes = {name: code for code, name in enumerate(self._strategies)}
+        self._data = [array('d', column) for column in data["columns"]]
+        self._row_strategy = array('q', data["row_strategy"])
+        for row, key in enumerate(zip(data["rows"], self._row_strategy)):
+            self._row_index[key] = row
+            self._content_rows.setdefault(key[0], []).append(row)
+        for granularity, rows in data["buckets"].items():
+            if granularity in self._buckets:
+                self._buckets[granularity] = {(bucket, strategy): counters for bucket, strategy, counters in rows}
+        self.last_event_id = data["last_event_id"]
+        logger.info(f"Rollups restored from {self.path}: {len(self._row_strategy)} rows up to event id {self.last_event_id}")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.checkpoint_interval):
+            try:
+                self.checkpoint()
+            except Exception as e:
+                logger.error(f"Rollups checkpoint failed: {e}", exc_info=True)
+
+    def _record(self, event: Dict[str, Any]) -> bool:
+        """Учитывает событие (под блокировкой); False для событий других типов."""
+        if event.get('event_type') not in REPORTED_EVENTS:
+            return False
+
+        metadata = event.get('metadata') or {}
+        strategy = metadata.get('strategy') or 'unknown'
+        content_id = event['content_id']
+        timestamp = event['timestamp']
+
+        delta = self._delta(metadata)
+        code = self._strategy_code(strategy)
+
+        row = self._row_index.get((content_id, code))
+        if row is None:
+            row = self._row_index[(content_id, code)] = len(self._row_strategy)
+            self._row_strategy.append(code)
+            for column in self._data:
+                column.append(0.0)
+            self._content_rows.setdefault(content_id, []).append(row)
+
+        data = self._data
+        for column, value in delta:
+            data[column][row] += value
+
+        width = len(self._names)
+        for granularity, length in GRANULARITIES.items():
+            counters = self._buckets[granularity].get((timestamp[:length], strategy))
+            if counters is None:
+                counters = self._buckets[granularity][(timestamp[:length], strategy)] = [0] * width
+            elif len(counters) < width:
+                counters.extend([0] * (width - len(counters)))
+            for column, value in delta:
+                counters[column] += value
+
+        self._dirty = True
+        return True
+
+    def _sum_content_rows(self, rows: List[int]) -> Dict[int, list]:
+        """Суммы колонок по выбранным строкам с группировкой по стратегии (под блокировкой)."""
+        if not rows:
+            return {}
+
+        if np is not None:
+            index = np.fromiter(rows, dtype=np.int64, count=len(rows))
+            codes = np.frombuffer(self._row_strategy, dtype=np.int64)[index]
+            present = np.unique(codes)
+            columns = [
+                np.bincount(codes, weights=np.frombuffer(column, dtype=np.float64)[index], minlength=len(self._strategies))
+                for column in self._data
+            ]
+            # Представления frombuffer временные: пока они живы, array нельзя расширять,
+            # поэтому всё вычисление идёт под блокировкой
+            return {int(code): [float(column[code]) for column in columns] for code in present}
+
+        groups: Dict[int, List[int]] = defaultdict(list)
+        for row in rows:
+            groups[self._row_strategy[row]].append(row)
+        return {
+            code: [sum(map(column.__getitem__, group)) for column in self._data]
+            for code, group in groups.items()
+        }
+
+    def _strategy_code(self, strategy: str) -> int:
+        code = self._strategy_codes.get(strategy)
+        if code is None:
+            code = self._strategy_codes[strategy] = len(self._strategies)
+            self._strategies.append(strategy)
+        return code
+
+    def _delta(self, metadata: Dict[str, Any]) -> List[tuple]:
+        delta = [(0, 1)]
+        metrics = metadata.get('metrics') or {}
+        for index, field in enumerate(METRIC_FIELDS, start=1):
+            value = metrics.get(field)
+            if value:
+                delta.append((index, value))
+        for action in metadata.get('actions') or ():
+            delta.append((self._column(_ACTION_PREFIX + action), 1))
+        for platform, issues in (metadata.get('compliance_warnings') or {}).items():
+            if issues:
+                delta.append((self._column(_WARNING_PREFIX + platform), len(issues)))
+        return delta
+
+    def _column(self, name: str) -> int:
+        column = self._columns.get(name)
+        if column is None:
+            column = self._columns[name] = len(self._names)
+            self._names.append(name)
+            self._data.append(array('d', bytes(8 * len(self._row_strategy))))
+        return column
+
+    @staticmethod
+    def _describe(counters: list, names: List[str]) -> Dict[str, Any]:
+        values = dict(zip_longest(names, counters[:len(names)], fillvalue=0))
+        events = int(values['events'])
+        return {
+            "events": events,
+            "metrics": {
+                field: float(values[field]) if field == 'monetization_density' else int(values[field])
+                for field in METRIC_FIELDS
+            },
+            "avg_monetization_density": float(values['monetization_density']) / events if events else 0.0,
+            "actions": {
+                name[len(_ACTION_PREFIX):]: int(value) for name, value in values.items()
+                if name.startswith(_ACTION_PREFIX) and value
+            },
+            "compliance_warnings": {
+                name[len(_WARNING_PREFIX):]: int(value) for name, value in values.items()
+                if name.startswith(_WARNING_PREFIX) and value
+            }
+        }
+
+def _sum_rows(rows: Iterable[list]) -> list:
+    """Покомпонентная сумма строк разной длины (новые колонки в старых строках — нули)."""
+    return [sum(column) for column in zip_longest(*rows, fillvalue=0)]
+
+_rollups: Optional[MonetizationRollups] = None
+_rollups_lock = threading.Lock()
+
+def configure_rollups(config: Dict[str, Any], sink: BufferedEventSink) -> MonetizationRollups:
+    """
+    Создаёт общие агрегаты отчётов и подписывает их на записанные события.
+
+    Агрегаты восстанавливаются из снимка analytics.rollups_path, из базы
+    событий дочитываются только события новее метки снимка. Вызывается при
+    запуске до приёма событий: иначе пачки, записанные между дочитыванием
+    и подпиской, не попадут в агрегаты.
+
+    Args:
+        config: Конфигурация монетизации
+        sink: Приёмник событий, в хранилище которого сохраняются события
+
+    Returns:
+        Общие агрегаты отчётов
+    """
+    global _rollups
+    analytics_config = config.get('analytics', {})
+    events_path = getattr(sink.store, 'path', None)
+    # Без базы событий снимок нечем дополнить: агрегаты живут только в памяти
+    rollups = MonetizationRollups(
+        path=analytics_config.get('rollups_path', DEFAULT_ROLLUPS_PATH) if events_path else None,
+        checkpoint_interval=analytics_config.get('rollups_checkpoint_seconds', DEFAULT_CHECKPOINT_INTERVAL)
+    )
+
+    if events_path:
+        stored = last_stored_event_id(events_path)
+        if rollups.last_event_id > stored:
+            logger.warning(
+                f"Rollups snapshot is ahead of the event log ({rollups.last_event_id} > {stored}): rebuilding from the log"
+            )
+            rollups.clear()
+        rollups.load(iter_stored_events(events_path, after_id=rollups.last_event_id))
+        rollups.checkpoint()
+    sink.add_listener(rollups.record_batch)
+
+    with _rollups_lock:
+        previous, _rollups = _rollups, rollups
+    if previous is not None:
+        previous.close()
+    return rollups
+
+def get_rollups() -> MonetizationRollups:
+    """Возвращает общие агрегаты событий монетизации (при первом обращении — только в памяти)."""
+    global _rollups
+    if _rollups is None:
+        with _rollups_lock:
+            if _rollups is None:
+                _rollups = MonetizationRollups()
+    return _rollups
+
+def close_rollups() -> None:
+    """Сохраняет снимок и закрывает общие агрегаты."""
+    global _rollups
+    with _rollups_lock:
+        rollups, _rollups = _rollups, None
+    if rollups is not None:
+        rollups.close()
+
+atexit.register(close_rollups)
@@ -0,0 +1,357 @@
+# modules/rule_engine.py
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+import yaml
+
+from modules.compliance_checker import PLATFORMS as BUILTIN_PLATFORMS, count_links
+from utils.result_cache import get_result_cache, text_digest
+from utils.metrics import observe_stage, stage_id
+
+logger = logging.getLogger(__name__)
+
+RULE_TYPES = ('phrase', 'sequence', 'max_length', 'max_count', 'max_links', 'max_ratio')
+_PHRASE_TYPES = ('phrase', 'sequence')
+# Значения, доступные в сообщении правила каждого типа (см. _evaluate_threshold)
+_MESSAGE_VALUES = {
+    'phrase': {},
+    'sequence': {},
+    'max_length': {"length": 0},
+    'max_count': {"count": 0},
+    'max_links': {"count": 0},
+    'max_ratio': {"ratio": 0.0},
+}
+
+def _build_trie_pattern(phrases: List[str]) -> Tuple[str, Dict[str, Tuple[int, ...]]]:
+    """
+    Строит регулярное выражение-бор для списка фраз.
+
+    В конце каждой фразы стоит пустая именованная группа. Совпадение проходит
+    по одному пути бора, поэтому последняя сработавшая группа (lastgroup)
+    однозначно задаёт все фразы, найденные в этой позиции, — включая фразы,
+    являющиеся префиксами более длинных.
+
+    Returns:
+        Шаблон и отображение {имя группы: индексы фраз на пути к ней}
+    """
+    trie: Dict[str, Any] = {}
+    for index, phrase in enumerate(phrases):
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[None] = index
+
+    groups: Dict[str, Tuple[int, ...]] = {}
+
+    def build(node: Dict[str, Any], path: Tuple[int, ...]) -> str:
+        terminal = node.get(None)
+        prefix = ""
+        if terminal is not None:
+            path = path + (terminal,)
+            name = f"p{terminal}"
+            groups[name] = path
+            prefix = f"(?P<{name}>)"
+
+        children = [re.escape(ch) + build(child, path) for ch, child in node.items() if ch is not None]
+        if not children:
+            return prefix
+        body = children[0] if len(children) == 1 else "(?:" + "|".join(children) + ")"
+        return prefix + (f"(?:{body})?" if terminal is not None else body)
+
+    return build(trie, ()), groups
+
+class _PlatformRules:
+    """Скомпилированные правила одной платформы: общий матчер фраз и пороговые правила."""
+
+    def __init__(self, platform: str, rules: List[Dict[str, Any]]):
+        self.platform = platform
+        # Номера этапа в метриках длительности (utils.metrics)
+        self.stage_hit = stage_id(f'rules.{platform}', 'hit')
+        self.stage_miss = stage_id(f'rules.{platform}', 'miss')
+        self.rules = rules
+        self.pattern: Optional[re.Pattern] = None
+        self.groups: Dict[str, Tuple[int, ...]] = {}
+        self.phrase_lengths: List[int] = []
+        # Для каждой фразы: список (номер правила, позиция фразы в последовательности)
+        self.subscribers: List[List[Tuple[int, int]]] = []
+        self.phrase_rules = [i for i, rule in enumerate(rules) if rule['type'] in _PHRASE_TYPES]
+        self.threshold_rules = [i for i, rule in enumerate(rules) if rule['type'] not in _PHRASE_TYPES]
+
+        phrase_index: Dict[str, int] = {}
+        for position, rule in enumerate(rules):
+            if rule['type'] not in _PHRASE_TYPES:
+                continue
+            phrases = rule['phrases'] if rule['type'] == 'phrase' else rule['sequence']
+            for seq_position, phrase in enumerate(phrases):
+                key = phrase.lower()
+                if key not in phrase_index:
+                    phrase_index[key] = len(self.phrase_lengths)
+                    self.phrase_lengths.append(len(phrase))
+                    self.subscribers.append([])
+                self.subscribers[phrase_index[key]].append(
+                    (position, seq_position if rule['type'] == 'sequence' else 0)
+                )
+
+        if phrase_index:
+            trie, self.groups = _build_trie_pattern(list(phrase_index))
+            first_chars = ''.join(sorted({phrase[0] for phrase in phrase_index}))
+            self.pattern = re.compile(
+                rf"(?=[{re.escape(first_chars)}\n])(?=(?:{trie}|(?P<newline>\n)))",
+                re.IGNORECASE
+            )
+
+class ComplianceRuleEngine:
+    """
+    Движок декларативных правил проверки соответствия.
+
+    Правила загружаются из YAML (compliance_rules.yaml) и компилируются один раз:
+    все фразовые правила платформы объединяются в один матчер и проверяются
+    за один проход по тексту. Для каждого правила накапливаются число
+    срабатываний, число обработанных вхождений и время вычисления.
+
+    Встроенные платформы (youtube, amazon_kdp, general) проверяет общий
+    сканер modules.compliance_checker; переопределять их в YAML нельзя,
+    чтобы у правил не было двух источников.
+    """
+
+    def __init__(self, rules_config: Dict[str, Any]):
+        platforms = (rules_config or {}).get('platforms')
+        if not isinstance(platforms, dict) or not platforms:
+            raise ValueError("Missing required key 'platforms' in compliance rules.")
+
+        builtin = [platform for platform in platforms if platform in BUILTIN_PLATFORMS]
+        if builtin:
+            raise ValueError(
+                f"Platforms {', '.join(builtin)} are built in (modules/compliance_checker.py) "
+                "and cannot be redefined in compliance rules."
+            )
+
+        self._platforms: Dict[str, _PlatformRules] = {}
+        for platform, rules in platforms.items():
+            self._platforms[platform] = _PlatformRules(platform, [_validate_rule(platform, rule) for rule in rules or []])
+
+        self.version = hashlib.sha256(
+            json.dumps(rules_config, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        ).hexdigest()[:16]
+
+        self._lock = threading.Lock()
+        self._rule_stats: Dict[Tuple[str, str], Dict[str, float]] = {
+            (platform, rule['id']): {"hits": 0, "evaluations": 0, "events": 0, "seconds": 0.0}
+            for platform, compiled in self._platforms.items() for rule in compiled.rules
+        }
+        self._matcher_stats: Dict[str, Dict[str, float]] = {
+            platform: {"scans": 0, "seconds": 0.0} for platform in self._platforms
+        }
+
+    @property
+    def platforms(self) -> Tuple[str, ...]:
+        """Платформы, для которых заданы правила."""
+        return tuple(self._platforms)
+
+    def check(self, platform: str, text: str) -> list[str]:
+        """
+        Проверяет текст по правилам платформы.
+
+        Args:
+            platform: Платформа (ключ в compliance_rules.yaml)
+            text: Текст для проверки
+
+        Returns:
+            Список проблем (сообщения без повторов, в порядке правил)
+
+        Raises:
+            KeyError: Если для платформы нет правил
+        """
+        started = time.perf_counter()
+        compiled = self._platforms[platform]
+        cache = get_result_cache()
+        key = ('rules', self.version, platform, text_digest(text))
+
+        issues = cache.get(key)
+        if issues is None:
+            issues = self._evaluate(compiled, text)
+            cache.put(key, issues)
+            observe_stage(compiled.stage_miss, started)
+        else:
+            observe_stage(compiled.stage_hit, started)
+        return list(issues)
+
+    def check_many(self, text: str, platforms: Iterable[str]) -> Dict[str, list[str]]:
+        """Проверяет текст по правилам нескольких платформ."""
+        return {platform: self.check(platform, text) for platform in platforms}
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает счётчики срабатываний и накопленное время по правилам и матчерам."""
+        with self._lock:
+            return {
+                "version": self.version,
+                "matchers": {platform: dict(values) for platform, values in self._matcher_stats.items()},
+                "rules": [
+                    {"platform": platform, "id": rule_id, **values}
+                    for (platform, rule_id), values in self._rule_stats.items()
+                ]
+            }
+
+    def _evaluate(self, compiled: _PlatformRules, text: str) -> list[str]:
+        rules = compiled.rules
+        hits = [False] * len(rules)
+        events = [0] * len(rules)
+        seconds = [0.0] * len(rules)
+        values: List[Dict[str, Any]] = [{} for _ in rules]
+
+        matcher_seconds = 0.0
+        if compiled.pattern is not None:
+            started = time.perf_counter()
+            self._scan_phrases(compiled, text, hits, events)
+            matcher_seconds = time.perf_counter() - started
+
+            # Время общего матчера делится между фразовыми правилами пропорционально
+            # числу их вхождений (поровну, если вхождений не было)
+            total_events = sum(events[position] for position in compiled.phrase_rules)
+            for position in compiled.phrase_rules:
+                share = events[position] / total_events if total_events else 1 / len(compiled.phrase_rules)
+                seconds[position] = matcher_seconds * share
+
+        for position in compiled.threshold_rules:
+            started = time.perf_counter()
+            hits[position], values[position] = _evaluate_threshold(rules[position], text)
+            seconds[position] = time.perf_counter() - started
+
+        issues = []
+        for position, rule in enumerate(rules):
+            if hits[position]:
+                message = rule['message'].format(**values[position])
+                if message not in issues:
+                    issues.append(message)
+
+        with self._lock:
+            matcher = self._matcher_stats[compiled.platform]
+            matcher["scans"] += 1
+            matcher["seconds"] += matcher_seconds
+            for position, rule in enumerate(rules):
+                stats = self._rule_stats[(compiled.platform, rule['id'])]
+                stats["evaluations"] += 1
+                stats["hits"] += int(hits[position])
+                stats["events"] += events[position]
+                stats["seconds"] += seconds[position]
+
+        return issues
+
+    @staticmethod
+    def _scan_phrases(compiled: _PlatformRules, text: str, hits: List[bool], events: List[int]) -> None:
+        """Один проход общего матчера фраз: фразовые правила и последовательности в строке."""
+        rules = compiled.rules
+        # Состояние последовательности: (следующая позиция, минимальное начало следующей фразы)
+        progress = {position: [0, 0] for position in compiled.phrase_rules if rules[position]['type'] == 'sequence'}
+        pending = len(compiled.phrase_rules)
+
+        for match in compiled.pattern.finditer(text):
+            group = match.lastgroup
+            if group == 'newline':
+                for state in progress.values():
+                    state[0] = 0
+                    state[1] = 0
+                continue
+
+            start = match.start()
+            for phrase in compiled.groups[group]:
+                for position, seq_position in compiled.subscribers[phrase]:
+                    if hits[position]:
+                        continue
+                    events[position] += 1
+
+                    state = progress.get(position)
+                    if state is not None:
+                        if state[0] != seq_position or start < state[1]:
+                            continue
+                        state[0] += 1
+                        state[1] = start + compiled.phrase_lengths[phrase]
+                        if state[0] < len(rules[position]['sequence']):
+                            continue
+
+                    hits[position] = True
+                    pending -= 1
+
+            if not pending:
+                break
+
+def _evaluate_threshold(rule: Dict[str, Any], text: str) -> Tuple[bool, Dict[str, Any]]:
+    """Вычисляет пороговое правило и значения для сообщения."""
+    rule_type = rule['type']
+    limit = rule['limit']
+
+    if rule_type == 'max_length':
+        return len(text) > limit, {"length": len(text)}
+    if rule_type == 'max_count':
+        count = text.count(rule['substring'])
+        return count > limit, {"count": count}
+    if rule_type == 'max_links':
+        count = count_links(text)
+        return count > limit, {"count": count}
+
+    # max_ratio: доля заглавных букв
+    ratio = sum(map(str.isupper, text)) / (len(text) + 1)
+    return ratio > limit, {"ratio": ratio}
+
+def _validate_rule(platform: str, rule: Dict[str, Any]) -> Dict[str, Any]:
+    """Проверяет описание правила и приводит его к нормальному виду."""
+    rule_id = rule.get('id')
+    rule_type = rule.get('type')
+    if not rule_id or rule_type not in RULE_TYPES:
+        raise ValueError(f"Invalid rule in platform '{platform}': {rule}")
+    if not rule.get('message'):
+        raise ValueError(f"Rule '{platform}.{rule_id}' has no message.")
+    try:
+        # Опечатка в {подстановке} обнаруживается при загрузке, а не при первой проверке
+        rule['message'].format(**_MESSAGE_VALUES[rule_type])
+    except (KeyError, IndexError, ValueError) as e:
+        allowed = ', '.join('{' + name + '}' for name in _MESSAGE_VALUES[rule_type]) or 'none'
+        raise ValueError(
+            f"Rule '{platform}.{rule_id}' message has an invalid placeholder ({e!r}); allowed: {allowed}."
+        )
+
+    if rule_type in _PHRASE_TYPES:
+        field = 'phrases' if rule_type == 'phrase' else 'sequence'
+        phrases = rule.get(field)
+        if not phrases or not all(isinstance(p, str) and p and '\n' not in p for p in phrases):
+            raise ValueError(f"Rule '{platform}.{rule_id}' needs a non-empty '{field}' list of single-line strings.")
+    else:
+        if not isinstance(rule.get('limit'), (int, float)):
+            raise ValueError(f"Rule '{platform}.{rule_id}' needs a numeric 'limit'.")
+        if rule_type == 'max_count' and not rule.get('substring'):
+            raise ValueError(f"Rule '{platform}.{rule_id}' needs a 'substring'.")
+
+    return dict(rule)
+
+def load_rule_engine(rules_path: str) -> ComplianceRuleEngine:
+    """
+    Загружает правила из YAML и компилирует движок.
+
+    Args:
+        rules_path: Путь к compliance_rules.yaml
+
+    Returns:
+        Скомпилированный движок правил
+    """
+    try:
+        with open(rules_path, 'r', encoding='utf-8') as f:
+            rules_config = yaml.safe_load(f)
+
+        engine = ComplianceRuleEngine(rules_config)
+        logger.info(f"Compliance rules loaded from {rules_path}: {', '.join(engine.platforms)}")
+        return engine
+
+    except FileNotFoundError:
+        logger.error(f"Compliance rules file not found: {rules_path}")
+        raise
+    except yaml.YAMLError as e:
+        logger.error(f"Error parsing compliance rules: {e}")
+        raise
+    except ValueError as e:
+        logger.error(f"Compliance rules validation error: {e}")
+        raise
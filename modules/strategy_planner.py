@@ -5,6 +5,8 @@ from typing import Dict, List, Any
 
 logger = logging.getLogger(__name__)
 
+STRATEGIES = ('full', 'partial', 'masked', 'hidden')
+
 def determine_actions_for_strategy(strategy: str, config: Dict[str, Any]) -> List[str]:
     """
     Определяет действия монетизации на основе выбранной стратегии.
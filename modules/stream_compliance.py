@@ -0,0 +1,161 @@
+# modules/stream_compliance.py
+import codecs
+import logging
+import mmap
+import os
+from typing import Iterable, Iterator, Union
+
+from modules.compliance_checker import (
+    LINK_CHARS,
+    PHRASE_OVERLAP,
+    ComplianceFeatures,
+    amazon_kdp_issues,
+    count_links,
+    mark_phrase_features
+)
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+# Длина 'https://': столько символов незавершённой ссылки хватает, чтобы распознать её начало
+_LINK_PREFIX = len('https://')
+
+class _KdpStreamScanner:
+    """
+    Потоковый подсчёт признаков Amazon KDP с постоянным объёмом памяти.
+
+    Ссылка целиком лежит внутри непрерывной серии символов LINK_CHARS и поглощает
+    её до конца, поэтому в каждой серии не больше одной ссылки. Незавершённая серия
+    в конце фрагмента переносится в следующий; слишком длинная серия сворачивается
+    до последних символов с флагом «ссылка уже найдена». Фразы ищутся с
+    перекрытием в PHRASE_OVERLAP символов.
+    """
+
+    def __init__(self, chunk_size: int):
+        self.chunk_size = chunk_size
+        self.features = ComplianceFeatures()
+        self.overlap = ""
+        self.run = ""
+        self.run_has_link = False
+
+    def feed(self, piece: str) -> None:
+        self.features.length += len(piece)
+        text = self.run + piece
+
+        # Хвост из символов ссылки может продолжиться в следующем фрагменте
+        complete_length = len(text.rstrip(LINK_CHARS))
+        if complete_length:
+            self._scan_complete(text[:complete_length])
+        self.run = text[complete_length:]
+
+        if len(self.run) > self.chunk_size:
+            head = self.run[:-_LINK_PREFIX]
+            if not self.run_has_link and count_links(self.run):
+                self.run_has_link = True
+            self._scan_phrases(head)
+            self.run = self.run[-_LINK_PREFIX:]
+
+    def finish(self) -> ComplianceFeatures:
+        if self.run or self.run_has_link:
+            self._scan_complete(self.run)
+            self.run = ""
+        return self.features
+
+    def _scan_complete(self, segment: str) -> None:
+        """Обрабатывает фрагмент, который заканчивается вне ссылки."""
+        if self.run_has_link:
+            # Первая серия фрагмента — продолжение свёрнутой серии, её ссылка уже найдена
+            first_run_end = len(segment) - len(segment.lstrip(LINK_CHARS))
+            self.features.link_count += 1 + count_links(segment[first_run_end:])
+            self.run_has_link = False
+        else:
+            self.features.link_count += count_links(segment)
+        self._scan_phrases(segment)
+
+    def _scan_phrases(self, segment: str) -> None:
+        mark_phrase_features(self.overlap + segment, self.features, ('amazon_kdp',))
+        self.overlap = (self.overlap + segment[-PHRASE_OVERLAP:])[-PHRASE_OVERLAP:]
+
+def iter_file_text(path: Union[str, os.PathLike], chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """
+    Читает UTF-8 файл фрагментами через отображение в память.
+
+    Многобайтовые символы на границе фрагментов собирает инкрементальный декодер.
+
+    Args:
+        path: Путь к файлу
+        chunk_size: Размер фрагмента в байтах
+
+    Yields:
+        Декодированные фрагменты текста
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            released = 0
+            for offset in range(0, len(mapped), chunk_size):
+                piece = decoder.decode(mapped[offset:offset + chunk_size])
+                # Прочитанные страницы отдаются системе, иначе RSS растёт вместе с размером файла
+                if hasattr(mapped, 'madvise'):
+                    end = (offset + chunk_size) // mmap.PAGESIZE * mmap.PAGESIZE
+                    if end > released:
+                        mapped.madvise(mmap.MADV_DONTNEED, released, end - released)
+                        released = end
+                if piece:
+                    yield piece
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+def _buffered(pieces: Iterable[str], chunk_size: int) -> Iterator[str]:
+    """Склеивает мелкие фрагменты (например, строки файла) до chunk_size символов."""
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+def check_amazon_kdp_compliance_stream(
+    source: Union[str, os.PathLike, Iterable[str]],
+    chunk_size: int = CHUNK_SIZE
+) -> list[str]:
+    """
+    Потоковая проверка книги на нарушения политик Amazon KDP.
+
+    Результат совпадает с check_amazon_kdp_compliance для того же текста,
+    но книга не загружается в память целиком.
+
+    Args:
+        source: Путь к UTF-8 файлу (читается через mmap) или итератор фрагментов текста
+        chunk_size: Размер фрагмента обработки
+
+    Returns:
+        Список проблем
+    """
+    logger.info("Checking Amazon KDP content compliance (streaming)")
+
+    if isinstance(source, (str, os.PathLike)):
+        pieces = iter_file_text(source, chunk_size)
+    else:
+        pieces = _buffered(source, chunk_size)
+
+    scanner = _KdpStreamScanner(chunk_size)
+    for piece in pieces:
+        scanner.feed(piece)
+    issues = amazon_kdp_issues(scanner.finish())
+
+    if not issues:
+        logger.info("✅ Amazon KDP content compliance check passed")
+    else:
+        logger.warning(f"⚠️ Amazon KDP content compliance issues: {issues}")
+
+    return issues
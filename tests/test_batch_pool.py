@@ -0,0 +1,76 @@
+# tests/test_batch_pool.py
+import asyncio
+import os
+import signal
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from api.batch_pool import close_monetization_pool, get_monetization_pool
+from utils.config_loader import compute_config_version, load_and_validate_config
+from utils.metrics import ITEMS_TOTAL, STAGE_SECONDS, get_metrics_registry
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def config():
+    config = load_and_validate_config(os.path.join(ROOT, 'monetization_config.yaml'))
+    config['batch'] = {'workers': 1}
+    yield config
+    close_monetization_pool()
+
+
+def item(i):
+    return ({'id': f'v{i}', 'title': 't', 'description': 'Обзор инструмента.'}, 'full', [])
+
+
+def test_broken_pool_is_replaced(config):
+    version = compute_config_version(config)
+    pool = get_monetization_pool(config, version)
+    assert [outcome['success'] for outcome in asyncio.run(pool.run([item(0)]))] == [True]
+
+    # Процесс-исполнитель погибает (как при OOM): исполнитель ломается навсегда
+    for pid in list(pool._executor._processes):
+        os.kill(pid, signal.SIGKILL)
+    with pytest.raises(BrokenProcessPool):
+        asyncio.run(pool.run([item(1)]))
+    assert pool.broken
+
+    replacement = get_monetization_pool(config, version)
+    assert replacement is not pool
+    assert [outcome['success'] for outcome in asyncio.run(replacement.run([item(2), item(3)]))] == [True, True]
+    assert get_monetization_pool(config, version) is replacement
+
+
+def test_submit_marks_pool_broken(config):
+    version = compute_config_version(config)
+    pool = get_monetization_pool(config, version)
+    assert asyncio.run(pool.run([item(0)]))[0]['success']
+    for pid in list(pool._executor._processes):
+        os.kill(pid, signal.SIGKILL)
+
+    async def submit():
+        return await pool.submit(item(1))
+
+    with pytest.raises(BrokenProcessPool):
+        asyncio.run(submit())
+    assert get_monetization_pool(config, version) is not pool
+
+
+def test_worker_metrics_reach_parent(config):
+    get_metrics_registry().clear()
+    pool = get_monetization_pool(config, compute_config_version(config))
+    assert all(outcome['success'] for outcome in asyncio.run(pool.run([item(i) for i in range(5)])))
+
+    async def stream():
+        return await asyncio.gather(*(pool.submit(item(i)) for i in range(5, 8)))
+
+    assert all(outcome['success'] for outcome in asyncio.run(stream()))
+
+    assert ITEMS_TOTAL.value('full', 'video') == 8
+    plan_hits = STAGE_SECONDS.snapshot('plan', 'full', 'video', 'hit') or {'count': 0}
+    plan_misses = STAGE_SECONDS.snapshot('plan', 'full', 'video', 'miss') or {'count': 0}
+    assert plan_hits['count'] + plan_misses['count'] == 8
+    assert STAGE_SECONDS.snapshot('analyze', 'full', 'video', 'miss')['count'] >= 1
+    assert 'ssv_monetized_items_total{strategy="full",content_type="video"} 8' in get_metrics_registry().render()
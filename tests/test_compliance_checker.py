@@ -0,0 +1,127 @@
+# tests/test_compliance_checker.py
+import random
+import re
+import time
+
+import pytest
+
+from modules.compliance_checker import (
+    PLATFORMS,
+    check_amazon_kdp_compliance,
+    check_general_compliance,
+    check_youtube_description_compliance,
+    scan_compliance
+)
+
+# Потолок времени проверки 1 МБ патологического текста (все платформы сразу).
+# Исходные шаблоны с .* тратят на такие тексты десятки минут.
+LATENCY_CEILING_SECONDS = 2.0
+MB = 1024 * 1024
+
+
+def baseline_youtube(description):
+    """Исходные регулярные выражения check_youtube_description_compliance."""
+    issues = []
+    if re.search(r'free.*money|get rich quick', description, re.IGNORECASE):
+        issues.append("Potential spam/scam language detected.")
+    if re.search(r'buy.*now|click.*here|limited.*offer', description, re.IGNORECASE):
+        issues.append("Potentially aggressive marketing language detected.")
+    if len(description) > 5000:
+        issues.append(f"Description too long: {len(description)} characters (max 5000).")
+    return issues
+
+
+def baseline_amazon_kdp(book_content):
+    """Исходные регулярные выражения check_amazon_kdp_compliance."""
+    issues = []
+    if re.search(r'adult content|explicit material', book_content, re.IGNORECASE):
+        issues.append("Potential adult content detected.")
+    if re.search(r'copyright|plagiarism', book_content, re.IGNORECASE):
+        issues.append("Potential copyright issues detected.")
+    link_count = len(re.findall(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+',
+                                book_content))
+    if link_count > 5:
+        issues.append(f"Too many external links: {link_count} (recommended: max 5).")
+    return issues
+
+
+def baseline_general(content):
+    """Исходная check_general_compliance."""
+    issues = []
+    caps_ratio = sum(1 for c in content if c.isupper()) / (len(content) + 1)
+    if caps_ratio > 0.3:
+        issues.append("Excessive use of capital letters detected.")
+    exclamation_count = content.count('!')
+    if exclamation_count > 10:
+        issues.append(f"Too many exclamation marks: {exclamation_count}.")
+    return issues
+
+
+BASELINES = {'youtube': baseline_youtube, 'amazon_kdp': baseline_amazon_kdp, 'general': baseline_general}
+
+# Слова правил, их обрывки и символы, на которых расходятся наивные переписывания:
+# переводы строк (.* их не пересекает), Kelvin K и длинная ſ (IGNORECASE), части ссылок
+TOKENS = [
+    'free', 'money', 'get rich quick', 'get rich', 'buy', 'now', 'click', 'here', 'limited', 'offer',
+    'adult content', 'explicit material', 'copyright', 'plagiarism', 'FREE', 'MoNeY', 'BUY', 'cliK', 'ſ',
+    'http://', 'https://', 'http', 'HTTP://', 'example.com', '%2F', '%zz', '/', '?', '#', '~', '[', ']',
+    ' ', ' ', ' ', '\n', '\r\n', '\t', '!', 'Текст', 'ГЛАВА', 'ё', '🙂', 'a', 'Z', '0', '(', ')', ',', '*', '$',
+]
+
+
+def fuzz_text(rng):
+    return ''.join(rng.choice(TOKENS) for _ in range(rng.randint(0, 60)))
+
+
+def test_fuzz_matches_baseline_regexes():
+    rng = random.Random(6)
+    for _ in range(20000):
+        text = fuzz_text(rng)
+        verdicts = scan_compliance(text)
+        for platform in PLATFORMS:
+            assert verdicts[platform] == BASELINES[platform](text), (platform, text)
+
+
+def test_platform_functions_match_baseline():
+    rng = random.Random(7)
+    for _ in range(2000):
+        text = fuzz_text(rng)
+        assert check_youtube_description_compliance(text) == baseline_youtube(text)
+        assert check_amazon_kdp_compliance(text) == baseline_amazon_kdp(text)
+        assert check_general_compliance(text) == baseline_general(text)
+
+
+def test_long_descriptions_match_baseline():
+    text = ('free ' + 'x' * 3000 + '\nmoney CLICK\n here ') * 3
+    assert scan_compliance(text)['youtube'] == baseline_youtube(text)
+
+
+def megabyte_of(unit):
+    return (unit * (MB // len(unit) + 1))[:MB]
+
+
+PATHOLOGICAL = {
+    # Открывающее слово без закрывающего: исходный .* перебирал хвост после каждого вхождения
+    'free_without_money': megabyte_of('free '),
+    'openers_without_closers': megabyte_of('buy click limited '),
+    'opener_then_closer_next_line': megabyte_of('free buy click ' * 1000 + '\nmoney now here '),
+    # Длинные серии символов ссылки и обрывки схем
+    'link_prefixes': megabyte_of('http://'),
+    'one_long_link': 'https://' + megabyte_of('a%2F'),
+    'percent_runs': megabyte_of('http://%'),
+    'caps_and_bangs': megabyte_of('AAAA!'),
+    'no_newlines_mixed': megabyte_of('freebuyclickhttp'),
+}
+
+
+@pytest.mark.parametrize('name', sorted(PATHOLOGICAL))
+def test_latency_ceiling_on_1mb_pathological_input(name):
+    # Уникальный префикс: результат не берётся из кэша предыдущих запусков
+    text = f"{name} {time.perf_counter_ns()}\n" + PATHOLOGICAL[name]
+    assert len(text) >= MB
+
+    started = time.perf_counter()
+    scan_compliance(text)
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < LATENCY_CEILING_SECONDS, f"{name}: {elapsed:.3f}s"
@@ -0,0 +1,165 @@
+# tests/test_config_snapshot.py
+import copy
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import main
+from api.pipeline import run_monetization_pipeline
+from utils import config_loader
+from modules.plan_cache import clear_injection_plan_cache
+from modules.strategy_planner import STRATEGIES
+from utils.config_loader import load_and_validate_config
+from utils.config_snapshot import freeze_config
+from utils.result_cache import get_result_cache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+METHODS = ['affiliate_links', 'sponsorship', 'premium_content']
+CONTENTS = [
+    {'id': f'v{i}', 'title': f'Видео {i}', 'description': text}
+    for i, text in enumerate([
+        'Обзор: скальпель и шов.',
+        'Скальпель, atlas, шов — всё в одном видео!',
+        '',
+        'Без ключевых слов.',
+        'ATLAS анатомии. Шов. Скальпель.',
+    ])
+]
+
+
+def make_config(name, links):
+    config = copy.deepcopy(load_and_validate_config(os.path.join(ROOT, 'monetization_config.yaml')))
+    monetization = config['monetization']
+    for method in METHODS:
+        monetization[method]['enabled'] = True
+    monetization['affiliate_links']['default_links'] = links
+    monetization['sponsorship']['sponsor_name'] = f'Спонсор {name}'
+    monetization['premium_content']['call_to_action'] = f'Узнайте больше: {name}.'
+    return freeze_config(config)
+
+
+@pytest.fixture(scope='module')
+def configs():
+    return [
+        make_config('альфа', {'скальпель': 'https://a.example/1', 'шов': 'https://a.example/2'}),
+        make_config('бета', {'atlas': 'https://b.example/1', 'скальпель': 'https://b.example/2'}),
+    ]
+
+
+def random_request(rng):
+    methods = rng.sample(METHODS, rng.randint(0, len(METHODS)))
+    return rng.randrange(2), rng.randrange(len(CONTENTS)), rng.choice(STRATEGIES), methods
+
+
+def run(configs, request):
+    config_index, content_index, strategy, methods = request
+    config = configs[config_index]
+    return run_monetization_pipeline(CONTENTS[content_index], config, config.version, strategy, methods)
+
+
+def test_readers_see_whole_snapshots_during_swap(configs):
+    """Читатель, взявший ссылку на конфигурацию, видит её целиком, пока ссылку заменяют."""
+    current = {'config': configs[0]}
+    before = [config.to_dict() for config in configs]
+    stop = threading.Event()
+    errors = []
+
+    def swapper():
+        rng = random.Random(21)
+        while not stop.is_set():
+            current['config'] = configs[rng.randrange(2)]
+
+    def reader(seed):
+        rng = random.Random(seed)
+        try:
+            for _ in range(2000):
+                config = current['config']
+                overlay = config.overlay({'monetization': {'strategy': rng.choice(STRATEGIES)}})
+                monetization = overlay['monetization']
+                sponsor = monetization['sponsorship']['sponsor_name']
+                cta = monetization['premium_content']['call_to_action']
+                links = dict(monetization['affiliate_links']['default_links'])
+                # Все значения одного чтения — из одного снимка
+                assert cta == f"Узнайте больше: {sponsor.split()[-1]}.", (sponsor, cta)
+                assert links == dict(config['monetization']['affiliate_links']['default_links'])
+                assert overlay.version != config.version
+        except AssertionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=swapper)] + [threading.Thread(target=reader, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads[1:]:
+        thread.join()
+    stop.set()
+    threads[0].join()
+
+    assert not errors, errors[:3]
+    assert [config.to_dict() for config in configs] == before
+
+
+def test_shared_overlay_merges_concurrently(configs):
+    """Один снимок-слой читают многие потоки сразу: запоминание объединённых ключей без гонок."""
+    for _ in range(50):
+        overlay = configs[0].overlay({'monetization': {'strategy': 'full', 'sponsorship': {'enabled': False}}})
+        barrier = threading.Barrier(8)
+
+        def read():
+            barrier.wait()
+            monetization = overlay['monetization']
+            return (
+                monetization['strategy'],
+                monetization['sponsorship']['enabled'],
+                monetization['sponsorship']['sponsor_name'],
+                tuple(monetization['methods'])
+            )
+
+        with ThreadPoolExecutor(8) as executor:
+            results = set(executor.map(lambda _: read(), range(8)))
+        assert results == {('full', False, 'Спонсор альфа', tuple(configs[0]['monetization']['methods']))}
+
+
+def test_parallel_mixed_strategy_requests_match_sequential(configs):
+    rng = random.Random(2021)
+    requests = [random_request(rng) for _ in range(4000)]
+
+    expected = {}
+    for request in requests:
+        key = (request[0], request[1], request[2], tuple(request[3]))
+        if key not in expected:
+            expected[key] = run(configs, request)
+
+    # Параллельный прогон с пустыми кэшами: планы компилируются наперегонки
+    clear_injection_plan_cache()
+    get_result_cache().clear()
+    with ThreadPoolExecutor(16) as executor:
+        results = list(executor.map(lambda request: run(configs, request), requests))
+
+    for request, result in zip(requests, results):
+        assert result == expected[(request[0], request[1], request[2], tuple(request[3]))], request
+    # Результаты разных конфигураций действительно различаются
+    full = [expected[key] for key in expected if key[2] == 'full' and len(key[3]) == 3 and key[1] == 0]
+    assert len({result['result']['description'] for result in full}) == 2
+
+
+def test_process_content_reuses_snapshot_version(configs, monkeypatch):
+    """Снимок не сериализуется на каждый элемент, ограничения кэша не перенастраиваются."""
+    def fingerprint(config):
+        raise AssertionError("config fingerprinted per item")
+
+    monkeypatch.setattr(config_loader, 'config_fingerprint', fingerprint)
+    monkeypatch.setattr(main, 'track_monetization_event', lambda *args, **kwargs: None)
+    cache = get_result_cache()
+    max_entries = cache.max_entries
+    cache.configure(max_entries=7)
+    try:
+        for content in CONTENTS:
+            main.process_content(content, configs[0])
+        assert cache.stats()['version'] == configs[0].version
+        assert cache.max_entries == 7
+    finally:
+        cache.configure(max_entries=max_entries)
@@ -0,0 +1,128 @@
+# tests/test_event_sink.py
+import asyncio
+import threading
+import time
+
+from modules import analytics_tracker
+from modules.event_sink import (
+    BufferedEventSink, CompositeEventStore, EventStore, NullEventStore, SQLiteEventStore,
+    close_event_sink, configure_event_sink, get_event_sink, iter_stored_events
+)
+
+
+class BlockedStore(EventStore):
+    """Хранилище, запись в которое ждёт разрешения теста."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.events = []
+
+    def write_batch(self, events):
+        self.release.wait()
+        self.events.extend(events)
+
+
+def event(i):
+    return {"event_type": "monetization_applied", "content_id": str(i), "timestamp": "2026-01-01T00:00:00", "metadata": {}}
+
+
+def full_sink(put_timeout):
+    store = BlockedStore()
+    sink = BufferedEventSink(store, capacity=4, batch_size=2, flush_interval=0.01, put_timeout=put_timeout)
+    # Поток записи забирает первое событие и зависает в хранилище, затем буфер заполняется
+    assert sink.emit(event(0))
+    while sink.stats()["buffered"]:
+        time.sleep(0.005)
+    for i in range(1, 5):
+        assert sink.emit(event(i))
+    return sink, store
+
+
+def test_emit_in_event_loop_drops_without_waiting():
+    sink, store = full_sink(put_timeout=1.0)
+
+    async def handler():
+        started = time.perf_counter()
+        accepted = sink.emit(event(99))
+        return accepted, time.perf_counter() - started
+
+    accepted, elapsed = asyncio.run(handler())
+    assert not accepted
+    assert elapsed < 0.2
+    assert sink.stats()["dropped"] == 1
+
+    store.release.set()
+    sink.close()
+    assert len(store.events) == 5
+
+
+def test_emit_in_worker_thread_waits_for_space():
+    sink, store = full_sink(put_timeout=0.3)
+
+    started = time.perf_counter()
+    assert not sink.emit(event(99))
+    assert time.perf_counter() - started >= 0.25
+
+    threading.Timer(0.1, store.release.set).start()
+    assert sink.emit(event(100))
+    sink.close()
+    assert sink.stats()["dropped"] == 1
+
+
+class FailingStore(EventStore):
+    def write_batch(self, events):
+        raise OSError("disk full")
+
+
+def test_secondary_store_failure_keeps_batch_written(tmp_path):
+    path = str(tmp_path / 'events.db')
+    sink = BufferedEventSink(CompositeEventStore([SQLiteEventStore(path), FailingStore()]), flush_interval=0.01)
+    seen = []
+    sink.add_listener(lambda events, last_id: seen.append((len(events), last_id)))
+    for i in range(3):
+        sink.emit(event(i))
+    sink.close()
+
+    stats = sink.stats()
+    assert (stats["written"], stats["failed"]) == (3, 0)
+    assert stats["secondary_failed"] == {"FailingStore": 3}
+    # Слушатели получили пачку с id основного хранилища
+    assert sum(count for count, _ in seen) == 3 and seen[-1][1] == 3
+    assert [stored["id"] for stored in iter_stored_events(path)] == [1, 2, 3]
+
+
+def test_primary_store_failure_fails_batch():
+    sink = BufferedEventSink(CompositeEventStore([FailingStore(), BlockedStore()]), flush_interval=0.01)
+    seen = []
+    sink.add_listener(lambda events, last_id: seen.append(events))
+    sink.emit(event(0))
+    sink.close()
+    assert sink.stats()["failed"] == 1
+    assert not seen
+
+
+def test_unconfigured_sink_does_not_persist(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    close_event_sink()
+    threads = threading.active_count()
+
+    analytics_tracker.track_monetization_event('content_processed', 'video', {'strategy': 'full'})
+    sink = get_event_sink()
+    assert isinstance(sink.store, NullEventStore)
+    assert sink.stats() == {"configured": False, "discarded": 1}
+    assert threading.active_count() == threads
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_config_without_events_path_is_not_persisted(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sink = configure_event_sink({'analytics': {'flush_interval_seconds': 0.01}})
+    try:
+        written = []
+        sink.add_listener(lambda events, last_id: written.extend(events))
+        sink.emit({"event_type": "content_processed", "content_id": "video", "metadata": {}})
+        assert sink.flush(5)
+        assert len(written) == 1
+        assert list(tmp_path.iterdir()) == []
+    finally:
+        close_event_sink()
@@ -0,0 +1,112 @@
+# tests/test_keyword_matcher.py
+import random
+import re
+
+from modules.keyword_matcher import KeywordMatcher
+
+# Слова без цифр и частей URL ссылок: ключевые слова не встречаются во вставленных URL
+WORDS = ['alpha', 'beta', 'gamma', 'delta', 'Python', 'пальто', 'ёж', 'Ключ', 'ΣΟΦΙΑ', 'x_y']
+SEPARATORS = [' ', ' ', ' ', ', ', '. ', '\n', ' - ', '(', ')', '!']
+
+
+def baseline_replace(text, links):
+    """Исходный алгоритм: отдельный re.sub на каждое ключевое слово по порядку словаря."""
+    for keyword, affiliate_url in links.items():
+        pattern = rf'\b{re.escape(keyword)}\b'
+        text = re.sub(pattern, f"{keyword} ({affiliate_url})", text, count=1, flags=re.IGNORECASE)
+    return text
+
+
+def occurrences(text, keyword):
+    """Все вхождения ключевого слова с границами слов, включая перекрывающиеся."""
+    pattern = rf'(?=(\b{re.escape(keyword)}\b))'
+    return [(m.start(), m.start() + len(m.group(1))) for m in re.finditer(pattern, text, re.IGNORECASE)]
+
+
+def random_case(word, rng):
+    return ''.join(c.upper() if rng.random() < 0.3 else c for c in word)
+
+
+def random_case_input(rng, words=WORDS):
+    keywords = {}
+    for _ in range(rng.randint(1, 8)):
+        keyword = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 3)))
+        if keyword.lower() not in {k.lower() for k in keywords}:
+            keywords[keyword] = f"https://aff.example/{len(keywords)}"
+    text = ''.join(
+        random_case(rng.choice(words), rng) + rng.choice(SEPARATORS)
+        for _ in range(rng.randint(0, 25))
+    )
+    return keywords, text
+
+
+def spans_conflict(text, keywords):
+    """Пересекаются или соприкасаются ли вхождения разных ключевых слов."""
+    spans = [(start, end, keyword) for keyword in keywords for start, end in occurrences(text, keyword)]
+    return any(
+        a[2] != b[2] and a[0] <= b[1] and b[0] <= a[1]
+        for i, a in enumerate(spans) for b in spans[i + 1:]
+    )
+
+
+def test_matches_baseline_without_overlaps():
+    rng = random.Random(1)
+    compared = 0
+    for _ in range(5000):
+        keywords, text = random_case_input(rng)
+        if spans_conflict(text, keywords):
+            continue
+        compared += 1
+        assert KeywordMatcher(keywords).replace(text) == baseline_replace(text, keywords), (keywords, text)
+    assert compared > 1000
+
+
+def test_find_is_maximal_with_overlaps():
+    """Каждое вхождение непривязанного ключевого слова пересекается с принятым совпадением."""
+    rng = random.Random(2)
+    for _ in range(3000):
+        # Малый словарь: много перекрывающихся и вложенных вхождений
+        keywords, text = random_case_input(rng, WORDS[:3])
+        matcher = KeywordMatcher(keywords)
+        matches = matcher.find(text)
+        names = list(keywords)
+
+        for (_, end, _), (start, _, _) in zip(matches, matches[1:]):
+            assert end <= start
+        assert len({index for _, _, index in matches}) == len(matches)
+
+        linked = {names[index] for _, _, index in matches}
+        for start, end, index in matches:
+            assert (start, end) in occurrences(text, names[index])
+        for keyword in keywords:
+            if keyword in linked:
+                continue
+            for start, end in occurrences(text, keyword):
+                assert any(start < m_end and m_start < end for m_start, m_end, _ in matches), (keywords, text, keyword)
+
+
+def test_shorter_keyword_after_rejected_overlap():
+    links = {'a b': 'U1', 'b c': 'U2', 'c': 'U3'}
+    assert KeywordMatcher(links).replace("a b c") == "a b (U1) c (U3)"
+    assert KeywordMatcher(links).replace("a b c") == baseline_replace("a b c", links)
+
+
+def test_nested_keywords_link_longest_once():
+    """Вложенные ключевые слова: ссылка не вставляется внутрь другой ссылки (в отличие от re.sub)."""
+    links = {'machine learning': 'U1', 'learning': 'U2'}
+    text = "machine learning and learning"
+    assert baseline_replace(text, links) == "machine learning (U2) (U1) and learning"
+    assert KeywordMatcher(links).replace(text) == "machine learning (U1) and learning (U2)"
+
+
+def test_keywords_inside_inserted_urls_are_not_linked():
+    links = {'python': 'http://aff/py', 'http': 'U'}
+    assert baseline_replace("learn python", links) == "learn python (http (U)://aff/py)"
+    assert KeywordMatcher(links).replace("learn python") == "learn python (http://aff/py)"
+
+
+def test_used_keywords_are_skipped():
+    matcher = KeywordMatcher({'alpha': 'U1', 'beta': 'U2'})
+    used = set()
+    assert matcher.replace("alpha beta", used) == "alpha (U1) beta (U2)"
+    assert matcher.replace("alpha beta", used) == "alpha beta"
@@ -0,0 +1,82 @@
+# tests/test_metrics_store.py
+import os
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from modules.event_sink import SQLiteEventStore, close_event_sink, configure_event_sink
+from modules.metrics_store import MetricsStore
+
+
+def event(i):
+    return {
+        "event_type": "content_monetized",
+        "content_id": f"v{i}",
+        "timestamp": f"2026-01-01T{i % 24:02d}:00:00",
+        "metadata": {"strategy": "full", "content_type": "video", "metrics": {"total_cta": 1}}
+    }
+
+
+@pytest.fixture
+def config(tmp_path):
+    return {'analytics': {
+        'events_path': str(tmp_path / 'events.db'),
+        'metrics_store_path': str(tmp_path / 'metrics'),
+        'flush_interval_seconds': 0.01
+    }}
+
+
+def test_pending_rows_are_replayed_after_crash(config):
+    analytics = config['analytics']
+    sink = configure_event_sink(config)
+    try:
+        for i in range(3):
+            sink.emit(event(i))
+        assert sink.flush(5)
+        # Аварийная остановка: строки в памяти хранилища метрик не записаны в сегмент
+        assert sink.store.stores[1].row_count() == 3
+    finally:
+        sink.store.stores[1].close = lambda: None
+        close_event_sink()
+
+    sink = configure_event_sink(config)
+    try:
+        metrics_store = sink.store.stores[1]
+        assert metrics_store.row_count() == 3
+        assert metrics_store.last_event_id == 3
+        sink.emit(event(3))
+        assert sink.flush(5)
+    finally:
+        close_event_sink()
+
+    # Чистая остановка: сегмент помнит id последнего события, повторного чтения нет
+    store = SQLiteEventStore(analytics['events_path'])
+    store.write_batch([event(4)])
+    store.close()
+    metrics_store = MetricsStore(analytics['metrics_store_path'])
+    assert metrics_store.last_event_id == 4
+    assert metrics_store.catch_up(analytics['events_path']) == 1
+    assert metrics_store.row_count() == 5
+    assert metrics_store.query('total_cta', group_by='content_type')['groups'][0]['key'] == 'video'
+
+
+def test_segments_without_event_id_are_not_replayed(config):
+    analytics = config['analytics']
+    store = SQLiteEventStore(analytics['events_path'])
+    store.write_batch([event(i) for i in range(3)])
+    store.close()
+    metrics_store = MetricsStore(analytics['metrics_store_path'])
+    metrics_store.write_batch([event(i) for i in range(3)])
+    metrics_store.close()
+    # Сегменты старого формата: без id последнего события
+    for entry in os.listdir(analytics['metrics_store_path']):
+        meta_path = os.path.join(analytics['metrics_store_path'], entry, 'meta.json')
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+
+    metrics_store = MetricsStore(analytics['metrics_store_path'])
+    assert metrics_store.last_event_id is None
+    assert metrics_store.catch_up(analytics['events_path']) == 0
+    assert metrics_store.last_event_id == 3
+    assert metrics_store.row_count() == 3
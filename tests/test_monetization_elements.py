@@ -0,0 +1,82 @@
+# tests/test_monetization_elements.py
+import copy
+import os
+import random
+
+import pytest
+
+import main
+from modules.compliance_checker import count_monetization_elements
+from modules.content_injector import compile_injection_plan
+from utils.config_loader import load_and_validate_config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TOKENS = [
+    'Узнайте больше', 'узнайте БОЛЬШЕ', 'премиум', 'ПРЕМИУМ', 'Дисклеймер', 'disclaimer', 'DISCLAIMER',
+    'спонсирован', 'Спонсированный', 'http', 'HTTP', 'https://x.example', 'узнайте', 'больше', 'преми',
+    ' ', '  ', '.', '!', '?', '\n', ',', ':', 'İ', 'ſ', 'текст', 'word', '🙂',
+]
+
+
+@pytest.fixture
+def default_config():
+    config = copy.deepcopy(load_and_validate_config(os.path.join(ROOT, 'monetization_config.yaml')))
+    monetization = config['monetization']
+    monetization['strategy'] = 'full'
+    for method in ('affiliate_links', 'sponsorship', 'premium_content'):
+        monetization[method]['enabled'] = True
+    monetization['affiliate_links']['default_links'] = {'инструмент': 'https://aff.example/tool'}
+    return config
+
+
+def test_default_config_counts_each_element_once(default_config, monkeypatch):
+    monkeypatch.setattr(main, 'track_monetization_event', lambda *args, **kwargs: None)
+    result = main.process_content({'id': 'v', 'title': 't', 'description': 'Обзор: инструмент.'}, default_config)
+
+    metrics = result['metrics']
+    assert metrics['total_affiliate_links'] == 1
+    assert metrics['total_disclaimers'] == 2
+    assert metrics['total_cta'] == 1
+
+    np = pytest.importorskip('numpy')
+    from modules.batch_analytics import compute_batch_metrics
+    batch = compute_batch_metrics([result['description']])
+    assert [int(batch[name][0]) for name in ('total_affiliate_links', 'total_disclaimers', 'total_cta')] == [1, 2, 1]
+    assert np.isclose(batch['monetization_density'][0], metrics['monetization_density'])
+
+
+def test_rendered_texts_are_single_elements(default_config):
+    actions = ['add_affiliate_disclaimer', 'inject_sponsorship', 'add_sponsorship_disclaimer', 'add_premium_cta']
+    plan = compile_injection_plan(actions, default_config)
+    assert count_monetization_elements(plan.affiliate_disclaimer) == {'affiliate_link': 0, 'disclaimer': 1, 'cta': 0}
+    assert count_monetization_elements(plan.sponsorship_disclaimer) == {'affiliate_link': 0, 'disclaimer': 1, 'cta': 0}
+    assert count_monetization_elements(plan.premium_cta) == {'affiliate_link': 0, 'disclaimer': 0, 'cta': 1}
+    assert count_monetization_elements(plan.sponsor_mention) == {'affiliate_link': 0, 'disclaimer': 0, 'cta': 0}
+
+
+def test_sentence_boundaries_separate_elements():
+    text = 'Премиум и узнайте больше. Премиум!\nДисклеймер: спонсирован? disclaimer'
+    counts = count_monetization_elements(text, positions=True)
+    assert (counts['cta'], counts['disclaimer']) == (2, 2)
+    assert [(kind, text[start:end]) for kind, start, end in counts['positions']] == [
+        ('cta', 'Премиум и узнайте больше'),
+        ('cta', 'Премиум'),
+        ('disclaimer', 'Дисклеймер: спонсирован'),
+        ('disclaimer', 'disclaimer'),
+    ]
+
+
+def test_batch_matches_single_text_counts():
+    pytest.importorskip('numpy')
+    from modules.batch_analytics import compute_batch_metrics
+
+    rng = random.Random(15)
+    texts = [''.join(rng.choice(TOKENS) for _ in range(rng.randint(0, 40))) for _ in range(3000)]
+    batch = compute_batch_metrics(texts)
+    for index, text in enumerate(texts):
+        counts = count_monetization_elements(text, positions=True)
+        assert int(batch['total_affiliate_links'][index]) == counts['affiliate_link'], text
+        assert int(batch['total_disclaimers'][index]) == counts['disclaimer'], text
+        assert int(batch['total_cta'][index]) == counts['cta'], text
+        assert len(counts['positions']) == counts['affiliate_link'] + counts['disclaimer'] + counts['cta']
@@ -0,0 +1,41 @@
+# tests/test_rule_engine.py
+import os
+
+import pytest
+
+from modules.rule_engine import ComplianceRuleEngine, load_rule_engine
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def engine_with(rule, platform='telegram'):
+    return ComplianceRuleEngine({'platforms': {platform: [rule]}})
+
+
+def test_shipped_rules_load():
+    engine = load_rule_engine(os.path.join(ROOT, 'compliance_rules.yaml'))
+    assert engine.platforms
+    assert engine.check('vk', 'быстрый заработок') == ["Potential spam/scam language detected."]
+
+
+@pytest.mark.parametrize('platform', ['youtube', 'amazon_kdp', 'general'])
+def test_builtin_platforms_cannot_be_redefined(platform):
+    with pytest.raises(ValueError, match='built in'):
+        engine_with({'id': 'x', 'type': 'phrase', 'phrases': ['spam'], 'message': 'Spam.'}, platform)
+
+
+@pytest.mark.parametrize('rule', [
+    {'id': 'links', 'type': 'max_links', 'limit': 5, 'message': 'Too many links: {cuont}.'},
+    {'id': 'length', 'type': 'max_length', 'limit': 5, 'message': 'Too long: {count}.'},
+    {'id': 'spam', 'type': 'phrase', 'phrases': ['spam'], 'message': 'Spam {}.'},
+    {'id': 'ratio', 'type': 'max_ratio', 'limit': 0.3, 'message': 'Caps {ratio:d}.'},
+    {'id': 'open', 'type': 'max_count', 'substring': '!', 'limit': 1, 'message': 'Count {count.'},
+])
+def test_invalid_message_placeholders_fail_at_load(rule):
+    with pytest.raises(ValueError, match='placeholder'):
+        engine_with(rule)
+
+
+def test_valid_placeholders_are_formatted():
+    engine = engine_with({'id': 'ratio', 'type': 'max_ratio', 'limit': 0.3, 'message': 'Caps {ratio:.2f}, {{literal}}.'})
+    assert engine.check('telegram', 'AAAA') == ['Caps 0.80, {literal}.']
@@ -0,0 +1,87 @@
+# tests/test_stream_compliance.py
+import json
+import os
+import random
+import subprocess
+import sys
+
+from modules.compliance_checker import amazon_kdp_issues, extract_compliance_features
+from modules.stream_compliance import check_amazon_kdp_compliance_stream
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Фрагменты, которые ломаются на границе кусков: ссылки, фразы правил, многобайтовые символы
+FRAGMENTS = [
+    'http://a.example/x', 'https://b.example/path?q=1&r=%20', 'http://', 'https:/', 'HTTP://C.EXAMPLE',
+    'adult content', 'explicit material', 'copyright', 'plagiarism', 'adult', 'material',
+    'текст', 'глава', '🙂', 'ё', ' ', ' ', '\n', '(', ')', '!', 'word', '$_@.&+*',
+]
+
+RSS_SCRIPT = """
+import json, resource, sys
+from modules.stream_compliance import check_amazon_kdp_compliance_stream
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+issues = check_amazon_kdp_compliance_stream(sys.argv[1])
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"before_kb": before, "after_kb": after, "issues": issues}))
+"""
+
+
+def in_memory_issues(text):
+    return amazon_kdp_issues(extract_compliance_features(text, ('amazon_kdp',)))
+
+
+def random_text(rng):
+    return ''.join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 80)))
+
+
+def random_split(text, rng):
+    cuts = sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, rng.randint(0, 12))))
+    return [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+
+def test_iterator_source_matches_in_memory():
+    rng = random.Random(11)
+    for _ in range(3000):
+        text = random_text(rng)
+        chunk_size = rng.choice([1, 2, 3, 5, 8, 13, 64, 1024])
+        streamed = check_amazon_kdp_compliance_stream(random_split(text, rng), chunk_size=chunk_size)
+        assert streamed == in_memory_issues(text), (text, chunk_size)
+
+
+def test_file_source_matches_in_memory(tmp_path):
+    """Файл читается кусками байт: границы попадают и внутрь многобайтовых символов."""
+    rng = random.Random(12)
+    path = tmp_path / 'book.txt'
+    for _ in range(500):
+        text = random_text(rng)
+        path.write_text(text, encoding='utf-8')
+        chunk_size = rng.choice([1, 2, 3, 7, 16, 4096])
+        assert check_amazon_kdp_compliance_stream(str(path), chunk_size=chunk_size) == in_memory_issues(text), (text, chunk_size)
+
+
+def test_long_link_runs_spanning_many_chunks():
+    text = 'start http://' + 'a' * 5000 + ' ' + ' '.join(f'https://x{i}.example' for i in range(7))
+    for chunk_size in (1, 7, 100, 4999, 5001):
+        assert check_amazon_kdp_compliance_stream(random_split(text, random.Random(chunk_size)), chunk_size=chunk_size) \
+            == in_memory_issues(text) == ["Too many external links: 8 (recommended: max 5)."]
+
+
+def test_100mb_book_has_flat_rss(tmp_path):
+    path = tmp_path / 'book.txt'
+    rng = random.Random(13)
+    block = ''.join(rng.choice(FRAGMENTS[5:]) for _ in range(20000)).encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(b'http://one.example http://two.example\n')
+        while f.tell() < 100 * 1024 * 1024:
+            f.write(block)
+
+    completed = subprocess.run(
+        [sys.executable, '-c', RSS_SCRIPT, str(path)],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    assert result['issues'] == ["Potential adult content detected.", "Potential copyright issues detected."]
+    # Файл отображается в память, но прочитанные страницы отдаются системе
+    assert result['after_kb'] - result['before_kb'] < 32 * 1024, result
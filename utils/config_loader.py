@@ -4,6 +4,8 @@ import yaml
 import logging
 from typing import Dict, Any
 
+from utils.config_snapshot import ConfigSnapshot, config_fingerprint
+
 logger = logging.getLogger(__name__)
 
 def load_and_validate_config(config_path: str) -> Dict[str, Any]:
@@ -34,3 +36,9 @@ def load_and_validate_config(config_path: str) -> Dict[str, Any]:
     except ValueError as e:
         logger.error(f"Config validation error: {e}")
         raise
+
+def compute_config_version(config: Dict[str, Any]) -> str:
+    """Вычисляет версию (отпечаток) конфигурации для ключей кэшей; у снимка — без сериализации."""
+    if isinstance(config, ConfigSnapshot):
+        return config.version
+    return config_fingerprint(config)
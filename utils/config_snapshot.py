@@ -0,0 +1,150 @@
+# utils/config_snapshot.py
+import hashlib
+import json
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+def config_fingerprint(config: Any) -> str:
+    """
+    Отпечаток конфигурации: sha256 канонического JSON (16 символов).
+
+    Снимок и словарь с одинаковым содержимым дают одинаковый отпечаток.
+    """
+    serialized = json.dumps(config, sort_keys=True, ensure_ascii=False, default=_json_default)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()[:16]
+
+class ConfigSnapshot(Mapping):
+    """
+    Неизменяемый снимок конфигурации со слоями переопределений.
+
+    Базовая конфигурация замораживается один раз (словари становятся
+    MappingProxyType, списки — кортежами). overlay() возвращает новый снимок,
+    в котором переопределения лежат слоем поверх базы: стоимость пропорциональна
+    размеру переопределений, база не копируется и не изменяется. При чтении
+    вложенные словари слоёв объединяются (верхний слой важнее), прочие значения
+    верхнего слоя заменяют нижние. Снимок читается как обычный словарь
+    (get, [], in), поэтому модули, принимающие конфигурацию, работают с ним без изменений.
+    """
+
+    __slots__ = ('_layers', '_version', '_merged')
+
+    def __init__(self, layers: Tuple[Mapping, ...], version: Optional[str] = None):
+        # Слои уже заморожены, верхний — первый
+        self._layers = layers
+        self._version = version
+        # Объединённые значения ключей: снимок неизменяем, поэтому их можно запоминать
+        self._merged: Dict[Any, Any] = {}
+
+    @property
+    def version(self) -> str:
+        """Версия снимка для ключей кэшей (у базы — отпечаток содержимого)."""
+        if self._version is None:
+            self._version = config_fingerprint(self)
+        return self._version
+
+    def overlay(self, overrides: Optional[Mapping]) -> "ConfigSnapshot":
+        """
+        Возвращает снимок с переопределениями поверх этого.
+
+        Args:
+            overrides: Вложенный словарь переопределений, например
+                {'monetization': {'strategy': 'full'}}
+
+        Returns:
+            Новый снимок (этот не меняется); без переопределений — этот же
+        """
+        if not overrides:
+            return self
+        layer = _freeze(overrides)
+        # Версия слоя считается по версии основы и переопределениям, без сериализации всей конфигурации
+        return ConfigSnapshot((layer,) + self._layers, config_fingerprint([self.version, layer]))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Возвращает изменяемую копию объединённой конфигурации (словари и списки)."""
+        return _thaw(self)
+
+    def __getitem__(self, key: Any) -> Any:
+        layers = self._layers
+        if len(layers) == 1:
+            return layers[0][key]
+        try:
+            return self._merged[key]
+        except KeyError:
+            pass
+        value = self._merged[key] = self._merge(key)
+        return value
+
+    def _merge(self, key: Any) -> Any:
+        values = []
+        for layer in self._layers:
+            if key in layer:
+                value = layer[key]
+                if not isinstance(value, _FROZEN_MAPPINGS):
+                    if not values:
+                        return value
+                    break
+                values.append(value)
+        if not values:
+            raise KeyError(key)
+        return values[0] if len(values) == 1 else ConfigSnapshot(tuple(values))
+
+    def __contains__(self, key: Any) -> bool:
+        return any(key in layer for layer in self._layers)
+
+    def __iter__(self) -> Iterator[Any]:
+        keys: Dict[Any, None] = {}
+        for layer in reversed(self._layers):
+            keys.update(dict.fromkeys(layer))
+        return iter(keys)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __reduce__(self):
+        # MappingProxyType не сериализуется pickle: слои передаются словарями (пул процессов)
+        return _restore_snapshot, (tuple(_thaw(layer) for layer in self._layers), self._version)
+
+    def __repr__(self) -> str:
+        return f"ConfigSnapshot(version={self._version!r}, layers={len(self._layers)})"
+
+# Типы словарей в замороженных слоях (проверка конкретных типов быстрее isinstance(..., Mapping))
+_FROZEN_MAPPINGS = (MappingProxyType, ConfigSnapshot)
+
+def freeze_config(config: Mapping) -> ConfigSnapshot:
+    """
+    Замораживает конфигурацию в снимок (снимок возвращается как есть).
+
+    Args:
+        config: Конфигурация монетизации
+
+    Returns:
+        Неизменяемый снимок; исходный словарь не используется снимком
+    """
+    if isinstance(config, ConfigSnapshot):
+        return config
+    return ConfigSnapshot((_freeze(config),), config_fingerprint(config))
+
+def _restore_snapshot(layers: Tuple[Dict[str, Any], ...], version: Optional[str]) -> ConfigSnapshot:
+    return ConfigSnapshot(tuple(_freeze(layer) for layer in layers), version)
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, ConfigSnapshot):
+        return value
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _thaw(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        return dict(value)
+    return str(value)
@@ -1,21 +1,228 @@
-
 # utils/logger.py
+import atexit
 import logging
+import queue
 import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Any, List, Optional, Tuple
+
+DEFAULT_LOG_FILE = 'ssv_monetization.log'
+DEFAULT_FORMAT = '%(asctime)s %(levelname)s %(name)s %(message)s'
+# Сколько сообщений одного вида сверх лимита пропускается подряд (запас лимита)
+DEFAULT_RATE_BURST = 10
+# Записей в очереди к фоновому потоку; при переполнении новые записи отбрасываются
+DEFAULT_QUEUE_SIZE = 100000
+
+class RateLimitFilter(logging.Filter):
+    """
+    Ограничивает частоту однотипных сообщений этапа (логгера).
+
+    Однотипными считаются записи из одного места вызова: для каждого места
+    действует «ведро токенов» на rate сообщений в секунду с запасом burst.
+    Отброшенные записи учитываются и сообщаются в следующей пропущенной
+    записи того же вида. Предупреждения и ошибки не ограничиваются.
+    """
+
+    def __init__(self, rate: float, burst: int = DEFAULT_RATE_BURST):
+        super().__init__()
+        self.rate = rate
+        self.burst = max(burst, 1)
+        # (файл, строка) места вызова -> [токены, время последнего пополнения, отброшено]
+        self._buckets: Dict[Any, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now, 0]
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+
+        if suppressed:
+            record.msg = f"{record.msg} [{suppressed} similar messages suppressed]"
+        return True
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler без форматирования в вызывающем потоке.
+
+    Стандартный prepare() форматирует сообщение до постановки в очередь;
+    здесь запись передаётся как есть (очередь в памяти того же процесса),
+    и сообщение собирается из шаблона и аргументов в фоновом потоке записи.
+    Если очередь заполнена (медленный приёмник stdout), запись отбрасывается
+    вместо блокировки, а число отброшенных сообщается следующей записью.
+    """
+
+    def __init__(self, records: queue.Queue):
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if self.dropped:
+                notice = logging.LogRecord(
+                    __name__, logging.WARNING, __file__, 0,
+                    "Log queue full: dropped %d records", (self.dropped,), None
+                )
+                self.queue.put_nowait(notice)
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class _QueueListener(QueueListener):
+    """QueueListener, который при остановке ждёт места в заполненной очереди."""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+class LoggingPipeline:
+    """
+    Обработчики логов приложения: файл и stdout.
 
-def setup_logger(name: str, log_file: str = 'ssv_monetization.log', level=logging.INFO):
-    """Функция для настройки логгера."""
-    formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s')
+    В режиме очереди логгеры только кладут записи в очередь, а форматирование
+    и запись выполняет фоновый поток QueueListener; иначе обработчики
+    вызываются синхронно в потоке, который пишет в лог.
+    """
 
-    handler = logging.FileHandler(log_file)
-    handler.setFormatter(formatter)
+    def __init__(
+        self,
+        log_file: str = DEFAULT_LOG_FILE,
+        use_queue: bool = True,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        fmt: str = DEFAULT_FORMAT
+    ):
+        self.log_file = log_file
+        self.use_queue = use_queue
+        formatter = logging.Formatter(fmt)
+        self.handlers: List[logging.Handler] = []
+        if log_file:
+            file_handler = logging.FileHandler(log_file, encoding='utf-8')
+            file_handler.setFormatter(formatter)
+            self.handlers.append(file_handler)
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(formatter)
+        self.handlers.append(console_handler)
 
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
+        self._listener: Optional[QueueListener] = None
+        if use_queue:
+            records: queue.Queue = queue.Queue(queue_size)
+            self._listener = _QueueListener(records, *self.handlers, respect_handler_level=True)
+            self._listener.start()
+            self.entry_handlers: List[logging.Handler] = [_DeferredQueueHandler(records)]
+        else:
+            self.entry_handlers = list(self.handlers)
+
+    def close(self) -> None:
+        """Дописывает записи из очереди и закрывает обработчики."""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        for handler in self.handlers:
+            handler.close()
+
+_pipeline: Optional[LoggingPipeline] = None
+# Логгеры точек входа (setup_logger): их уровень задаёт logging.level
+_entry_loggers: set = set()
+_rate_filters: List[Tuple[logging.Logger, RateLimitFilter]] = []
+_pipeline_lock = threading.RLock()
+
+def configure_logging(config: Optional[Dict[str, Any]] = None, log_file: str = DEFAULT_LOG_FILE) -> LoggingPipeline:
+    """
+    Настраивает вывод логов по разделу logging конфигурации (повторный вызов заменяет настройку).
+
+    Обработчики подключаются один раз к корневому логгеру, поэтому логгеры
+    модулей не накапливают дубликатов. Раздел logging:
+    file, level, modules_level (уровень остальных логгеров), queue
+    (запись фоновым потоком), queue_size и rate_limits ({логгер: сообщений одного
+    вида в секунду}) для частых сообщений конвейера.
+
+    Args:
+        config: Конфигурация монетизации (без неё — значения по умолчанию)
+        log_file: Файл лога, если он не задан в конфигурации
+
+    Returns:
+        Действующая настройка вывода
+    """
+    global _pipeline
+    logging_config = (config or {}).get('logging', {})
+    pipeline = LoggingPipeline(
+        log_file=logging_config.get('file', log_file),
+        use_queue=logging_config.get('queue', True),
+        queue_size=logging_config.get('queue_size', DEFAULT_QUEUE_SIZE)
+    )
+    level = logging_config.get('level')
+
+    with _pipeline_lock:
+        root = logging.getLogger()
+        previous, _pipeline = _pipeline, pipeline
+        if previous is not None:
+            for handler in previous.entry_handlers:
+                root.removeHandler(handler)
+        for handler in pipeline.entry_handlers:
+            root.addHandler(handler)
+
+        # Точки входа пишут на уровне level, остальные модули — на modules_level
+        root.setLevel(logging_config.get('modules_level', logging.WARNING))
+        if level is not None:
+            for name in _entry_loggers:
+                logging.getLogger(name).setLevel(level)
+
+        for logger, rate_filter in _rate_filters:
+            logger.removeFilter(rate_filter)
+        _rate_filters.clear()
+        burst = logging_config.get('rate_burst', DEFAULT_RATE_BURST)
+        for name, rate in (logging_config.get('rate_limits') or {}).items():
+            logger = logging.getLogger(name)
+            rate_filter = RateLimitFilter(rate, burst)
+            logger.addFilter(rate_filter)
+            _rate_filters.append((logger, rate_filter))
+
+    if previous is not None:
+        previous.close()
+    return pipeline
+
+def setup_logger(name: str, log_file: str = DEFAULT_LOG_FILE, level=logging.INFO) -> logging.Logger:
+    """
+    Функция для настройки логгера.
+
+    Повторные вызовы не добавляют обработчиков: вывод настраивается один раз
+    (configure_logging), логгер получает только уровень.
+    """
+    with _pipeline_lock:
+        if _pipeline is None:
+            configure_logging(log_file=log_file)
+        _entry_loggers.add(name)
 
     logger = logging.getLogger(name)
     logger.setLevel(level)
-    logger.addHandler(handler)
-    logger.addHandler(console_handler)
-
     return logger
+
+def close_logging() -> None:
+    """Дописывает накопленные записи и отключает обработчики."""
+    global _pipeline
+    with _pipeline_lock:
+        pipeline, _pipeline = _pipeline, None
+        if pipeline is not None:
+            for handler in pipeline.entry_handlers:
+                logging.getLogger().removeHandler(handler)
+    if pipeline is not None:
+        pipeline.close()
+
+atexit.register(close_logging)
@@ -0,0 +1,386 @@
+# utils/metrics.py
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+# Границы корзин гистограмм длительности (секунды): этапы конвейера занимают от микросекунд до секунд
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5
+)
+
+# Starlette сам добавляет charset=utf-8 к текстовым типам
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+class _ThreadShardedMetric:
+    """
+    Основа метрик без блокировок при наблюдении.
+
+    Каждый поток пишет в свою копию рядов (словарь метки -> значение),
+    копии складываются только при чтении.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Поток -> {значения меток -> ряд}
+        self._shards: Dict[int, Dict[Tuple[str, ...], Any]] = {}
+        self._lock = threading.Lock()
+
+    def _new_shard(self) -> Dict[Tuple[str, ...], Any]:
+        with self._lock:
+            return self._shards.setdefault(threading.get_ident(), {})
+
+    def _shard_items(self, shards: Optional[List[Dict[Tuple[str, ...], Any]]] = None) -> Iterator[Tuple[Tuple[str, ...], Any]]:
+        # list() копирует словарь целиком, пока поток-владелец продолжает наблюдения
+        if shards is None:
+            with self._lock:
+                shards = list(self._shards.values())
+        for shard in shards:
+            yield from list(shard.items())
+
+    def clear(self) -> None:
+        """Сбрасывает все ряды."""
+        with self._lock:
+            self._shards.clear()
+
+    def drain(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        """
+        Забирает все ряды (объединённые по потокам) и сбрасывает метрику.
+
+        Для передачи наблюдений из процесса пула в родительский (merge).
+        Наблюдения потока, который пишет в ряды во время вызова, могут потеряться.
+        """
+        with self._lock:
+            shards, self._shards = list(self._shards.values()), {}
+        return list(self._merged(shards).items())
+
+class Counter(_ThreadShardedMetric):
+    """Монотонный счётчик с метками (тип counter в формате Prometheus)."""
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        """Увеличивает счётчик ряда с данными значениями меток."""
+        shard = self._shards.get(threading.get_ident())
+        if shard is None:
+            shard = self._new_shard()
+        shard[labelvalues] = shard.get(labelvalues, 0) + amount
+
+    def merge(self, items: List[Tuple[Tuple[str, ...], float]]) -> None:
+        """Добавляет ряды, забранные drain у такого же счётчика (например, в другом процессе)."""
+        for labelvalues, value in items:
+            self.inc(*labelvalues, amount=value)
+
+    def _merged(self, shards: Optional[list] = None) -> Dict[Tuple[str, ...], float]:
+        merged: Dict[Tuple[str, ...], float] = {}
+        for labelvalues, value in self._shard_items(shards):
+            merged[labelvalues] = merged.get(labelvalues, 0) + value
+        return merged
+
+    def value(self, *labelvalues: str) -> float:
+        """Текущее значение ряда (0, если наблюдений не было)."""
+        return self._merged().get(labelvalues, 0)
+
+    def render(self) -> List[str]:
+        """Строки ряда в текстовом формате Prometheus."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labelvalues, value in sorted(self._merged().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+class Histogram(_ThreadShardedMetric):
+    """
+    Гистограмма с фиксированными корзинами и метками (тип histogram в формате Prometheus).
+
+    Наблюдение — поиск корзины и два инкремента в копии рядов потока;
+    корзины становятся накопительными только при выводе.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        """Добавляет наблюдение в ряд с данными значениями меток."""
+        self.observe_labels(value, labelvalues)
+
+    def observe_labels(self, value: float, labelvalues: Tuple[str, ...]) -> None:
+        """То же, что observe, с готовым кортежем значений меток."""
+        series = self._series(labelvalues)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def merge(self, items: List[Tuple[Tuple[str, ...], List[float]]]) -> None:
+        """Добавляет ряды, забранные drain у такой же гистограммы (например, в другом процессе)."""
+        for labelvalues, values in items:
+            series = self._series(labelvalues)
+            for index, value in enumerate(values):
+                series[index] += value
+
+    def _series(self, labelvalues: Tuple[str, ...]) -> List[float]:
+        """Ряд текущего потока с данными значениями меток (создаётся при первом обращении)."""
+        shard = self._shards.get(threading.get_ident())
+        if shard is None:
+            shard = self._new_shard()
+        series = shard.get(labelvalues)
+        if series is None:
+            # Число наблюдений по корзинам, сверх последней границы, сумма
+            series = shard[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+        return series
+
+    def _merged(self, shards: Optional[list] = None) -> Dict[Tuple[str, ...], List[float]]:
+        merged: Dict[Tuple[str, ...], List[float]] = {}
+        for labelvalues, values in self._shard_items(shards):
+            values = list(values)
+            total = merged.get(labelvalues)
+            if total is None:
+                merged[labelvalues] = values
+            else:
+                for index, value in enumerate(values):
+                    total[index] += value
+        return merged
+
+    def snapshot(self, *labelvalues: str) -> Optional[Dict[str, Any]]:
+        """Число наблюдений и сумма ряда (None, если наблюдений не было)."""
+        series = self._merged().get(labelvalues)
+        if series is None:
+            return None
+        return {"count": sum(series[:-1]), "sum": series[-1]}
+
+    def render(self) -> List[str]:
+        """Строки рядов в текстовом формате Prometheus (_bucket, _sum, _count)."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        bucket_names = self.labelnames + ('le',)
+        for labelvalues, values in sorted(self._merged().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(bucket_names, labelvalues + (_format_value(bound),))} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(values[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class StageHistogram(Histogram):
+    """
+    Гистограмма длительности этапов с метками stage, strategy, content_type и cache.
+
+    Этапы регистрируются заранее (stage_id) и при наблюдении обозначаются
+    числом. Ряды одной пары (strategy, content_type) в одном потоке
+    собраны в «регистратор» — словарь {номер этапа: ряд}; его находят
+    один раз на элемент контента (recorder), поэтому наблюдение — это
+    поиск ряда по числу, поиск корзины и два инкремента.
+    """
+
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, ('stage', 'strategy', 'content_type', 'cache'), buckets)
+        # Номер этапа -> (имя этапа, метка cache)
+        self._stages: List[Tuple[str, str]] = []
+        self._stage_ids: Dict[Tuple[str, str], int] = {}
+
+    def stage_id(self, stage: str, cache: str = '') -> int:
+        """Номер этапа (регистрирует этап при первом обращении)."""
+        key = (stage, cache)
+        stage_id = self._stage_ids.get(key)
+        if stage_id is None:
+            with self._lock:
+                stage_id = self._stage_ids.get(key)
+                if stage_id is None:
+                    stage_id = self._stage_ids[key] = len(self._stages)
+                    self._stages.append(key)
+        return stage_id
+
+    def recorder(self, strategy: str, content_type: str) -> Dict[int, List[float]]:
+        """Регистратор рядов текущего потока для пары меток strategy и content_type."""
+        shard = self._shards.get(threading.get_ident())
+        if shard is None:
+            shard = self._new_shard()
+        recorder = shard.get((strategy, content_type))
+        if recorder is None:
+            recorder = shard[(strategy, content_type)] = {}
+        return recorder
+
+    def record(self, recorder: Dict[int, List[float]], stage_id: int, value: float) -> None:
+        """Добавляет наблюдение этапа в регистратор (только из потока-владельца)."""
+        series = recorder.get(stage_id)
+        if series is None:
+            series = recorder[stage_id] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def observe_labels(self, value: float, labelvalues: Tuple[str, ...]) -> None:
+        stage, strategy, content_type, cache = labelvalues
+        self.record(self.recorder(strategy, content_type), self.stage_id(stage, cache), value)
+
+    def _series(self, labelvalues: Tuple[str, ...]) -> List[float]:
+        # Ряды других процессов приходят с именами этапов: номера этапов у процессов свои
+        stage, strategy, content_type, cache = labelvalues
+        recorder = self.recorder(strategy, content_type)
+        stage_id = self.stage_id(stage, cache)
+        series = recorder.get(stage_id)
+        if series is None:
+            series = recorder[stage_id] = [0] * (len(self.buckets) + 1) + [0.0]
+        return series
+
+    def _shard_items(self, shards: Optional[list] = None) -> Iterator[Tuple[Tuple[str, ...], Any]]:
+        for (strategy, content_type), recorder in super()._shard_items(shards):
+            for stage_id, series in list(recorder.items()):
+                stage, cache = self._stages[stage_id]
+                yield (stage, strategy, content_type, cache), series
+
+class MetricsRegistry:
+    """Набор метрик процесса, выводимый целиком в формате Prometheus."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Регистрирует метрику (имя должно быть уникальным) и возвращает её."""
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric '{metric.name}' is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Текст всех метрик для /metrics."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def clear(self) -> None:
+        """Сбрасывает значения всех метрик."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+_registry = MetricsRegistry()
+
+STAGE_SECONDS = _registry.register(StageHistogram(
+    'ssv_stage_duration_seconds',
+    'Duration of monetization pipeline stages'
+))
+ITEMS_TOTAL = _registry.register(Counter(
+    'ssv_monetized_items_total',
+    'Content items passed through the monetization pipeline',
+    ('strategy', 'content_type')
+))
+
+# Регистратор рядов текущего элемента (stage_labels); вне блока — None
+_stage_recorder: ContextVar[Optional[Dict[int, List[float]]]] = ContextVar('ssv_stage_recorder', default=None)
+_enabled = True
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Возвращает общий набор метрик процесса."""
+    return _registry
+
+def configure_metrics(config: Dict[str, Any]) -> MetricsRegistry:
+    """
+    Включает или отключает измерение этапов по разделу metrics конфигурации.
+
+    Args:
+        config: Конфигурация монетизации (metrics.enabled, по умолчанию true)
+
+    Returns:
+        Общий набор метрик
+    """
+    global _enabled
+    _enabled = bool(config.get('metrics', {}).get('enabled', True))
+    return _registry
+
+def stage_id(stage: str, cache: str = '') -> int:
+    """
+    Номер этапа для observe_stage (получают один раз, при импорте модуля).
+
+    Args:
+        stage: Имя этапа, например 'plan' или 'inject.add_premium_cta'
+        cache: 'hit' или 'miss' для этапов с кэшем, иначе пусто
+
+    Returns:
+        Номер этапа
+    """
+    return STAGE_SECONDS.stage_id(stage, cache)
+
+@contextmanager
+def stage_labels(strategy: str, content_type: str) -> Iterator[None]:
+    """
+    Задаёт метки strategy и content_type для этапов, выполняемых внутри блока.
+
+    Блок должен выполняться синхронно в одном потоке: регистратор меток
+    принадлежит потоку, который открыл блок.
+    """
+    token = _stage_recorder.set(STAGE_SECONDS.recorder(strategy, content_type) if _enabled else None)
+    try:
+        yield
+    finally:
+        _stage_recorder.reset(token)
+
+def observe_stage(stage: int, started: float) -> None:
+    """
+    Записывает длительность этапа, начатого в момент started (time.perf_counter()).
+
+    Вне stage_labels этап записывается с метками strategy и content_type = unknown.
+
+    Args:
+        stage: Номер этапа (stage_id)
+        started: Значение time.perf_counter() в начале этапа
+    """
+    recorder = _stage_recorder.get()
+    if recorder is None:
+        if not _enabled:
+            return
+        recorder = STAGE_SECONDS.recorder('unknown', 'unknown')
+    STAGE_SECONDS.record(recorder, stage, time.perf_counter() - started)
+
+def drain_metrics() -> Dict[str, Any]:
+    """
+    Забирает наблюдения этапов и счётчик элементов процесса и сбрасывает их.
+
+    Процессы пула возвращают результат вместе с наблюдениями задачи,
+    а родительский процесс добавляет их в свои метрики (merge_metrics),
+    поэтому /metrics учитывает и элементы, обработанные в пуле.
+    Вызывается вне блоков stage_labels.
+    """
+    return {"stages": STAGE_SECONDS.drain(), "items": ITEMS_TOTAL.drain()}
+
+def merge_metrics(drained: Dict[str, Any]) -> None:
+    """Добавляет наблюдения, забранные drain_metrics в другом процессе."""
+    STAGE_SECONDS.merge(drained["stages"])
+    ITEMS_TOTAL.merge(drained["items"])
+
+def count_item(strategy: str, content_type: str) -> None:
+    """Учитывает элемент контента, прошедший конвейер монетизации."""
+    if _enabled:
+        ITEMS_TOTAL.inc(strategy, content_type)
@@ -0,0 +1,157 @@
+# utils/result_cache.py
+import hashlib
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 300.0
+
+def text_digest(text: str) -> bytes:
+    """Быстрый хеш текста для ключей кэша."""
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+def _estimate_size(value: Any) -> int:
+    """Приблизительный размер значения в байтах (с вложенными контейнерами)."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_estimate_size(k) + _estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_estimate_size(item) for item in value)
+    return size
+
+class ResultCache:
+    """
+    Потокобезопасный LRU-кэш результатов с TTL и ограничением по объёму.
+
+    Ключи строятся вызывающим кодом из хеша текста и версии правил.
+    При смене версии конфигурации (set_version) кэш очищается.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl: float = DEFAULT_TTL_SECONDS
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Возвращает значение по ключу или None при промахе/истечении TTL."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+
+            value, size, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self._bytes -= size
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Сохраняет значение, вытесняя самые старые записи при переполнении."""
+        size = _estimate_size(key) + _estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats["evictions"] += 1
+
+    def set_version(self, version: str) -> None:
+        """Привязывает кэш к версии конфигурации; при смене версии кэш очищается."""
+        with self._lock:
+            if self._version == version:
+                return
+            if self._version is not None:
+                logger.info(f"Result cache invalidated: config version {self._version} -> {version}")
+            self._version = version
+            self._entries.clear()
+            self._bytes = 0
+
+    def configure(self, max_entries: int = None, max_bytes: int = None, ttl: float = None) -> None:
+        """Меняет ограничения кэша."""
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if ttl is not None:
+                self.ttl = ttl
+
+    def clear(self) -> None:
+        """Очищает кэш."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает счётчики попаданий/промахов и текущий размер кэша."""
+        with self._lock:
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "version": self._version
+            }
+
+_result_cache = ResultCache()
+
+def get_result_cache() -> ResultCache:
+    """Возвращает общий кэш результатов проверок и метрик."""
+    return _result_cache
+
+def configure_result_cache(config: Dict[str, Any], config_version: str) -> ResultCache:
+    """
+    Настраивает общий кэш по разделу cache конфигурации и привязывает его к версии.
+
+    Args:
+        config: Конфигурация монетизации
+        config_version: Версия конфигурации (см. compute_config_version)
+
+    Returns:
+        Общий кэш результатов
+    """
+    cache_config = config.get('cache', {})
+    _result_cache.configure(
+        max_entries=cache_config.get('result_max_entries'),
+        max_bytes=cache_config.get('result_max_bytes'),
+        ttl=cache_config.get('result_ttl_seconds')
+    )
+    _result_cache.set_version(config_version)
+    return _result_cache